@@ -1,8 +1,27 @@
 # -*- coding: UTF-8 -*-
 
+import sys
+
 from .__version__ import __version__  # noqa
 from .imp_eeprom import EEPROM
+from .imp_device import PortLock
 from .imp_bus import Bus, BusError
 from .imp_modules import Module, ModuleError
+from .imp_tuner import Tuner
+from .imp_monitor import Monitor
+from .imp_cache import Cache
+from .imp_pipeline import Pipeline
+from .imp_estimator import Estimator
+from .imp_collector import Collector
+from .imp_worker import Worker, WorkerError, Transaction, Client
+from .imp_multibus import MultiBus
+
+__all__ = ["Bus", "BusError", "Module", "ModuleError", "EEPROM", "Tuner",
+           "Monitor", "Cache", "Pipeline", "Estimator", "Collector",
+           "Worker", "WorkerError", "Transaction", "Client", "MultiBus",
+           "PortLock"]
 
-__all__ = ["Bus", "BusError", "Module", "ModuleError", "EEPROM"]
+# asyncio with async/await is only available since python 3.5
+if sys.version_info >= (3, 5):
+    from .imp_async import AsyncBus, AsyncModule  # noqa
+    __all__ += ["AsyncBus", "AsyncModule"]
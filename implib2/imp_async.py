@@ -0,0 +1,577 @@
+# -*- coding: UTF-8 -*-
+
+import struct
+import asyncio
+
+from .imp_crc import MaximCRC
+from .imp_bus import BusError
+from .imp_device import DeviceError
+from .imp_modules import ModuleError
+from .imp_helper import _imprange
+
+
+class AsyncBus(object):
+    """The asyncio counterpart of :class:`Bus`. It offers the same
+    operations as coroutines, but instead of sleeping until a reply should
+    have arrived, the serial port is watched by the event loop and a reply
+    is read the moment it's there. So a single event loop can drive several
+    ports at once. The packages are build and parsed by the wrapped
+    :class:`Bus`::
+
+        >>> bus = AsyncBus(Bus('/dev/ttyUSB0'))
+        >>> await bus.sync()
+        >>> await bus.scan()
+        (10010, 10011)
+
+    Every operation takes an optional `timeout` in seconds, after which it
+    is cancelled and :class:`asyncio.TimeoutError` is raised. The calls of
+    several tasks are run one after another, a cancelled call drops its
+    partial reply.
+
+    .. note:: Requires Python 3.5 and a serial port which can be watched by
+        the event loop (a file descriptor). A bus sharing its port with
+        other processes is not supported, as waiting for the
+        :class:`PortLock` would block the event loop.
+
+    :param bus: The bus to use.
+    :type  bus: :class:`Bus`
+
+    """
+    def __init__(self, bus):
+        if bus.shared:
+            raise BusError("AsyncBus can't use a shared port!")
+
+        self.bus = bus
+        self._lock = asyncio.Lock()
+
+    async def _readable(self, timeout):
+        loop = asyncio.get_event_loop()
+        ready = loop.create_future()
+        fileno = self.bus.dev.ser.fileno()
+
+        def notify():
+            if not ready.done():
+                ready.set_result(True)
+
+        loop.add_reader(fileno, notify)
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fileno)
+
+    async def _read(self, length, deadline):
+        loop = asyncio.get_event_loop()
+        ser = self.bus.dev.ser
+        data = b''
+
+        timeout = ser.timeout
+        ser.timeout = 0
+        try:
+            while len(data) < length:
+                data += ser.read(length - len(data))
+                remaining = deadline - loop.time()
+                if len(data) < length:
+                    if remaining <= 0:
+                        break
+                    await self._readable(remaining)
+        finally:
+            ser.timeout = timeout
+
+        return data
+
+    async def _read_pkg(self, deadline):
+        header = await self._read(7, deadline)
+        if len(header) < 7:
+            raise DeviceError('Timeout reading header!')
+
+        length = bytearray(header)[2]
+        if length == 0:
+            return header
+
+        deadline += self.bus.dev.transfer_time(length)
+        data = await self._read(length, deadline)
+        if len(data) < length:
+            raise DeviceError('Timeout reading data!')
+
+        return header + data
+
+    async def _read_pkgs(self, deadline):
+        # a state of 0xff tells there are more packets to follow
+        packets = [await self._read_pkg(deadline)]
+
+        while bytearray(packets[-1][:1]) == b'\xff':
+            deadline = asyncio.get_event_loop().time() + \
+                self.bus.process_time['get']
+            packets.append(await self._read_pkg(deadline))
+
+        return packets
+
+    async def _read_bytes(self, length, deadline):
+        data = await self._read(length, deadline)
+        if len(data) < length:
+            raise DeviceError('Timeout reading bytes!')
+        return data
+
+    async def _read_range(self, deadline):
+        # only the first byte counts, the rest are colliding replies. Like
+        # Device.read, the late replies are waited for before dropping them.
+        loop = asyncio.get_event_loop()
+        byte = await self._read(1, deadline)
+        await asyncio.sleep(max(deadline + self.bus.dev.transfer_time(1) -
+                                loop.time(), 0))
+        self.bus.dev.ser.reset_input_buffer()
+        return byte
+
+    async def _transfer(self, kind, package, read, *args):
+        bus = self.bus
+        if not bus.dev.is_open:
+            raise DeviceError("Couldn't write packet, device is closed!")
+
+        async with self._lock:
+            try:
+                bus.dev.write_pkg(package)
+
+                # the ack commands are answered by a single byte, all the
+                # others by a package which is at least a 7 bytes header.
+                reply_len = 1 if kind in ('short_ack', 'range_ack') else 7
+                deadline = asyncio.get_event_loop().time() + \
+                    bus.process_time[kind] + \
+                    bus.dev.transfer_time(len(package) + reply_len)
+
+                return await read(*args, deadline)
+
+            except asyncio.CancelledError:
+                # drop what is left of the reply
+                bus.dev.ser.reset_input_buffer()
+                raise
+
+            finally:
+                await asyncio.sleep(bus.cycle_wait)
+
+    async def _call(self, coro, timeout):
+        if timeout is None:
+            return await coro
+        return await asyncio.wait_for(coro, timeout)
+
+    async def _sync(self, baudrate):
+        address = 16777215
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'Baudrate'
+        value = baudrate//100
+        ad_param = 0
+
+        if value not in (12, 24, 48, 96):
+            raise BusError("Unknown baudrate!")
+
+        package = self.bus.cmd.set_parameter(address, table, param,
+                                             [value], ad_param)
+
+        # switching the open port instead of cycling it
+        # pylint: disable=protected-access
+        async with self._lock:
+            for rate, delay in self.bus._sync_delays:
+                self.bus.dev.set_baudrate(rate)
+                self.bus.dev.write_pkg(package)
+                await asyncio.sleep(delay)
+
+            self.bus.dev.set_baudrate(baudrate)
+            await asyncio.sleep(1.000)
+
+        self.bus.bus_synced = True
+        return True
+
+    async def sync(self, baudrate=9600, timeout=None):
+        """See :func:`Bus.sync`, without the fast path.
+
+        :rtype: :const:`True`
+
+        """
+        return await self._call(self._sync(baudrate), timeout)
+
+    async def _probe_module_short(self, serno):
+        package = self.bus.cmd.get_short_ack(serno)
+        try:
+            bytes_recv = await self._transfer('short_ack', package,
+                                              self._read_bytes, 1)
+        except DeviceError:
+            return False
+        return self.bus.res.get_short_ack(bytes_recv, serno)
+
+    async def probe_module_short(self, serno, timeout=None):
+        """See :func:`Bus.probe_module_short`.
+
+        :rtype: :const:`bool`
+
+        """
+        return await self._call(self._probe_module_short(serno), timeout)
+
+    async def _probe_range(self, broadcast):
+        package = self.bus.cmd.get_range_ack(broadcast)
+        bytes_recv = await self._transfer('range_ack', package,
+                                          self._read_range)
+        return self.bus.res.get_range_ack(bytes_recv)
+
+    async def probe_range(self, broadcast, timeout=None):
+        """See :func:`Bus.probe_range`.
+
+        :rtype: :const:`bool`
+
+        """
+        return await self._call(self._probe_range(broadcast), timeout)
+
+    async def _search(self, rng, mark, found, occupied=False):
+        # the same pruned binary search as Bus.scan, returns whether
+        # someone answered within the range.
+        if not mark:
+            if await self._probe_module_short(rng):
+                found.append(rng)
+                return True
+            return False
+
+        if not occupied and not await self._probe_range(rng + mark):
+            return False
+
+        if mark == 1:
+            probes = len(found)
+            for serno in (rng + 1, rng):
+                if await self._probe_module_short(serno):
+                    found.append(serno)
+            return not probes == len(found)
+
+        # if the higher half is empty, someone is in the lower one
+        higher = await self._search(rng + mark, mark >> 1, found)
+        await self._search(rng, mark >> 1, found, not higher)
+        return True
+
+    async def _scan(self, minserial, maxserial):
+        rng, mark = _imprange(minserial, maxserial)
+        found = list()
+        await self._search(rng, mark, found)
+        return tuple(sorted(x for x in found if minserial <= x <= maxserial))
+
+    async def scan(self, minserial=0, maxserial=16777215, timeout=None):
+        """See :func:`Bus.scan`.
+
+        :rtype: tuple
+
+        """
+        return await self._call(self._scan(minserial, maxserial), timeout)
+
+    async def _get(self, serno, table, param):
+        package = self.bus.cmd.get_parameter(serno, table, param)
+        bytes_recv = await self._transfer('get', package, self._read_pkg)
+        return self.bus.res.get_parameter(bytes_recv, table, param)
+
+    async def get(self, serno, table, param, timeout=None):
+        """See :func:`Bus.get`.
+
+        :rtype: tuple
+
+        """
+        return await self._call(self._get(serno, table, param), timeout)
+
+    async def _get_table(self, serno, table):
+        package = self.bus.cmd.get_table(serno, table)
+        packets = await self._transfer('get', package, self._read_pkgs)
+        return self.bus.res.get_table(packets, table)
+
+    async def get_table(self, serno, table, timeout=None):
+        """See :func:`Bus.get_table`.
+
+        :rtype: dict
+
+        """
+        return await self._call(self._get_table(serno, table), timeout)
+
+    async def _set(self, serno, table, param, value, ad_param):
+        # pylint: disable=too-many-arguments
+        package = self.bus.cmd.set_parameter(serno, table, param,
+                                             value, ad_param)
+        bytes_recv = await self._transfer('set', package, self._read_pkg)
+        return self.bus.res.set_parameter(bytes_recv, table, serno)
+
+    async def set(self, serno, table, param, value, ad_param=0,
+                  timeout=None):
+        """See :func:`Bus.set`.
+
+        :rtype: :const:`bool`
+
+        """
+        # pylint: disable=too-many-arguments
+        return await self._call(self._set(serno, table, param, value,
+                                          ad_param), timeout)
+
+    async def _get_eeprom_page(self, serno, page_nr):
+        package = self.bus.cmd.get_epr_page(serno, page_nr)
+        bytes_recv = await self._transfer('get_epr_page', package,
+                                          self._read_pkg)
+        return self.bus.res.get_epr_page(bytes_recv)
+
+    async def get_eeprom_page(self, serno, page_nr, timeout=None):
+        """See :func:`Bus.get_eeprom_page`."""
+        return await self._call(self._get_eeprom_page(serno, page_nr),
+                                timeout)
+
+    async def _set_eeprom_page(self, serno, page_nr, page):
+        package = self.bus.cmd.set_epr_page(serno, page_nr, page)
+        bytes_recv = await self._transfer('set_epr_page', package,
+                                          self._read_pkg)
+        return self.bus.res.set_epr_page(bytes_recv)
+
+    async def set_eeprom_page(self, serno, page_nr, page, timeout=None):
+        """See :func:`Bus.set_eeprom_page`."""
+        # pylint: disable=too-many-arguments
+        return await self._call(self._set_eeprom_page(serno, page_nr, page),
+                                timeout)
+
+
+class AsyncModule(object):
+    """The asyncio counterpart of :class:`Module`, using an
+    :class:`AsyncBus`. The waits in between the polls of a measurement and
+    the EEPROM pages don't block the event loop::
+
+        >>> module10 = AsyncModule(bus, 10010)
+        >>> await module10.get_moisture(timeout=5.0)
+        12.3
+
+    :param bus: The bus to use.
+    :type  bus: :class:`AsyncBus`
+
+    :param serno: The serial number of the probe to address.
+    :type  serno: int
+
+    """
+    event_modes = {
+        "NormalMeasure":    0x00,
+        "TRDScan":          0x01,
+        "AnalogOut":        0x02,
+        "ACIC_TC":          0x03,
+        "SelfTest":         0x04,
+        "MatTempSensor":    0x05}
+
+    measure_modes = {
+        "ModeA":            0x00,
+        "ModeB":            0x01,
+        "ModeC":            0x02}
+
+    def __init__(self, bus, serno):
+        self.crc = MaximCRC()
+        self.bus = bus
+        self._serno = serno
+
+    @property
+    def serno(self):
+        """The serial number of the probe addressed by this `AsyncModule`.
+
+        :rtype: int
+
+        """
+        return self._serno
+
+    async def unlock(self):
+        """See :func:`Module.unlock`.
+
+        :rtype: bool
+
+        """
+        # Calculate the SupportPW: calc_crc(serno) + 0x8000
+        passwd = struct.pack('<I', self._serno)
+        passwd = struct.unpack('<B', self.crc.calc_crc(passwd))[0] + 0x8000
+
+        table = 'ACTION_PARAMETER_TABLE'
+        param = 'SupportPW'
+        return await self.bus.set(self._serno, table, param, [passwd])
+
+    async def get_event_mode(self):
+        """See :func:`Module.get_event_mode`.
+
+        :rtype: string
+
+        """
+        table = 'ACTION_PARAMETER_TABLE'
+        param = 'Event'
+        modes = {v: k for k, v in self.event_modes.items()}
+
+        mode = (await self.bus.get(self._serno, table, param))[0]
+        if mode not in range(127, 134):
+            raise ModuleError("Unknown event mode: %s" % mode)
+
+        return modes[mode % 0x80]
+
+    async def set_event_mode(self, mode="NormalMeasure"):
+        """See :func:`Module.set_event_mode`.
+
+        :rtype: bool
+
+        """
+        table = 'ACTION_PARAMETER_TABLE'
+        param = 'Event'
+
+        if mode not in self.event_modes:
+            raise ModuleError("%s: Invalid event mode!" % mode)
+
+        value = self.event_modes[mode]
+
+        await self.unlock()
+        await self.bus.set(self._serno, table, param, [value])
+
+        # let's try 5 times.
+        for attempt in range(5):
+            if (await self.bus.get(self._serno, table, param))[0] == \
+                    value + 0x80:
+                break
+            if attempt == 4:
+                raise ModuleError("Failed to set event mode!")
+
+        return True
+
+    async def get_measure_mode(self):
+        """See :func:`Module.get_measure_mode`.
+
+        :rtype: string
+
+        """
+        table = 'DEVICE_CONFIGURATION_PARAMETER_TABLE'
+        param = 'MeasMode'
+        modes = {v: k for k, v in self.measure_modes.items()}
+
+        try:
+            mode = modes[(await self.bus.get(self._serno, table, param))[0]]
+        except KeyError as err:
+            raise ModuleError("Unknown measure mode: %s!" % err.args[0])
+
+        return mode
+
+    async def set_measure_mode(self, mode='ModeA'):
+        """See :func:`Module.set_measure_mode`.
+
+        :rtype: bool
+
+        """
+        table = 'DEVICE_CONFIGURATION_PARAMETER_TABLE'
+        param = 'MeasMode'
+
+        if mode not in self.measure_modes:
+            raise ModuleError("%s: Invalid measure mode!" % mode)
+
+        if not await self.get_event_mode() == "NormalMeasure":
+            raise ModuleError("Wrong event mode, need 'NormalMeasure'!")
+
+        value = self.measure_modes[mode]
+        return await self.bus.set(self._serno, table, param, [value])
+
+    async def get_table(self, table):
+        """See :func:`Module.get_table`.
+
+        :rtype: dict
+
+        """
+        return await self.bus.get_table(self._serno, table)
+
+    async def get_serno(self):
+        """See :func:`Module.get_serno`.
+
+        :rtype: int
+
+        """
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'SerialNum'
+        return (await self.bus.get(self._serno, table, param))[0]
+
+    async def get_hw_version(self):
+        """See :func:`Module.get_hw_version`.
+
+        :rtype: float
+
+        """
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'HWVersion'
+        value = (await self.bus.get(self._serno, table, param))[0]
+        return '{0:.2f}'.format(value)
+
+    async def get_fw_version(self):
+        """See :func:`Module.get_fw_version`.
+
+        :rtype: float
+
+        """
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'FWVersion'
+        value = (await self.bus.get(self._serno, table, param))[0]
+        return '{0:.6f}'.format(value)
+
+    async def write_eeprom(self, image):
+        """See :func:`Module.write_eeprom`.
+
+        :rtype: bool
+
+        """
+        await self.unlock()
+
+        for number, page in enumerate(image):
+            if not await self.bus.set_eeprom_page(self._serno, number, page):
+                raise ModuleError("Writing EEPROM failed!")
+            await asyncio.sleep(0.05)
+
+        return True
+
+    async def start_measure(self):
+        """See :func:`Module.start_measure`.
+
+        :rtype: bool
+
+        """
+        table = 'ACTION_PARAMETER_TABLE'
+        param = 'StartMeasure'
+        value = 1
+
+        if not await self.get_event_mode() == "NormalMeasure":
+            raise ModuleError("Wrong event mode, need 'NormalMeasure'!")
+
+        if not await self.get_measure_mode() == 'ModeA':
+            raise ModuleError("Wrong measure mode, need 'ModeA'!")
+
+        if await self.measure_running():
+            raise ModuleError("Measurement cycle already in progress!")
+
+        return await self.bus.set(self._serno, table, param, [value])
+
+    async def measure_running(self):
+        """See :func:`Module.measure_running`.
+
+        :rtype: bool
+
+        """
+        table = 'ACTION_PARAMETER_TABLE'
+        param = 'StartMeasure'
+        return (await self.bus.get(self._serno, table, param))[0] == 1
+
+    async def get_measurement(self, quantity='Moist'):
+        """See :func:`Module.get_measurement`.
+
+        :rtype: int or float
+
+        """
+        table = 'MEASURE_PARAMETER_TABLE'
+        return (await self.bus.get(self._serno, table, quantity))[0]
+
+    async def _get_moisture(self, interval):
+        if not await self.start_measure():
+            raise ModuleError("Failed to start the measurement!")
+        while await self.measure_running():
+            await asyncio.sleep(interval)
+        return await self.get_measurement(quantity='Moist')
+
+    async def get_moisture(self, interval=0.500, timeout=None):
+        """See :func:`Module.get_moisture`. The probe is polled every
+        `interval` seconds.
+
+        :rtype: float
+
+        """
+        coro = self._get_moisture(interval)
+        if timeout is None:
+            return await coro
+        return await asyncio.wait_for(coro, timeout)
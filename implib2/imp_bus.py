@@ -1,14 +1,19 @@
 # -*- coding: UTF-8 -*-
 
 import time
+import json
+import bisect
+import contextlib
 
 from .imp_device import Device, DeviceError
 from .imp_datatypes import DataTypes
-from .imp_packages import Package
+from .imp_packages import Package, PackageError
 from .imp_commands import Command
-from .imp_responces import Responce
-from .imp_tables import Tables
-from .imp_helper import _imprange
+from .imp_responces import Responce, ResponceError
+from .imp_tables import Tables, TablesError
+from .imp_tuner import Tuner
+from .imp_cache import Cache
+from .imp_helper import _imprange, _impcover, _crcindex
 
 
 class BusError(Exception):
@@ -32,46 +37,326 @@ class Bus:
                   relaxed rs485 timings. Defaults to `False`.
     :type  rs485: bool
 
+    :param deadline: Set this to `True` in order to start reading the reply
+                     right after a package was sent, instead of sleeping a
+                     fixed amount of time first. The read returns as soon as
+                     the whole reply has arrived or gives up at a deadline
+                     derived from the baudrate, the length of the packages
+                     and the processing budget of the command (see
+                     :attr:`process_time`). Range probes always wait for the
+                     whole budget, as several probes might reply. Defaults
+                     to `False`.
+    :type  deadline: bool
+
+    :param autotune: Set this to `True` in order to let a :class:`Tuner`
+                     adapt the guard times for every command class and probe
+                     at runtime, based on the rate of failed transactions.
+                     The current values are available through
+                     `bus.tuner.current` and `bus.tuner.history`. Defaults to
+                     `False`.
+    :type  autotune: bool
+
+    :param cache: Set this to `True` in order to answer :func:`get` from a
+                  :class:`Cache` where possible. The hit/miss statistics
+                  are available through `bus.cache.stats`. Defaults to
+                  `False`.
+    :type  cache: bool
+
+    :param shared: Set this to `True` in order to share the port with
+                   other processes. Every transaction then takes a
+                   :class:`PortLock`, granted to the processes in turn. The
+                   wait times are available through `bus.dev.lock.stats`.
+                   :func:`sync` holds the lock for its whole run, as it
+                   changes the baudrate of the port. Defaults to `False`.
+    :type  shared: bool
+
     """
-    def __init__(self, port='/dev/ttyUSB0', rs485=False):
+    # baudrates to synchronise and the time the probes need afterwards
+    _sync_delays = ((1200, 0.500), (2400, 0.420), (4800, 0.340), (9600, 0.260))
+
+    def __init__(self, port='/dev/ttyUSB0', rs485=False, deadline=False,
+                 autotune=False, cache=False, shared=False):
+        # pylint: disable=too-many-arguments
         tbl = Tables()
         pkg = Package()
         dts = DataTypes()
 
+        self.tbl = tbl
         self.cmd = Command(tbl, pkg, dts)
         self.res = Responce(tbl, pkg, dts)
-        self.dev = Device(port)
+        self.dev = Device(port, shared=shared)
+        self.shared = shared
         self.bus_synced = False
+        self._held = False
+        self._crc_index = None
+
+        # probes which didn't answer the last fan-out operation, asked
+        # again after dead_retry seconds, and the pause between retries
+        self.dead = set()
+        self.dead_retry = 60.0
+        self.retry_wait = 0.050
+        self._dead_since = dict()
+
+        # called before every transaction, see Worker
+        self.preempt = None
+
+        # bus transactions used by the last scan
+        self.scan_stats = {
+            'range_probes':  0,
+            'module_probes': 0,
+            'inferred':      0,
+            'transactions':  0,
+            'pending':       0}
 
         # timing magic, adds some extra love for rs485
         self.trans_wait = 0.002 if not rs485 else 0.070
         self.cycle_wait = 0.001 if not rs485 else 0.070
         self.range_wait = 0.020 if not rs485 else 0.070
 
-    def _wait(self, package_len, process_time=0.1):
-        transit_time = package_len * self.trans_wait
+        self.tuner = None
+        if autotune:
+            self.tuner = Tuner(self.trans_wait, self.cycle_wait)
+
+        self.cache = Cache(tables=tbl) if cache else None
+
+        # time the probes may take to process a command and start to
+        # reply, only used with deadline based reception.
+        self.deadline = deadline
+        self.process_time = {
+            'long_ack':     0.100,
+            'short_ack':    0.050,
+            'range_ack':    0.050,
+            'negative_ack': 0.100,
+            'get':          0.100,
+            'set':          0.100,
+            'get_epr_page': 0.100,
+            'set_epr_page': 0.250}
+
+    def _wait(self, package_len, process_time=0.1, trans_wait=None):
+        trans_wait = self.trans_wait if trans_wait is None else trans_wait
+        transit_time = package_len * trans_wait
         time.sleep(transit_time + process_time + transit_time)
 
-    def _search(self, range_address, range_marker, found):
+    @contextlib.contextmanager
+    def _transaction(self):
+        # only a shared port is locked, see Device.transaction. The lock
+        # may be taken again by the transactions of sync while it holds it.
+        if not self.shared or self._held:
+            yield
+            return
+
+        with self.dev.transaction():
+            self._held = True
+            try:
+                yield
+            finally:
+                self._held = False
+
+    def _guard_times(self, kind, serno):
+        if self.tuner is None:
+            return self.trans_wait, self.cycle_wait
+        return self.tuner.waits(kind, serno)
+
+    def _feedback(self, kind, serno, success):
+        if self.tuner is not None:
+            self.tuner.report(kind, serno, success)
+
+    def _transfer(self, kind, serno, package, read, *args):
+        # pylint: disable=too-many-arguments
+        if self.preempt is not None:
+            self.preempt()
+
+        trans_wait, cycle_wait = self._guard_times(kind, serno)
+
+        with self._transaction():
+            try:
+                self.dev.write_pkg(package)
+
+                if not self.deadline:
+                    self._wait(len(package), trans_wait=trans_wait)
+                    return read(*args)
+
+                # the ack commands are answered by a single byte, all the
+                # others by a package which is at least a 7 bytes header.
+                reply_len = 1 if kind in ('short_ack', 'range_ack') else 7
+                deadline = time.time() + self.process_time[kind] + \
+                    self.dev.transfer_time(len(package) + reply_len)
+
+                return read(*args, deadline=deadline)
+
+            except DeviceError:
+                # a missing reply to a probe command just means there is no
+                # such probe, so only count the timeouts of the others.
+                if kind not in ('long_ack', 'short_ack', 'range_ack',
+                                'negative_ack'):
+                    self._feedback(kind, serno, False)
+                raise
+
+            finally:
+                time.sleep(cycle_wait)
+
+    def _get_time(self, lengths):
+        # estimated bus time of get requests with replies of the given data
+        # lengths: request (twice, see _wait) and reply plus the fixed waits.
+        # Replies bigger than 252 bytes are split into several packages.
+        total = 0.0
+        for length in lengths:
+            packages = max(-(-length // 252), 1)
+            size = 2 * 10 + length + packages * 8
+            total += size * self.trans_wait + self.process_time['get'] + \
+                self.cycle_wait
+        return total
+
+    def _parse(self, kind, serno, parse, *args):
+        try:
+            result = parse(*args)
+        except (PackageError, ResponceError):
+            self._feedback(kind, serno, False)
+            raise
+
+        self._feedback(kind, serno, True)
+        return result
+
+    def _fan_out(self, sernos, operation, budget, skip_dead):
+        # live probes first, so the dead ones can't delay them
+        sernos = sorted(set(sernos), key=lambda x: (x in self.dead, x))
+        values, errors = dict(), dict()
+
+        for serno in sernos:
+            if skip_dead and serno in self.dead:
+                now = time.time()
+                since = self._dead_since.setdefault(serno, now)
+                if now - since < self.dead_retry:
+                    errors[serno] = BusError("Probe %s is dead!" % serno)
+                    continue
+
+            started = time.time()
+            while True:
+                try:
+                    values[serno] = operation(serno)
+                except (DeviceError, PackageError, ResponceError) as err:
+                    if time.time() - started < budget:
+                        time.sleep(self.retry_wait)
+                        continue
+                    if isinstance(err, DeviceError):
+                        self.dead.add(serno)
+                        self._dead_since[serno] = time.time()
+                    errors[serno] = err
+                else:
+                    self.dead.discard(serno)
+                    self._dead_since.pop(serno, None)
+                break
+
+        return values, errors
+
+    def _visit(self, range_address, range_marker, found, occupied=False,
+               rest=None):
+        # Probes a single range and returns whether someone is in there and
+        # whether the range has to be divided any further. The blocks still
+        # to search besides a confirmed candidate are added to `rest`.
+        # pylint: disable=too-many-arguments
         probes = len(found)
         bcast_address = range_address + range_marker
 
-        if not self.probe_range(bcast_address):
-            return False
+        if not range_marker:
+            # a single serial number can only be called up directly
+            self.scan_stats['module_probes'] += 1
+            if self.probe_module_short(range_address):
+                found.append(range_address)
+            return not probes == len(found), False
+
+        if occupied:
+            self.scan_stats['inferred'] += 1
+        elif self._crc_index is None:
+            self.scan_stats['range_probes'] += 1
+            if not self.probe_range(bcast_address):
+                return False, False
+        else:
+            self.scan_stats['range_probes'] += 1
+            answered, crc = self._probe_range_reply(bcast_address)
+            if not answered:
+                return False, False
+
+            # a clean reply byte matching a single candidate of the range
+            # can be confirmed directly instead of dividing the range. The
+            # byte might as well be garbled by colliding replies, so the
+            # rest of the range is searched anyway.
+            last = bcast_address + range_marker - 1
+            serno = self._crc_candidate(crc, range_address, last)
+            if serno is not None:
+                self.scan_stats['module_probes'] += 1
+                if self.probe_module_short(serno):
+                    found.append(serno)
+                    if rest is not None:
+                        rest.extend(_impcover(range_address, serno - 1))
+                        rest.extend(_impcover(serno + 1, last))
+                    return True, False
 
         if range_marker == 1:
+            self.scan_stats['module_probes'] += 2
+
             if self.probe_module_short(bcast_address):
                 found.append(bcast_address)
 
             if self.probe_module_short(bcast_address - 1):
                 found.append(bcast_address - 1)
 
-            return not probes == len(found)
+            return not probes == len(found), False
 
-        # divide-and-conquer by splitting the range into two pices.
-        self._search(bcast_address, range_marker >> 1, found)
-        self._search(range_address, range_marker >> 1, found)
-        return True
+        return True, True
+
+    def _walk(self, blocks):
+        # The ranges still to search, the next one on top. The lower half
+        # of a divided range waits for the result of the higher half: If
+        # the higher half turns out to be empty, someone has to be in the
+        # lower half, so there is no need to ask for it.
+        pending = [(rng, mark, None, None) for rng, mark in reversed(blocks)]
+
+        while pending:
+            rng, mark, higher, result = pending.pop()
+            occupied = higher is not None and not higher[0]
+
+            found = list()
+            rest = list()
+            answered, divide = self._visit(rng, mark, found, occupied, rest)
+
+            if result is not None:
+                result.append(answered)
+
+            # divide-and-conquer by splitting the range into two pices.
+            if divide:
+                cell = list()
+                pending.append((rng, mark >> 1, cell, None))
+                pending.append((rng + mark, mark >> 1, None, cell))
+
+            pending.extend((x, y, None, None) for x, y in reversed(rest))
+
+            self.scan_stats['pending'] = len(pending)
+            self._count_scan_stats()
+
+            for serno in found:
+                yield serno
+
+    def _probe_range_reply(self, broadcast):
+        package = self.cmd.get_range_ack(broadcast)
+        bytes_recv = self._transfer('range_ack', None, package,
+                                    self.dev.read_ack)
+        return self._parse('range_ack', None,
+                           self.res.get_range_reply, bytes_recv)
+
+    def _crc_candidate(self, crc, lower, upper):
+        candidates = self._crc_index.get(crc, ())
+        first = bisect.bisect_left(candidates, lower)
+        last = bisect.bisect_right(candidates, upper)
+        return candidates[first] if last - first == 1 else None
+
+    def _reset_scan_stats(self):
+        for key in self.scan_stats:
+            self.scan_stats[key] = 0
+
+    def _count_scan_stats(self):
+        self.scan_stats['transactions'] = \
+            self.scan_stats['range_probes'] + self.scan_stats['module_probes']
 
     def wakeup(self):
         """This function sends a broadcast packet which sets the 'EnterSleep'
@@ -92,12 +377,56 @@ class Bus:
                                          [value], ad_param)
 
         self.dev.open_device()
-        self.dev.write_pkg(package)
-        time.sleep(0.300)
+        with self._transaction():
+            self.dev.write_pkg(package)
+            time.sleep(0.300)
 
         return True
 
-    def sync(self, baudrate=9600):
+    def _fast_sync(self, package, baudrate, sernos):
+        # the urgent calls of a Worker must not run while the port is
+        # switched to another baudrate.
+        preempt, self.preempt = self.preempt, None
+        try:
+            return self._switch_sync(package, baudrate, sernos)
+        finally:
+            self.preempt = preempt
+
+    def _switch_sync(self, package, baudrate, sernos):
+        # first check whether the probes already answer at the target
+        # baudrate, switching the open port instead of cycling it.
+        self.dev.set_baudrate(baudrate)
+        missing = [x for x in sernos if not self.probe_module_short(x)]
+        fixed = list()
+
+        if not missing:
+            return True
+
+        for rate, delay in self._sync_delays:
+            if not missing:
+                break
+            if rate == baudrate:
+                continue
+
+            self.dev.set_baudrate(rate)
+            found = [x for x in missing if self.probe_module_short(x)]
+            if not found:
+                continue
+
+            # only broadcast at the baudrates someone actually listens to
+            self.dev.write_pkg(package)
+            time.sleep(delay)
+            missing = [x for x in missing if x not in found]
+            fixed.extend(found)
+
+        self.dev.set_baudrate(baudrate)
+
+        if missing:
+            return False
+
+        return all(self.probe_module_short(x) for x in fixed)
+
+    def sync(self, baudrate=9600, sernos=None):
         """This command synchronises the connected modules to the given
         baudrate.
 
@@ -107,9 +436,23 @@ class Bus:
         command "SetSysPara" with the parameter Baudrate on all possible
         baudrates. There must be a delay of at least 500ms after each command!
 
+        If the serial numbers of some connected probes are already known, a
+        fast path can be used by passing them as `sernos`: All of these
+        probes are called up at the target baudrate with
+        :func:`probe_module_short`. If all of them answer, the bus is already
+        synchronised. Otherwise the remaining probes are searched at the other
+        baudrates and the broadcast is only sent at the baudrates they answer
+        to. Only if a probe can't be found at all, the full sweep over all
+        baudrates is done::
+
+            >>> bus.sync(sernos=(10010, 10011))
+
         :param baudrate: Baudrate to use (1200-2400-4800-9600).
         :type  baudrate: int
 
+        :param sernos: Serial numbers of probes known to be connected.
+        :type  sernos: iterable
+
         :raises BusError: If baudrate is unknown.
 
         :rtype: :const:`True`
@@ -127,41 +470,31 @@ class Bus:
         package = self.cmd.set_parameter(address, table, param,
                                          [value], ad_param)
 
-        # first close the device
-        self.dev.close_device()
-
-        # trying to set baudrate at 1200
-        self.dev.open_device(baudrate=1200)
-        self.dev.write_pkg(package)
-        time.sleep(0.500)
-        self.dev.close_device()
-
-        # trying to set baudrate at 2400
-        self.dev.open_device(baudrate=2400)
-        self.dev.write_pkg(package)
-        time.sleep(0.420)
-        self.dev.close_device()
-
-        # trying to set baudrate at 4800
-        self.dev.open_device(baudrate=4800)
-        self.dev.write_pkg(package)
-        time.sleep(0.340)
-        self.dev.close_device()
-
-        # trying to set baudrate at 9600
-        self.dev.open_device(baudrate=9600)
-        self.dev.write_pkg(package)
-        time.sleep(0.260)
-        self.dev.close_device()
-
-        # at last open the device with the setted baudrate
-        self.dev.open_device(baudrate=baudrate)
+        # other processes sharing the port must not talk in between
+        with self._transaction():
+            if sernos and self._fast_sync(package, baudrate, list(sernos)):
+                self.bus_synced = True
+                return True
+
+            # first close the device
+            self.dev.close_device()
+
+            # trying to set the baudrate at 1200, 2400, 4800 and 9600
+            for rate, delay in self._sync_delays:
+                self.dev.open_device(baudrate=rate)
+                self.dev.write_pkg(package)
+                time.sleep(delay)
+                self.dev.close_device()
+
+            # at last open the device with the setted baudrate
+            self.dev.open_device(baudrate=baudrate)
+            time.sleep(1.000)
+
         self.bus_synced = True
-        time.sleep(1.000)
 
         return True
 
-    def scan(self, minserial=0, maxserial=16777215):
+    def scan(self, minserial=0, maxserial=16777215, candidates=None):
         """ Command to scan the IMPBUS for connected probes.
 
         This command can be uses to search the IMPBus2 for connected probes. It
@@ -215,24 +548,231 @@ class Bus:
             ranges, spanning only two serial numbers. Than we can query them
             directly, using the :func:`probe_module_short` command.
 
+            Because we only divide ranges which are known to be occupied, we
+            can skip the :func:`probe_range` command for the lower half, if
+            the higher half turns out to be empty. The number of bus
+            transactions used by the last scan can be found in
+            :attr:`scan_stats`.
+
+            If a single probe answers a :func:`probe_range` command, the
+            reply byte is the CRC of its serial number. So if some likely
+            serial numbers are known, they can be passed as `candidates`.
+            Whenever a range answers with a clean byte which matches exactly
+            one candidate within that range, the candidate is called up
+            directly instead of dividing the range down to the last two
+            serial numbers. As colliding replies might garble into the CRC
+            of a candidate, the rest of the range is searched afterwards as
+            well. Garbled or multiple reply bytes which don't match a
+            candidate fall back to the normal search.
+
         :param minserial: Start of the range to search (usually: 0).
         :type  minserial: int
 
         :param maxserial: End of the range to search (usually: 16777215).
         :type  maxserial: int
 
+        :param candidates: Serial numbers likely to be found.
+        :type  candidates: iterable
+
         :rtype: tuple
 
         """
-        sernos = list()
+        sernos = [x for x, _ in self.scan_iter(minserial, maxserial,
+                                               candidates)]
+        sernos.sort()
+
+        return tuple(sernos)
+
+    def scan_iter(self, minserial=0, maxserial=16777215, candidates=None):
+        """ Generator to scan the IMPBus2 for connected probes.
+
+        Works exactly like :func:`scan`, but instead of returning all the
+        serial numbers at the end, each serial number is yielded the moment
+        it is confirmed by :func:`probe_module_short`. Together with the
+        serial number a copy of :attr:`scan_stats` is yielded, telling the
+        number of ranges still `pending` and the number of `transactions`
+        used so far::
+
+            >>> for serno, progress in bus.scan_iter():
+            ...     modules.append(Module(bus, serno))
+
+        :param minserial: Start of the range to search (usually: 0).
+        :type  minserial: int
+
+        :param maxserial: End of the range to search (usually: 16777215).
+        :type  maxserial: int
+
+        :param candidates: Serial numbers likely to be found.
+        :type  candidates: iterable
+
+        :rtype: generator of (int, dict) tuples
+
+        """
         rng, mark = _imprange(minserial, maxserial)
-        self._search(rng, mark, sernos)
 
-        sernos = [x for x in sernos if x >= minserial and x <= maxserial]
+        if candidates is not None:
+            self._crc_index = _crcindex(candidates)
+
+        self._reset_scan_stats()
+        try:
+            for serno in self._walk([(rng, mark)]):
+                if minserial <= serno <= maxserial:
+                    yield serno, dict(self.scan_stats)
+        finally:
+            self._crc_index = None
+
+    def scan_ranges(self, ranges, candidates=None):
+        """ Command to scan several serial number ranges in one pass.
+
+        Unlike :func:`scan`, which widens the range to the next aligned
+        block, the given `(minserial, maxserial)` ranges are merged and
+        covered exactly by the smallest list of aligned blocks, so no serial
+        number outside of the ranges is ever probed. All blocks are searched
+        the same way as :func:`scan` does it::
+
+            >>> bus.scan_ranges([(10000, 10999), (33000, 34000)])
+            (10010, 33512)
+
+        :param ranges: The `(minserial, maxserial)` ranges to search.
+        :type  ranges: iterable
+
+        :param candidates: Serial numbers likely to be found.
+        :type  candidates: iterable
+
+        :rtype: tuple
+
+        """
+        merged = list()
+        for low, high in sorted(ranges):
+            if merged and low <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+
+        blocks = list()
+        for low, high in merged:
+            blocks.extend(_impcover(low, high))
+
+        if candidates is not None:
+            self._crc_index = _crcindex(candidates)
+
+        self._reset_scan_stats()
+        try:
+            sernos = list(self._walk(blocks))
+        finally:
+            self._crc_index = None
+
         sernos.sort()
 
         return tuple(sernos)
 
+    def rescan(self, filename, minserial=0, maxserial=16777215):
+        """ Command to scan the IMPBus2, starting from a saved topology.
+
+        Most of the time the probes connected to a bus don't change between
+        two scans. So instead of searching the whole range again, this
+        command loads the serial numbers found last time from the json file
+        `filename` and calls them up directly, using the
+        :func:`probe_module_short` command. Afterwards only the gaps between
+        the confirmed probes are searched for new probes, the same way as
+        :func:`scan` does it. The result is saved back to `filename`::
+
+            >>> bus.rescan('/var/lib/implib2/ttyUSB0.json')
+            (10010, 10011)
+
+        If the file doesn't exist yet, the whole range is searched. Saved
+        probes outside of the range are left untouched.
+
+        :param filename: The json file holding the topology.
+        :type  filename: string
+
+        :param minserial: Start of the range to search (usually: 0).
+        :type  minserial: int
+
+        :param maxserial: End of the range to search (usually: 16777215).
+        :type  maxserial: int
+
+        :rtype: tuple
+
+        """
+        try:
+            with open(filename) as js_file:
+                known = json.load(js_file)
+        except (IOError, ValueError):
+            known = list()
+
+        outside = [x for x in known if not minserial <= x <= maxserial]
+        known = sorted(x for x in known if minserial <= x <= maxserial)
+
+        self._reset_scan_stats()
+
+        sernos = list(self._walk([(x, 0) for x in known]))
+
+        # the gaps between the confirmed probes could hold new ones
+        blocks = list()
+        lower = minserial
+        for serno in sernos + [maxserial + 1]:
+            blocks.extend(_impcover(lower, serno - 1))
+            lower = serno + 1
+
+        sernos.extend(self._walk(blocks))
+        sernos.sort()
+        with open(filename, 'w') as js_file:
+            json.dump(sorted(sernos + outside), js_file)
+
+        return tuple(sernos)
+
+    def verify_present(self, sernos):
+        """ Command to check whether a known set of probes is still connected.
+
+        The expected serial numbers are split into runs of consecutive
+        numbers. The probes of a run are called up one by one with
+        :func:`probe_module_short`, as usually all of them are there. As
+        soon as one is missing, its neighbours are likely to be missing as
+        well: The rest of the run is split into the smallest list of aligned
+        blocks which can be addressed by a single :func:`probe_range`
+        command. A block which stays silent is missing as a whole, at the
+        first block which answers the probes are called up one by one
+        again::
+
+            >>> bus.verify_present(range(10000, 10060))
+            (10042,)
+
+        So a fully populated bus needs one :func:`probe_module_short` per
+        probe, while a missing group of probes only costs a few packets.
+
+        :param sernos: Serial numbers of the probes expected on the bus.
+        :type  sernos: iterable
+
+        :rtype: tuple containing the serial numbers of the missing probes.
+
+        """
+        sernos = sorted(set(sernos))
+        missing = list()
+
+        runs = list()
+        for serno in sernos:
+            if runs and runs[-1][1] == serno - 1:
+                runs[-1][1] = serno
+            else:
+                runs.append([serno, serno])
+
+        for serno, upper in runs:
+            while serno <= upper:
+                if self.probe_module_short(serno):
+                    serno += 1
+                    continue
+
+                missing.append(serno)
+                lower, serno = serno + 1, upper + 1
+                for rng, mark in _impcover(lower, upper):
+                    if not mark or self.probe_range(rng + mark):
+                        serno = rng
+                        break
+                    missing.extend(range(rng, rng + 2 * mark))
+
+        return tuple(missing)
+
     def find_single_module(self):
         """ Find a single module on the Bus.
 
@@ -246,15 +786,13 @@ class Bus:
         package = self.cmd.get_negative_ack()
 
         try:
-            self.dev.write_pkg(package)
-            self._wait(len(package))
-            bytes_recv = self.dev.read_pkg()
+            bytes_recv = self._transfer('negative_ack', None, package,
+                                        self.dev.read_pkg)
         except DeviceError:
             return False
-        finally:
-            time.sleep(self.cycle_wait)
 
-        return self.res.get_negative_ack(bytes_recv)
+        return self._parse('negative_ack', None,
+                           self.res.get_negative_ack, bytes_recv)
 
     def probe_module_long(self, serno):
         """ This command with will call up the slave which is addressed
@@ -271,15 +809,13 @@ class Bus:
         package = self.cmd.get_long_ack(serno)
 
         try:
-            self.dev.write_pkg(package)
-            self._wait(len(package))
-            bytes_recv = self.dev.read_pkg()
+            bytes_recv = self._transfer('long_ack', serno, package,
+                                        self.dev.read_pkg)
         except DeviceError:
             return False
-        finally:
-            time.sleep(self.cycle_wait)
 
-        return self.res.get_long_ack(bytes_recv, serno)
+        return self._parse('long_ack', serno,
+                           self.res.get_long_ack, bytes_recv, serno)
 
     def probe_module_short(self, serno):
         """This command will call up the slave which is addressed by its serial
@@ -297,15 +833,13 @@ class Bus:
         package = self.cmd.get_short_ack(serno)
 
         try:
-            self.dev.write_pkg(package)
-            self._wait(len(package))
-            bytes_recv = self.dev.read_bytes(1)
+            bytes_recv = self._transfer('short_ack', serno, package,
+                                        self.dev.read_bytes, 1)
         except DeviceError:
             return False
-        finally:
-            time.sleep(self.cycle_wait)
 
-        return self.res.get_short_ack(bytes_recv, serno)
+        return self._parse('short_ack', serno,
+                           self.res.get_short_ack, bytes_recv, serno)
 
     def probe_range(self, broadcast):
         """ This command is very similar to probe_module_short(). However,
@@ -321,11 +855,9 @@ class Bus:
 
         """
         package = self.cmd.get_range_ack(broadcast)
-        self.dev.write_pkg(package)
-        self._wait(len(package))
-        bytes_recv = self.dev.read()
-        time.sleep(self.cycle_wait)
-        return self.res.get_range_ack(bytes_recv)
+        bytes_recv = self._transfer('range_ack', None, package, self.dev.read)
+        return self._parse('range_ack', None,
+                           self.res.get_range_ack, bytes_recv)
 
     def get(self, serno, table, param):
         """This is the base command for getting some information from the
@@ -351,12 +883,298 @@ class Bus:
         :rtype: :const:`bool`
 
         """
+        if self.cache is not None and self.cache.caches(table, param):
+            return self._get_cached(serno, table, param)
+        return self._get(serno, table, param)
+
+    def _get(self, serno, table, param):
         package = self.cmd.get_parameter(serno, table, param)
-        self.dev.write_pkg(package)
-        self._wait(len(package))
-        bytes_recv = self.dev.read_pkg()
-        time.sleep(self.cycle_wait)
-        return self.res.get_parameter(bytes_recv, table, param)
+        bytes_recv = self._transfer('get', serno, package, self.dev.read_pkg)
+        return self._parse('get', serno, self.res.get_parameter,
+                           bytes_recv, table, param)
+
+    def _record_config(self, serno, table):
+        # the ConfigID is read before the first values of a table, so the
+        # values can be validated once they expire.
+        if self.cache.validatable(table) and \
+                self.cache.config(serno, table) is None:
+            config = self._get(serno, table, 'ConfigID')
+            self.cache.store_config(serno, table, config)
+
+    def _get_cached(self, serno, table, param):
+        value = self.cache.lookup(serno, table, param)
+
+        # a single ConfigID read renews all the values of the table
+        if value is None and self.cache.validatable(table) and \
+                self.cache.expired(serno, table, param):
+            config = self._get(serno, table, 'ConfigID')
+            if self.cache.validate(serno, table, config):
+                value = self.cache.lookup(serno, table, param)
+
+        if value is not None:
+            self.cache.stats['hits'] += 1
+            return value
+
+        self.cache.stats['misses'] += 1
+        self._record_config(serno, table)
+        value = self._get(serno, table, param)
+        self.cache.store(serno, table, param, value)
+
+        return value
+
+    def get_all(self, sernos, table, param, budget=0.0, skip_dead=True):
+        """Command to get the same parameter from several probes. Unlike a
+        loop over :func:`get`, a probe which fails doesn't stop the others.
+        Every probe is retried every `retry_wait` seconds until it answers
+        or `budget` seconds are used up. The probes which don't answer at
+        all are remembered in :attr:`dead`, and skipped by the next calls
+        for `dead_retry` seconds as long as `skip_dead` is set. The values
+        and the errors are returned by serial number::
+
+            >>> values, errors = bus.get_all(sernos, 'SYSTEM_PARAMETER_TABLE',
+            ...                              'FWVersion')
+            >>> errors
+            {10012: DeviceError('Timeout reading header!')}
+
+        :param sernos: Serial numbers of the probes to request.
+        :type  sernos: iterable
+
+        :param table: System table containing the requested infomation.
+        :type  table: string
+
+        :param param: Parameter od row containing the requested infomation.
+        :type  param: string
+
+        :param budget: Time in seconds to retry a failing probe.
+        :type  budget: float
+
+        :param skip_dead: Whether to skip the probes known to be dead.
+        :type  skip_dead: bool
+
+        :rtype: tuple of two dicts, the values and the errors.
+
+        """
+        # pylint: disable=too-many-arguments
+        return self._fan_out(sernos, lambda x: self.get(x, table, param),
+                             budget, skip_dead)
+
+    def set_all(self, sernos, table, param, value, ad_param=0, budget=0.0,
+                skip_dead=True):
+        """Command to set the same parameter of several probes. It's the
+        counterpart of :func:`get_all`. Unlike a broadcast, every probe
+        acknowledges the value on its own.
+
+        :param sernos: Serial numbers of the probes to address.
+        :type  sernos: iterable
+
+        :param table: System table to store the infomation.
+        :type  table: string
+
+        :param param: Parameter od row containing the requested infomation.
+        :type  param: string
+
+        :param value: Values to store.
+        :type  value: iterable
+
+        :param budget: Time in seconds to retry a failing probe.
+        :type  budget: float
+
+        :param skip_dead: Whether to skip the probes known to be dead.
+        :type  skip_dead: bool
+
+        :rtype: tuple of two dicts, the results and the errors.
+
+        """
+        # pylint: disable=too-many-arguments
+        return self._fan_out(
+            sernos, lambda x: self.set(x, table, param, value, ad_param),
+            budget, skip_dead)
+
+    def _readable(self, table):
+        # whether the table can be read as a whole by get_table
+        try:
+            self.tbl.lookup(table, 'GetData')
+        except TablesError:
+            return False
+        return True
+
+    def get_many(self, serno, table, params):
+        """Command to get several parameters of one table. Depending on the
+        estimated bus time, either every parameter is requested on its own
+        using :func:`get`, or the whole table is read with
+        :func:`get_table` and the requested parameters are picked from it.
+        One or two parameters, or those of tables which can't be read as a
+        whole (without `GetData`), are always requested on their own::
+
+            >>> table = 'MEASURE_PARAMETER_TABLE'
+            >>> bus.get_many(33912, table, ['Moist', 'CompTemp', 'TDRValue'])
+            {'Moist': (12.3,), 'CompTemp': (21.0,), 'TDRValue': (512.0,)}
+
+        :param serno: Serial number of the probe to request.
+        :type  serno: int
+
+        :param table: System table containing the requested infomation.
+        :type  table: string
+
+        :param params: The parameters to request.
+        :type  params: list
+
+        :rtype: dict
+
+        """
+        rows = dict(self.tbl.parameters(table))
+        params = list(params)
+
+        # the special parameters are not part of the table data
+        bulk = [x for x in params if x in rows]
+        single = [x for x in params if x not in rows]
+
+        if len(params) > 2 and bulk and self._readable(table):
+            table_time = self._get_time(
+                [sum(x['Length'] for x in rows.values())])
+            params_time = self._get_time([rows[x]['Length'] for x in bulk])
+
+            if table_time < params_time:
+                values = self.get_table(serno, table)
+                values = {x: values[x] for x in bulk}
+                for param in single:
+                    values[param] = self.get(serno, table, param)
+                return values
+
+        return {x: self.get(serno, table, x) for x in params}
+
+    def get_table(self, serno, table):
+        """Command to get a whole table in a single request. The probe
+        replies the concatenated values of the table by the parameter
+        `GetData`, split into several packages if they don't fit into one.
+        The values are returned by parameter name::
+
+            >>> bus.get_table(33912, 'SYSTEM_PARAMETER_TABLE')['SerialNum']
+            (33912,)
+
+        :param serno: Serial number of the probe to request.
+        :type  serno: int
+
+        :param table: System table to request.
+        :type  table: string
+
+        :rtype: dict
+
+        """
+        cached = self.cache is not None and table not in self.cache.uncached
+        if cached:
+            self._record_config(serno, table)
+
+        package = self.cmd.get_table(serno, table)
+        packets = self._transfer('get', serno, package, self.dev.read_pkgs)
+        values = self._parse('get', serno, self.res.get_table, packets, table)
+
+        if cached:
+            for param, value in values.items():
+                self.cache.store(serno, table, param, value)
+
+        return values
+
+    def measure_all(self, sernos, quantities=('Moist',), poll=0.500,
+                    timeout=10.0):
+        """Command to measure with several probes at the same instant. The
+        measurement is started on all the connected probes by a single
+        broadcast, setting the parameter `StartMeasure` of the
+        'ACTION_PARAMETER_TABLE'. Afterwards the probes are polled every
+        `poll` seconds until all of them finished, and the requested
+        quantities are read using :func:`get_many`. Like :func:`get_all`, a
+        probe which fails or doesn't finish within `timeout` seconds doesn't
+        stop the others. The values and the errors are returned by serial
+        number::
+
+            >>> values, errors = bus.measure_all([10010, 10011],
+            ...                                  ['Moist', 'CompTemp'])
+            >>> values
+            {10010: {'Moist': (12.3,), 'CompTemp': (21.0,)},
+             10011: {'Moist': (14.1,), 'CompTemp': (20.5,)}}
+
+        .. note:: Only probes in the event mode 'NormalMeasure' and the
+            measure mode 'ModeA' start a measurement. The broadcast reaches
+            every probe on the bus, not only the given ones. The
+            `MeasureCount` of every probe is read before the broadcast, a
+            probe which didn't count a new measurement is reported as an
+            error instead of returning its old values.
+
+        :param sernos: Serial numbers of the probes to read.
+        :type  sernos: iterable
+
+        :param quantities: The measure quantities to request.
+        :type  quantities: iterable
+
+        :param poll: Time in seconds between two polls.
+        :type  poll: float
+
+        :param timeout: Time in seconds to wait for the measurements.
+        :type  timeout: float
+
+        :rtype: tuple of two dicts, the values and the errors.
+
+        """
+        # pylint: disable=too-many-arguments
+        address = 16777215
+        table = 'ACTION_PARAMETER_TABLE'
+        param = 'StartMeasure'
+        value = 1
+        ad_param = 0
+
+        sernos = list(sernos)
+        package = self.cmd.set_parameter(address, table, param,
+                                         [value], ad_param)
+
+        # probes ignoring the broadcast still hold their old values
+        request = list(quantities)
+        if 'MeasureCount' not in request:
+            request.append('MeasureCount')
+        counts, errors = self._fan_out(
+            sernos,
+            lambda x: self.get(x, 'MEASURE_PARAMETER_TABLE',
+                               'MeasureCount')[0],
+            0.0, False)
+
+        # broadcasts are not answered
+        with self._transaction():
+            self.dev.write_pkg(package)
+            self._wait(len(package), process_time=self.process_time['set'])
+
+        deadline = time.time() + timeout
+
+        def running(serno):
+            try:
+                return self.get(serno, table, param)[0]
+            except (DeviceError, PackageError, ResponceError) as err:
+                errors[serno] = err
+                return False
+
+        pending = [x for x in sernos if x not in errors]
+        while pending:
+            pending = [x for x in pending if running(x)]
+            if pending and time.time() >= deadline:
+                for serno in pending:
+                    errors[serno] = BusError("Measurement of probe %s timed "
+                                             "out!" % serno)
+                break
+            if pending:
+                time.sleep(poll)
+
+        values, failed = self._fan_out(
+            [x for x in sernos if x not in errors],
+            lambda x: self.get_many(x, 'MEASURE_PARAMETER_TABLE', request),
+            0.0, False)
+        errors.update(failed)
+
+        for serno in list(values):
+            if values[serno]['MeasureCount'][0] == counts[serno]:
+                del values[serno]
+                errors[serno] = BusError("Probe %s didn't measure!" % serno)
+            elif 'MeasureCount' not in quantities:
+                del values[serno]['MeasureCount']
+
+        return values, errors
 
     def set(self, serno, table, param, value, ad_param=0):
         """This is the base command for sending and storing some information in
@@ -388,13 +1206,14 @@ class Bus:
 
         """
         # pylint: disable=too-many-arguments
+        if self.cache is not None:
+            self.cache.invalidate(None if serno == 16777215 else serno, table)
+
         package = self.cmd.set_parameter(serno, table, param,
                                          value, ad_param)
-        self.dev.write_pkg(package)
-        self._wait(len(package))
-        bytes_recv = self.dev.read_pkg()
-        time.sleep(self.cycle_wait)
-        return self.res.set_parameter(bytes_recv, table, serno)
+        bytes_recv = self._transfer('set', serno, package, self.dev.read_pkg)
+        return self._parse('set', serno, self.res.set_parameter,
+                           bytes_recv, table, serno)
 
     def get_eeprom_page(self, serno, page_nr):
         """This is the base command for reading a single page of EEPRom data
@@ -410,11 +1229,10 @@ class Bus:
 
         """
         package = self.cmd.get_epr_page(serno, page_nr)
-        self.dev.write_pkg(package)
-        self._wait(len(package))
-        bytes_recv = self.dev.read_pkg()
-        time.sleep(self.cycle_wait)
-        return self.res.get_epr_page(bytes_recv)
+        bytes_recv = self._transfer('get_epr_page', serno, package,
+                                    self.dev.read_pkg)
+        return self._parse('get_epr_page', serno,
+                           self.res.get_epr_page, bytes_recv)
 
     def set_eeprom_page(self, serno, page_nr, page):
         """This is the base command for writing a single page of EEPRom data
@@ -432,11 +1250,13 @@ class Bus:
         :type  page: bytes
 
         """
+        if self.cache is not None:
+            self.cache.invalidate(serno)
+
         package = self.cmd.set_epr_page(serno, page_nr, page)
 
-        self.dev.write_pkg(package)
-        self._wait(len(package))
-        bytes_recv = self.dev.read_pkg()
-        time.sleep(self.cycle_wait)
+        bytes_recv = self._transfer('set_epr_page', serno, package,
+                                    self.dev.read_pkg)
 
-        return self.res.set_epr_page(bytes_recv)
+        return self._parse('set_epr_page', serno,
+                           self.res.set_epr_page, bytes_recv)
@@ -0,0 +1,159 @@
+# -*- coding: UTF-8 -*-
+
+import time
+
+from .imp_tables import Tables, TablesError
+
+
+class Cache(object):
+    """Parameter cache for :func:`Bus.get`.
+
+    The cache follows the `Status` of the parameters in the tables:
+    Read-only parameters ('OR') are kept forever, writable ones ('WR') for
+    `ttl` seconds. The `ConfigID` of a table is recorded along with its
+    first values. Once they are expired, a table is validated by reading
+    its `ConfigID` again: If it didn't change, all the cached parameters of
+    the table are good for another `ttl` seconds. Tables without a
+    `ConfigID` can't be validated, their writable parameters are simply
+    read again once they are expired. The measure and action tables
+    as well as the special parameters (ConfigID, TableSize, ...) are never
+    cached. Any :func:`Bus.set` drops the cached values of its table.
+
+    The number of hits, misses and ConfigID validations is counted in
+    :attr:`stats`.
+
+    :param ttl: Time in seconds to keep writable parameters.
+    :type  ttl: float
+
+    """
+    uncached = ('MEASURE_PARAMETER_TABLE', 'ACTION_PARAMETER_TABLE')
+
+    def __init__(self, ttl=60.0, tables=None):
+        self.ttl = ttl
+        self.tbl = Tables() if tables is None else tables
+        self.stats = {
+            'hits':        0,
+            'misses':      0,
+            'validations': 0}
+
+        # {(serno, table): {'config': ..., 'values': {param: (value, time)}}}
+        self._tables = dict()
+
+    def _expired(self, param, stored):
+        if param['Status'] == 'OR':
+            return False
+        return time.time() - stored > self.ttl
+
+    def caches(self, table, param):
+        """Whether the parameter of the table is cached at all.
+
+        :rtype: bool
+
+        """
+        if table in self.uncached:
+            return False
+        return self.tbl.lookup(table, param)['No'] < 251
+
+    def validatable(self, table):
+        """Whether the table has a `ConfigID` to validate its values by.
+
+        :rtype: bool
+
+        """
+        try:
+            self.tbl.lookup(table, 'ConfigID')
+        except TablesError:
+            return False
+        return True
+
+    def lookup(self, serno, table, param):
+        """Returns the cached value, or None if the value is unknown or
+        expired.
+
+        :rtype: tuple
+
+        """
+        entry = self._tables.get((serno, table))
+        if entry is None or param not in entry['values']:
+            return None
+
+        value, stored = entry['values'][param]
+        if self._expired(self.tbl.lookup(table, param), stored):
+            return None
+
+        return value
+
+    def expired(self, serno, table, param):
+        """Whether the value is known, but has expired.
+
+        :rtype: bool
+
+        """
+        entry = self._tables.get((serno, table))
+        if entry is None or param not in entry['values']:
+            return False
+
+        stored = entry['values'][param][1]
+        return self._expired(self.tbl.lookup(table, param), stored)
+
+    def config(self, serno, table):
+        """Returns the `ConfigID` the cached values of the table belong to,
+        or None if it is unknown.
+
+        :rtype: tuple
+
+        """
+        entry = self._tables.get((serno, table))
+        return None if entry is None else entry['config']
+
+    def store_config(self, serno, table, config):
+        """Stores the `ConfigID` read before the first values of a table."""
+        entry = self._tables.setdefault((serno, table),
+                                        {'config': None, 'values': dict()})
+        entry['config'] = config
+
+    def store(self, serno, table, param, value):
+        """Stores a value read from the probe."""
+        entry = self._tables.setdefault((serno, table),
+                                        {'config': None, 'values': dict()})
+        entry['values'][param] = (value, time.time())
+
+    def validate(self, serno, table, config):
+        """Checks the `ConfigID` read from the probe against the one from
+        the last validation. If it didn't change, all the values of the
+        table are renewed. Otherwise they are dropped.
+
+        :rtype: bool
+        :return: Whether the cached values are still valid.
+
+        """
+        self.stats['validations'] += 1
+        entry = self._tables.setdefault((serno, table),
+                                        {'config': None, 'values': dict()})
+
+        if entry['config'] is not None and entry['config'] == config:
+            now = time.time()
+            entry['values'] = {k: (v, now)
+                               for k, (v, _) in entry['values'].items()}
+            return True
+
+        entry['config'] = config
+        entry['values'] = dict()
+        return False
+
+    def invalidate(self, serno=None, table=None):
+        """Drops the cached values of a probe and/or table, or all of them.
+
+        :param serno: The probe to drop, or None for all.
+        :type  serno: int
+
+        :param table: The table to drop, or None for all.
+        :type  table: string
+
+        """
+        for key in list(self._tables):
+            if serno is not None and not key[0] == serno:
+                continue
+            if table is not None and not key[1] == table:
+                continue
+            del self._tables[key]
@@ -0,0 +1,161 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import heapq
+
+from .imp_device import DeviceError
+from .imp_packages import PackageError
+from .imp_responces import ResponceError
+
+
+class Collector(object):
+    """Collects the measurements of probes measuring cyclically on their
+    own, in the measure mode 'ModeC' (see :func:`Module.set_measure_mode`).
+
+    Instead of starting a measurement, waiting for it and reading the
+    result, the collector never sends `StartMeasure`. It reads the
+    'MEASURE_PARAMETER_TABLE' by a single :func:`Bus.get_table` whenever the
+    next sample of a probe is due, and uses the `MeasureCount` of the table
+    to tell new samples from the ones already collected::
+
+        >>> collector = Collector([module10, module11], ['Moist'])
+        >>> for serno, values in collector.collect_iter():
+        ...     store(serno, values['MeasureCount'], values['Moist'])
+
+    The cycle of a probe is first taken from its `SleepTimeInModeC`, times
+    `scale` seconds, and afterwards learned from the time between new
+    samples. If the `SleepTimeInModeC` can't be read, the probe is read
+    every `retry` seconds until its cycle is learned. A read which doesn't
+    bring a new sample, or which failed, is repeated after `retry` seconds.
+    A failing probe doesn't stop the others, like :func:`Bus.get_all` the
+    errors are reported by serial number. The number of samples missed in
+    between two reads and the number of failed reads are counted in
+    :attr:`stats`.
+
+    :param modules: The probes to collect from.
+    :type  modules: iterable of :class:`Module`
+
+    :param quantities: The measure quantities to collect.
+    :type  quantities: iterable
+
+    :param scale: Seconds per unit of `SleepTimeInModeC`.
+    :type  scale: float
+
+    :param retry: Time in seconds to wait after a read without news.
+    :type  retry: float
+
+    :param weight: Weight of a new cycle time within the running average.
+    :type  weight: float
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, modules, quantities=('Moist',), scale=0.001,
+                 retry=0.250, weight=0.25):
+        self.modules = list(modules)
+        self.quantities = list(quantities)
+        self.scale = scale
+        self.retry = retry
+        self.weight = weight
+
+        self.stats = {
+            'reads':      0,
+            'samples':    0,
+            'duplicates': 0,
+            'missed':     0,
+            'errors':     0}
+
+        # {serno: [cycle time, last count, time of the last count]}
+        self._probes = dict()
+        self._pending = list()
+        self._scheduled = False
+
+    def _cycle(self, module):
+        table = 'DEVICE_CONFIGURATION_PARAMETER_TABLE'
+        param = 'SleepTimeInModeC'
+        try:
+            return module.bus.get(module.serno, table, param)[0] * self.scale
+        except (DeviceError, PackageError, ResponceError):
+            return None
+
+    def _schedule(self):
+        # every probe is read right away the first time
+        self._pending = list()
+        for position, module in enumerate(self.modules):
+            self._probes[module.serno] = [self._cycle(module), None, None]
+            heapq.heappush(self._pending, (time.time(), position, module))
+        self._scheduled = True
+
+    def _read(self, module):
+        table = 'MEASURE_PARAMETER_TABLE'
+        probe = self._probes[module.serno]
+
+        self.stats['reads'] += 1
+        values = module.bus.get_table(module.serno, table)
+        count = values['MeasureCount'][0]
+        now = time.time()
+
+        if count == probe[1]:
+            self.stats['duplicates'] += 1
+            return now + self.retry, None
+
+        if probe[1] is not None:
+            samples = (count - probe[1]) % 2**32
+            self.stats['missed'] += samples - 1
+            cycle = (now - probe[2]) / samples
+            if probe[0] is not None:
+                cycle = (1 - self.weight) * probe[0] + self.weight * cycle
+            probe[0] = cycle
+
+        probe[1], probe[2] = count, now
+        self.stats['samples'] += 1
+
+        result = {x: values[x][0] for x in self.quantities}
+        result['MeasureCount'] = count
+
+        return now + (self.retry if probe[0] is None else probe[0]), result
+
+    def poll(self):
+        """Reads all the probes which are due, without waiting for the
+        others.
+
+        :rtype: tuple of a list and a dict
+        :return: The serial numbers and values of the new samples, and the
+                 errors of the probes which failed by serial number.
+
+        """
+        if not self._scheduled:
+            self._schedule()
+
+        samples, errors = list(), dict()
+        while self._pending and self._pending[0][0] <= time.time():
+            _, position, module = heapq.heappop(self._pending)
+
+            # a failed read is retried as well
+            try:
+                due, values = self._read(module)
+            except (DeviceError, PackageError, ResponceError) as err:
+                self.stats['errors'] += 1
+                errors[module.serno] = err
+                due, values = time.time() + self.retry, None
+            heapq.heappush(self._pending, (due, position, module))
+
+            if values is not None:
+                samples.append((module.serno, values))
+
+        return samples, errors
+
+    def collect_iter(self):
+        """Generator collecting the samples of all the probes, sleeping
+        until the next one is due. The serial number and the values of a
+        probe are yielded as soon as a new sample was read. Failed reads
+        are only counted in :attr:`stats`.
+
+        :rtype: generator of (int, dict) tuples
+
+        """
+        while True:
+            for sample in self.poll()[0]:
+                yield sample
+
+            if self._pending:
+                time.sleep(max(self._pending[0][0] - time.time(), 0))
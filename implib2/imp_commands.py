@@ -34,6 +34,9 @@ class Command:
         package = self.pkg.pack(serno=serno, cmd=cmd['Get'], data=data)
         return package
 
+    def get_table(self, serno, table):
+        return self.get_parameter(serno, table, 'GetData')
+
     # pylint: disable=too-many-arguments
     def set_parameter(self, serno, table, param, values, ad_param=0):
         cmd = self.tbl.lookup(table, param)
@@ -1,18 +1,143 @@
 # -*- coding: UTF-8 -*-
 
+import os
 import time
+import json
+import errno
 import struct
+import tempfile
+import contextlib
 
 import serial
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 class DeviceError(Exception):
     pass
 
 
+class PortLock(object):
+    """Advisory lock to share a serial port between several processes.
+
+    Instead of holding the port for a whole session, the lock is taken for
+    every single transaction (see :func:`Device.transaction`). In order to
+    not starve anyone, the lock is granted in the order it was asked for:
+    The processes draw tickets from a queue kept in the json file
+    `filename`, which is guarded by :func:`fcntl.flock`. Whoever's ticket
+    is at the head of the queue holds the lock. The tickets of dead
+    processes are dropped. The time spent waiting for the lock is counted
+    in :attr:`stats`.
+
+    :param filename: The file holding the queue.
+    :type  filename: string
+
+    :param poll: Time in seconds between two looks at the queue.
+    :type  poll: float
+
+    """
+    def __init__(self, filename, poll=0.001):
+        if fcntl is None:
+            raise DeviceError("Port locking needs fcntl!")
+
+        self.filename = filename
+        self.poll = poll
+        self.stats = {
+            'acquired': 0,
+            'wait_sum': 0.0,
+            'wait_max': 0.0}
+
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o666)
+        self._ticket = None
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except OSError as err:
+            return err.errno == errno.EPERM
+        return True
+
+    def _update(self, change):
+        # calls change(state) with the queue file locked and saves the state
+        # if it was changed, the polls mostly just look at the queue.
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            saved = os.read(self._fd, 65536)
+            try:
+                state = json.loads(saved.decode())
+            except ValueError:
+                state = {'next': 0, 'queue': list()}
+
+            result = change(state)
+
+            data = json.dumps(state).encode()
+            if not data == saved:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.ftruncate(self._fd, 0)
+                os.write(self._fd, data)
+
+            return result
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _enqueue(state):
+        ticket = state['next']
+        state['next'] += 1
+        state['queue'].append([ticket, os.getpid()])
+        return ticket
+
+    def _serving(self, state, ticket):
+        queue = state['queue']
+        while queue and not queue[0][0] == ticket and \
+                not self._alive(queue[0][1]):
+            queue.pop(0)
+        return bool(queue) and queue[0][0] == ticket
+
+    def _dequeue(self, state, ticket):
+        state['queue'] = [x for x in state['queue'] if not x[0] == ticket]
+
+    def acquire(self):
+        """Waits for the turn of this process and takes the lock."""
+        started = time.time()
+
+        ticket = self._update(self._enqueue)
+        try:
+            while not self._update(lambda x: self._serving(x, ticket)):
+                time.sleep(self.poll)
+        except BaseException:
+            # don't leave a ticket behind, which would block everyone else
+            # for as long as this process lives.
+            self._update(lambda x: self._dequeue(x, ticket))
+            raise
+
+        self._ticket = ticket
+
+        wait = time.time() - started
+        self.stats['acquired'] += 1
+        self.stats['wait_sum'] += wait
+        self.stats['wait_max'] = max(self.stats['wait_max'], wait)
+
+    def release(self):
+        """Releases the lock, the next process in the queue takes over."""
+        ticket, self._ticket = self._ticket, None
+        self._update(lambda x: self._dequeue(x, ticket))
+
+    def close(self):
+        """Closes the queue file."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
 class Device:
 
-    def __init__(self, port):
+    def __init__(self, port, shared=False, lockfile=None):
         self.ser = serial.serial_for_url(port, do_not_open=True)
         self.ser.bytesize = serial.EIGHTBITS
         self.ser.parity = serial.PARITY_ODD
@@ -21,8 +146,47 @@ class Device:
         self.ser.xonxoff = 0
         self.ser.rtscts = 0
         self.ser.dsrdtr = 0
+        self.timeout = self.ser.timeout
         self.is_open = False
 
+        self.lock = None
+        if shared:
+            if lockfile is None:
+                name = port.strip('/').replace('/', '_')
+                lockfile = os.path.join(tempfile.gettempdir(),
+                                        'implib2-%s.lock' % name)
+            self.lock = PortLock(lockfile)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Context manager holding the :class:`PortLock` of a shared device
+        for the duration of a single transaction."""
+        if self.lock is None:
+            yield
+            return
+
+        self.lock.acquire()
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def _read(self, length, deadline=None):
+        if deadline is None:
+            return self.ser.read(length)
+
+        # wait no longer than the deadline, but return as soon as all
+        # the requested bytes have arrived.
+        self.ser.timeout = max(deadline - time.time(), 0)
+        try:
+            return self.ser.read(length)
+        finally:
+            self.ser.timeout = self.timeout
+
+    def transfer_time(self, length):
+        # one start bit, eight data bits, a parity bit and two stop bits
+        return length * 12.0 / self.ser.baudrate
+
     def open_device(self, baudrate=9600):
         self.ser.baudrate = baudrate
         self.ser.open()
@@ -30,6 +194,13 @@ class Device:
         time.sleep(0.05)  # 50ms
         self.is_open = True
 
+    def set_baudrate(self, baudrate):
+        if not self.is_open:
+            self.open_device(baudrate=baudrate)
+        else:
+            # pyserial reconfigures an open port on the fly
+            self.ser.baudrate = baudrate
+
     def close_device(self):
         try:
             self.ser.flush()
@@ -40,6 +211,14 @@ class Device:
             time.sleep(0.05)  # 50ms
             self.is_open = False
 
+    def close(self):
+        """Closes the port for good, along with the queue file of its
+        :class:`PortLock`."""
+        if self.is_open:
+            self.close_device()
+        if self.lock is not None:
+            self.lock.close()
+
     def write_pkg(self, packet):
         if not self.is_open:
             raise DeviceError("Couldn't write packet, device is closed!")
@@ -51,12 +230,12 @@ class Device:
 
         return True
 
-    def read_pkg(self):
+    def read_pkg(self, deadline=None):
         if not self.is_open:
             raise DeviceError("Couldn't read packet, device is closed!")
 
         # read header, always 7 bytes
-        header = self.ser.read(7)
+        header = self._read(7, deadline)
 
         if len(header) < 7:
             raise DeviceError('Timeout reading header!')
@@ -69,29 +248,68 @@ class Device:
         if length == 0:
             return header
 
-        data = self.ser.read(length)
+        if deadline is not None:
+            deadline += self.transfer_time(length)
+
+        data = self._read(length, deadline)
 
         if len(data) < length:
             raise DeviceError('Timeout reading data!')
 
         return header + data
 
-    def read_bytes(self, length):
+    def read_pkgs(self, deadline=None):
+        # a state of 0xff tells there are more packets to follow
+        packets = [self.read_pkg(deadline)]
+
+        while bytearray(packets[-1][:1]) == b'\xff':
+            packets.append(self.read_pkg())
+
+        return packets
+
+    def read_bytes(self, length, deadline=None):
         if not self.is_open:
             raise DeviceError("Couldn't read bytes, device is closed!")
 
-        data = self.ser.read(length)
+        data = self._read(length, deadline)
 
         if len(data) < length:
             raise DeviceError('Timeout reading bytes!')
 
         return data
 
-    def read(self):
+    def _drain(self, deadline):
+        # the probes of a range may take their whole processing budget to
+        # reply, a late reply must not be taken for the next transaction.
+        if deadline is not None:
+            time.sleep(max(deadline + self.transfer_time(1) - time.time(), 0))
+
+    def read(self, deadline=None):
         if not self.is_open:
             raise DeviceError("Couldn't read byte, device is closed!")
 
-        byte = self.ser.read(1)
+        byte = self._read(1, deadline)
+        if byte:
+            self._drain(deadline)
         self.ser.flushInput()
 
         return byte
+
+    def read_ack(self, deadline=None):
+        if not self.is_open:
+            raise DeviceError("Couldn't read byte, device is closed!")
+
+        data = self._read(1, deadline)
+
+        # give the replies of other probes the time of one more byte to
+        # show up, so collisions can be told apart from a clean reply.
+        if data:
+            time.sleep(self.transfer_time(1))
+            self._drain(deadline)
+            waiting = self.ser.in_waiting
+            if waiting:
+                data += self.ser.read(waiting)
+
+        self.ser.flushInput()
+
+        return data
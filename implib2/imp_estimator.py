@@ -0,0 +1,159 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import collections
+
+
+class Estimator(object):
+    """Predicts how long the measurements of the probes take.
+
+    The estimator keeps a running average of the measured durations for
+    every kind of measurement and probe. Instead of polling `StartMeasure`
+    at a fixed interval, the time until shortly before the expected end can
+    be slept away, followed by polls every `interval` seconds. As long as
+    nothing is known about a measurement, the polls start right away.
+
+    An initial estimate can be given by :func:`seed`, e.g. derived from the
+    `MeasTimes` of the probe, see :class:`Module`. A measurement which has
+    already finished at the first poll only tells an upper bound of its
+    duration. In this case the estimate is halved, so an estimate which is
+    too high is corrected within a few measurements.
+
+    :param lead: Time in seconds to start polling before the expected end.
+    :type  lead: float
+
+    :param interval: Time in seconds between two polls.
+    :type  interval: float
+
+    :param weight: Weight of a new duration within the running average.
+    :type  weight: float
+
+    :param unit: Duration of a single measurement, in seconds, to seed the
+                 estimate from `MeasTimes`. Better too high than too low.
+    :type  unit: float
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, lead=0.050, interval=0.025, weight=0.25, unit=0.200,
+                 history=1000):
+        self.lead = lead
+        self.interval = interval
+        self.weight = weight
+        self.unit = unit
+
+        self.history = collections.deque(maxlen=history)
+        self._durations = dict()
+
+    def known(self, kind, serno):
+        """Whether there is an estimate for the measurement.
+
+        :rtype: bool
+
+        """
+        return (kind, serno) in self._durations
+
+    def seed(self, kind, serno, duration):
+        """Sets the initial estimate of a measurement, unless it's already
+        known.
+
+        :param kind: The kind of measurement, e.g. `'measure'`.
+        :type  kind: string
+
+        :param serno: Serial number of the probe.
+        :type  serno: int
+
+        :param duration: The expected duration, in seconds.
+        :type  duration: float
+
+        """
+        self._durations.setdefault((kind, serno), duration)
+
+    def expected(self, kind, serno):
+        """The expected duration of a measurement in seconds, or None if it
+        is unknown.
+
+        :rtype: float
+
+        """
+        return self._durations.get((kind, serno))
+
+    def delay(self, kind, serno, started):
+        """The time in seconds to wait before the first poll of a
+        measurement started at `started`.
+
+        :rtype: float
+
+        """
+        expected = self.expected(kind, serno)
+        if expected is None:
+            return 0.0
+        return max(started + expected - self.lead - time.time(), 0.0)
+
+    def report(self, kind, serno, duration):
+        """Feeds the duration of a finished measurement into the estimate.
+
+        :param kind: The kind of measurement.
+        :type  kind: string
+
+        :param serno: Serial number of the probe.
+        :type  serno: int
+
+        :param duration: The measured duration, in seconds.
+        :type  duration: float
+
+        """
+        key = (kind, serno)
+        if key in self._durations:
+            duration = (1 - self.weight) * self._durations[key] + \
+                self.weight * duration
+
+        self._durations[key] = duration
+        self.history.append((time.time(), kind, serno, duration))
+
+    def cut(self, kind, serno, bound):
+        """Halves the estimate of a measurement which finished before
+        `bound` seconds, but at an unknown time.
+
+        :param kind: The kind of measurement.
+        :type  kind: string
+
+        :param serno: Serial number of the probe.
+        :type  serno: int
+
+        :param bound: The upper bound of the duration, in seconds.
+        :type  bound: float
+
+        """
+        key = (kind, serno)
+        duration = min(self._durations.get(key, bound), bound) / 2
+
+        self._durations[key] = duration
+        self.history.append((time.time(), kind, serno, duration))
+
+    def wait(self, kind, serno, started, running):
+        """Waits for the measurement started at `started` to finish, using
+        `running` to poll the probe, and feeds the duration into the
+        estimate.
+
+        :param running: Called to poll, returns whether it's still running.
+        :type  running: callable
+
+        :rtype: float
+        :return: The duration of the measurement.
+
+        """
+        delay = self.delay(kind, serno, started)
+        time.sleep(delay)
+
+        early = True
+        while running():
+            early = False
+            time.sleep(self.interval)
+
+        duration = time.time() - started
+        if early and delay > 0:
+            self.cut(kind, serno, duration)
+        else:
+            self.report(kind, serno, duration)
+
+        return duration
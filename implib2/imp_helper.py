@@ -62,3 +62,48 @@ def _imprange(low, high):
     fill = mark | (mark - 1)
     mask = fill ^ 0xFFFFFF
     return low & mask, mark
+
+
+def _impcover(low, high):
+    """ .. funktion:: _impcover(low, high)
+
+    Takes a serial number range and splits it into the smallest list of
+    aligned blocks covering exactly that range. Each block is returned as a
+    (range address, marker) tuble like :func:`_imprange` does. Blocks holding
+    a single serial number have the marker 0 and can't be addressed by a
+    range probe.
+
+    :type low: int
+    :type high: int
+    :rtype: list
+
+    """
+    blocks = list()
+    while low <= high:
+        size = low & -low if low else 0x1000000
+        while size > high - low + 1:
+            size >>= 1
+        blocks.append((low, size >> 1))
+        low += size
+    return blocks
+
+
+def _crcindex(sernos):
+    """ .. funktion:: _crcindex(sernos)
+
+    Builds an index of the given serial numbers by the CRC a probe replies
+    to a range or short probe (the CRC of its serial number). The serial
+    numbers of each CRC are sorted.
+
+    :type sernos: iterable
+    :rtype: dict
+
+    """
+    import struct
+    from .imp_crc import MaximCRC
+    crc = MaximCRC()
+    index = dict()
+    for serno in sorted(set(sernos)):
+        key = struct.unpack('<B', crc.calc_crc(struct.pack('<I', serno)[:-1]))
+        index.setdefault(key[0], list()).append(serno)
+    return index
@@ -5,6 +5,8 @@ import struct
 import string
 
 from .imp_crc import MaximCRC
+from .imp_tables import Tables
+from .imp_datatypes import DataTypes
 
 
 class ModuleError(Exception):
@@ -44,19 +46,54 @@ class Module:
         >>> module11.get_fw_version()
         1.140301
 
+    In order to save bus time, a `Module` can be told to trust its own view
+    of the probe: The event mode, the measure mode, the unlock status and
+    whether a measurement is running are then mirrored after the first read
+    or successful write, and the redundant checks and writes are skipped.
+    This way :func:`start_measure` only needs a single transaction. If a
+    transaction fails, the mirrored state is dropped and read again from
+    the probe next time. Only use this if no one else changes the modes of
+    the probe behind the back of the `Module`::
+
+        >>> module10 = Module(bus, 10010, trusted=True)
+
+    Waiting for a measurement to finish, :func:`get_moisture` polls the
+    probe every 500ms. Given an :class:`Estimator`, which can be shared by
+    several `Module` objects, the expected duration is slept away instead
+    and the probe is polled at a short interval afterwards. The first
+    estimate of a probe is derived from its `MeasTimes`::
+
+        >>> estimator = Estimator()
+        >>> module10 = Module(bus, 10010, estimator=estimator)
+
     :param bus: An instaciated :class:`Bus` object to use.
     :type  bus: :class:`Bus`
 
     :param serno: The serial number of the probe to address.
     :type  serno: int
 
+    :param trusted: Mirror the state of the probe locally.
+    :type  trusted: bool
+
+    :param estimator: Predicts the duration of the measurements.
+    :type  estimator: :class:`Estimator`
+
     :rtype: :class:`Module`
 
     """
-    def __init__(self, bus, serno):
+    def __init__(self, bus, serno, trusted=False, estimator=None):
         self.crc = MaximCRC()
+        self.tbl = Tables()
+        self.dts = DataTypes()
         self.bus = bus
         self._serno = serno
+        self._passwd = None
+
+        # the mirrored state of the probe, only used if trusted
+        self.trusted = trusted
+        self._state = dict()
+
+        self.estimator = estimator
 
         self.protocols = {
             'IMPBUS': 0,
@@ -81,6 +118,59 @@ class Module:
             "CS":               0x02,
             "CF":               0x03}
 
+    def _mirrored(self, key):
+        return self._state.get(key) if self.trusted else None
+
+    def _mirror(self, key, value):
+        if self.trusted:
+            self._state[key] = value
+
+    def _get(self, table, param):
+        try:
+            return self.bus.get(self._serno, table, param)
+        except Exception:
+            self.resync()
+            raise
+
+    def _set(self, table, param, value):
+        try:
+            return self.bus.set(self._serno, table, param, value)
+        except Exception:
+            self.resync()
+            raise
+
+    def _wait_measure(self, kind, started, running):
+        if self.estimator is None:
+            while running():
+                time.sleep(0.500)
+            return
+
+        if not self.estimator.known(kind, self._serno):
+            table = 'DEVICE_CONFIGURATION_PARAMETER_TABLE'
+            param = 'MeasTimes'
+            meas_times = self._get(table, param)[0]
+            self.estimator.seed(kind, self._serno,
+                                meas_times * self.estimator.unit)
+
+        self.estimator.wait(kind, self._serno, started, running)
+
+    def resync(self):
+        """Drops the mirrored state of the probe, so it's read again from the
+        probe the next time it's needed. This is done automatically whenever
+        a transaction fails.
+
+        """
+        self._state.clear()
+
+    @property
+    def serno(self):
+        """The serial number of the probe addressed by this `Module`.
+
+        :rtype: int
+
+        """
+        return self._serno
+
     def unlock(self):
         """Command to unlock the write protected rows in the probes tables.
         The unlock key is the `CRC + 0x8000` of serial number of the probe.
@@ -89,16 +179,24 @@ class Module:
         :rtype: bool
 
         """
+        if self._mirrored('unlocked'):
+            return True
+
         # Calculate the SupportPW: calc_crc(serno) + 0x8000
-        passwd = struct.pack('<I', self._serno)
-        passwd = struct.unpack('<B', self.crc.calc_crc(passwd))[0] + 0x8000
+        if self._passwd is None:
+            passwd = struct.pack('<I', self._serno)
+            passwd = struct.unpack('<B', self.crc.calc_crc(passwd))[0]
+            self._passwd = passwd + 0x8000
 
         # Unlock the device with the password
         table = 'ACTION_PARAMETER_TABLE'
         param = 'SupportPW'
-        value = passwd
+        value = self._passwd
 
-        return self.bus.set(self._serno, table, param, [value])
+        unlocked = self._set(table, param, [value])
+        self._mirror('unlocked', unlocked)
+
+        return unlocked
 
     def get_event_mode(self):
         """Command to retrieve the event mode parameter of the probe. For more
@@ -113,10 +211,14 @@ class Module:
         param = 'Event'
         modes = {v: k for k, v in self.event_modes.items()}
 
-        mode = self.bus.get(self._serno, table, param)[0]
+        if self._mirrored('event') is not None:
+            return self._mirrored('event')
+
+        mode = self._get(table, param)[0]
         if mode not in range(127, 134):
             raise ModuleError("Unknown event mode: %s" % mode)
 
+        self._mirror('event', modes[mode % 0x80])
         return modes[mode % 0x80]
 
     def set_event_mode(self, mode="NormalMeasure"):
@@ -147,16 +249,21 @@ class Module:
 
         value = self.event_modes[mode]
 
+        if self._mirrored('event') == mode:
+            return True
+
         self.unlock()
-        self.bus.set(self._serno, table, param, [value])
+        self._set(table, param, [value])
 
         # let's try 5 times.
         for attempt in range(5):
-            if self.bus.get(self._serno, table, param)[0] == value + 0x80:
+            if self._get(table, param)[0] == value + 0x80:
                 break
             if attempt == 4:
+                self.resync()
                 raise ModuleError("Failed to set event mode!")
 
+        self._mirror('event', mode)
         return True
 
     def get_measure_mode(self):
@@ -172,11 +279,15 @@ class Module:
         param = 'MeasMode'
         modes = {v: k for k, v in self.measure_modes.items()}
 
+        if self._mirrored('measure') is not None:
+            return self._mirrored('measure')
+
         try:
-            mode = modes[self.bus.get(self._serno, table, param)[0]]
+            mode = modes[self._get(table, param)[0]]
         except KeyError as err:
             raise ModuleError("Unknown measure mode: %s!" % err.args[0])
 
+        self._mirror('measure', mode)
         return mode
 
     def set_measure_mode(self, mode='ModeA'):
@@ -203,7 +314,8 @@ class Module:
                 measures once and sleeps the time SleepTimeInModeC, then it
                 wakes up automatically and repeats the process. This mode is
                 normally aused in casees when the probe is always powered and
-                measures periodically.
+                measures periodically. The measurements can be read by a
+                :class:`Collector`.
 
         :param mode: Mode to use.
         :type  mode: string
@@ -219,12 +331,19 @@ class Module:
         if mode not in self.measure_modes:
             raise ModuleError("%s: Invalid measure mode!" % mode)
 
+        if self._mirrored('measure') == mode:
+            return True
+
         if not self.get_event_mode() == "NormalMeasure":
+            self.resync()
             raise ModuleError("Wrong event mode, need 'NormalMeasure'!")
 
         value = self.measure_modes[mode]
 
-        return self.bus.set(self._serno, table, param, [value])
+        result = self._set(table, param, [value])
+        self._mirror('measure', mode)
+
+        return result
 
     def get_default_measure_mode(self):
         table = 'DEVICE_CONFIGURATION_PARAMETER_TABLE'
@@ -277,8 +396,6 @@ class Module:
     def get_table(self, table):
         """Spezial Command to get a whole table.
 
-        .. warning:: **Not yet implemented!**
-
         Basicly you get a whole table, witch means the data-part of the
         recieved package consists of the concatinated table values. If
         the table don't fit into one package the status byte of the
@@ -294,30 +411,71 @@ class Module:
         :param table: Table to retrieve from probe.
         :type  table: string
 
-        :rtype: json
+        :rtype: dict
 
         """
-        # pylint: disable=unused-argument, no-self-use
-        raise NotImplementedError()
+        return self.bus.get_table(self._serno, table)
 
     def set_table(self, table, data):
         """Special command to set the values of a hole table.
 
-        .. warning:: **Not yet implemented!**
+        The current values are read with :func:`get_table` and compared to
+        `data` in their packed binary form, so floats don't differ by
+        rounding. Only the parameters which differ are written, one
+        :func:`Bus.set` each, after unlocking the probe once. Read-only
+        parameters (Status 'OR') are skipped. The probes don't provide a
+        command to write a whole table at once::
 
-        You can use the parameters GetData, DataSize and TableSize to gain
-        information about the spezific table.
+            >>> module.set_table('APPLICATION_PARAMETER_TABLE',
+            ...                  {'AverageMode': 1, 'AverageTime': 12})
+            True
 
         :param table: Name of the table to write.
         :type  table: string
 
-        :param data: Table data to write.
-        :type  data: json
+        :param data: Values to write, by parameter name.
+        :type  data: dict
 
         :rtype: bool
+
+        :raises: **ModuleError** - If a parameter is not part of the table.
+
         """
-        # pylint: disable=unused-argument, no-self-use
-        raise NotImplementedError()
+        params = dict(self.tbl.parameters(table))
+
+        unknown = [x for x in data if x not in params]
+        if unknown:
+            raise ModuleError("Unknown parameters: %s" % sorted(unknown))
+
+        current = self.get_table(table)
+        changes = list()
+
+        for name in sorted(data, key=lambda x: params[x]['No']):
+            if params[name]['Status'] == 'OR':
+                continue
+
+            values = data[name]
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+
+            fmt = self.dts.lookup(params[name]['Type'] % 0x80)
+            new = struct.pack(fmt.format(len(values)), *values)
+            old = struct.pack(fmt.format(len(current[name])), *current[name])
+
+            if not new == old:
+                changes.append((name, list(values)))
+
+        if not changes:
+            return True
+
+        self.unlock()
+
+        for name, values in changes:
+            self._set(table, name, values)
+
+        # the modes could have been part of the table
+        self.resync()
+        return True
 
     def get_serno(self):
         """Command to retrieve the serial number of the probe.
@@ -343,8 +501,10 @@ class Module:
 
         self.unlock()
 
-        self.bus.set(self._serno, table, param, [serno])
+        self._set(table, param, [serno])
         self._serno = serno
+        self._passwd = None
+        self.resync()
         return True
 
     def read_eeprom(self):
@@ -414,16 +574,23 @@ class Module:
 
         # Set Event mode to 'NormalMeasure'
         if not self.get_event_mode() == "NormalMeasure":
+            self.resync()
             raise ModuleError("Wrong event mode, need 'NormalMeasure'!")
 
         # Refer to Protocol Handbook page 18.
         if not self.get_measure_mode() == 'ModeA':
+            self.resync()
             raise ModuleError("Wrong measure mode, need 'ModeA'!")
 
-        if self.measure_running():
+        # a measurement seen finished doesn't need to be checked again
+        if self._mirrored('running') is not False and self.measure_running():
+            self.resync()
             raise ModuleError("Measurement cycle already in progress!")
 
-        return self.bus.set(self._serno, table, param, [value])
+        result = self._set(table, param, [value])
+        self._mirror('running', True)
+
+        return result
 
     def measure_running(self):
         """This command checks if the measurement cycle is in progress.
@@ -433,7 +600,11 @@ class Module:
         """
         table = 'ACTION_PARAMETER_TABLE'
         param = 'StartMeasure'
-        return self.bus.get(self._serno, table, param)[0] == 1
+
+        running = self._get(table, param)[0] == 1
+        self._mirror('running', running)
+
+        return running
 
     def get_measurement(self, quantity='Moist'):
         """This command gets the measured value of the requested quantity.
@@ -456,9 +627,9 @@ class Module:
         :rtype: float
 
         """
+        started = time.time()
         assert self.start_measure()
-        while self.measure_running():
-            time.sleep(0.500)
+        self._wait_measure('measure', started, self.measure_running)
         return self.get_measurement(quantity='Moist')
 
     #########################
@@ -684,8 +855,12 @@ class Module:
     def _get_transit_time_tdr(self):
         # ** Internal usage - Trime IBT
         if not self.get_event_mode() == "NormalMeasure":
+            self.resync()
             raise ModuleError("Wrong event mode, need 'NormalMeasure'!")
 
+        # the measure mode is changed behind the back of the mirror
+        self.resync()
+
         table = 'DEVICE_CONFIGURATION_PARAMETER_TABLE'
         param = 'MeasMode'
         value = 0
@@ -694,10 +869,11 @@ class Module:
         table = 'ACTION_PARAMETER_TABLE'
         param = 'StartMeasure'
         value = 1
+        started = time.time()
         self.bus.set(self._serno, table, param, [value])
 
-        while self.bus.get(self._serno, table, param)[0]:
-            time.sleep(0.5)
+        self._wait_measure('transit_time', started,
+                           lambda: self.bus.get(self._serno, table, param)[0])
 
         table = 'MEASURE_PARAMETER_TABLE'
         param = 'TransitTime'
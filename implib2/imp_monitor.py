@@ -0,0 +1,188 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import collections
+
+from .imp_helper import _impcover
+
+
+class Monitor(object):
+    """Keeps track of the probes connected to a :class:`Bus` while it is in
+    use.
+
+    Instead of stopping the acquisition for a full :func:`Bus.scan`, the
+    monitor is meant to be stepped in the idle time between two acquisition
+    transactions. Every call to :func:`step` does a single check in round
+    robin order: Either a known probe is pinged by
+    :func:`Bus.probe_module_short`, or one of the aligned blocks covering the
+    gaps between the known probes is probed by :func:`Bus.probe_range`. Only
+    if such a block answers, the block is searched for the new probes::
+
+        >>> monitor = Monitor(bus, bus.scan(), on_added=print)
+        >>> while True:
+        ...     acquire(bus)
+        ...     monitor.step()
+
+    In order to keep the overhead low, :func:`step` does nothing as long as
+    the monitor used more than `share` of the bus time within the last
+    `window` seconds.
+
+    :param bus: The bus to monitor.
+    :type  bus: Bus
+
+    :param sernos: The serial numbers known to be connected.
+    :type  sernos: iterable
+
+    :param on_added: Called with the serial number of a new probe.
+    :type  on_added: callable
+
+    :param on_removed: Called with the serial number of a lost probe.
+    :type  on_removed: callable
+
+    :param share: The maximum share of bus time to use (0.0 - 1.0).
+    :type  share: float
+
+    :param window: Time in seconds to measure the share of bus time over.
+    :type  window: float
+
+    :param retries: Missed pings before a probe is reported as removed.
+    :type  retries: int
+
+    """
+    # pylint: disable=too-many-arguments, too-many-instance-attributes
+    def __init__(self, bus, sernos=(), on_added=None, on_removed=None,
+                 share=0.1, minserial=0, maxserial=16777215, retries=2,
+                 window=60.0):
+        self.bus = bus
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.share = share
+        self.minserial = minserial
+        self.maxserial = maxserial
+        self.retries = retries
+        self.window = window
+
+        self.busy = 0.0
+        self.started = time.time()
+
+        # (finished, duration) of the checks within the window
+        self._checks = collections.deque()
+
+        self._sernos = set(sernos)
+        self._misses = dict()
+        self._schedule = list()
+        self._cursor = 0
+        self._plan()
+
+    def _plan(self):
+        # one ping per known probe followed by the blocks covering the gaps
+        sernos = sorted(self._sernos)
+        schedule = [(x, 0, True) for x in sernos]
+
+        lower = self.minserial
+        for serno in sernos + [self.maxserial + 1]:
+            schedule.extend((rng, mark, False)
+                            for rng, mark in _impcover(lower, serno - 1))
+            lower = serno + 1
+
+        self._schedule = schedule
+        self._cursor = 0
+
+    def _ping(self, serno):
+        if self.bus.probe_module_short(serno):
+            self._misses.pop(serno, None)
+            return
+
+        self._misses[serno] = self._misses.get(serno, 0) + 1
+        if self._misses[serno] < self.retries:
+            return
+
+        del self._misses[serno]
+        self._sernos.discard(serno)
+        self._plan()
+
+        if self.on_removed is not None:
+            self.on_removed(serno)
+
+    def _check(self, range_address, range_marker):
+        if not range_marker:
+            if not self.bus.probe_module_short(range_address):
+                return
+            added = [range_address]
+        else:
+            if not self.bus.probe_range(range_address + range_marker):
+                return
+            upper = range_address + 2 * range_marker - 1
+
+            # the stats of the last scan belong to the user of the bus
+            stats = dict(self.bus.scan_stats)
+            try:
+                added = self.bus.scan_ranges([(range_address, upper)])
+            finally:
+                self.bus.scan_stats.update(stats)
+
+        added = [x for x in added if x not in self._sernos]
+        if not added:
+            return
+
+        self._sernos.update(added)
+        self._plan()
+
+        if self.on_added is not None:
+            for serno in added:
+                self.on_added(serno)
+
+    @property
+    def sernos(self):
+        """The serial numbers currently known to be connected.
+
+        :rtype: tuple
+
+        """
+        return tuple(sorted(self._sernos))
+
+    @property
+    def usage(self):
+        """The share of bus time used by the monitor within the last
+        `window` seconds.
+
+        :rtype: float
+
+        """
+        now = time.time()
+        while self._checks and self._checks[0][0] < now - self.window:
+            self._checks.popleft()
+
+        elapsed = min(now - self.started, self.window)
+        busy = sum(x[1] for x in self._checks)
+        return busy / elapsed if elapsed > 0 else 0.0
+
+    def step(self):
+        """Does a single check, as long as the monitor stays within its share
+        of bus time. Should be called whenever the bus is idle.
+
+        :rtype: bool
+        :return: Whether a check was done.
+
+        """
+        if not self._schedule or self.usage > self.share:
+            return False
+
+        if self._cursor >= len(self._schedule):
+            self._cursor = 0
+
+        range_address, range_marker, known = self._schedule[self._cursor]
+        self._cursor += 1
+
+        start = time.time()
+        try:
+            if known:
+                self._ping(range_address)
+            else:
+                self._check(range_address, range_marker)
+        finally:
+            finished = time.time()
+            self.busy += finished - start
+            self._checks.append((finished, finished - start))
+
+        return True
@@ -0,0 +1,192 @@
+# -*- coding: UTF-8 -*-
+
+from .imp_bus import Bus, BusError
+from .imp_worker import Worker
+
+
+class MultiBus(object):
+    """Drives several serial ports as one fleet of probes.
+
+    Every port gets its own :class:`Bus` and :class:`Worker`, so the work
+    of the ports is done in parallel and an operation on the whole fleet
+    takes as long as on the slowest bus, instead of the sum of all of them.
+    The ports of the probes are learned by :func:`scan` and kept in
+    :attr:`routes`, so the probes can be addressed by serial number only::
+
+        >>> fleet = MultiBus(['/dev/ttyUSB0', '/dev/ttyUSB1'])
+        >>> fleet.sync()
+        >>> fleet.scan()
+        (10010, 10011, 20010)
+        >>> fleet.get(20010, 'SYSTEM_PARAMETER_TABLE', 'FWVersion')
+        (1.140301,)
+        >>> values, errors = fleet.measure([10010, 20010])
+        >>> values
+        {10010: {'Moist': (12.3,)}, 20010: {'Moist': (14.1,)}}
+
+    A port which fails, e.g. an unplugged adapter, doesn't spoil the results
+    of the others. The errors of the ports which failed the last operation
+    are kept in :attr:`failed`, and the probes of such a port are reported
+    as errors by the operations on several probes.
+
+    :param ports: The serial ports to use.
+    :type  ports: iterable
+
+    The other keyword arguments are passed to every :class:`Bus`.
+
+    """
+    def __init__(self, ports, **kwargs):
+        self.buses = {x: Bus(x, **kwargs) for x in ports}
+        self.workers = {x: Worker(y) for x, y in self.buses.items()}
+        self.routes = dict()
+        self.failed = dict()
+
+    def _each(self, calls):
+        # submits all the calls first, so the ports work in parallel, and
+        # returns the results of the ports which succeeded.
+        # calls: {port: (method, args)}
+        transactions = {port: self.workers[port].submit(method, *args)
+                        for port, (method, args) in calls.items()}
+
+        results, self.failed = dict(), dict()
+        for port, transaction in transactions.items():
+            error = transaction.exception()
+            if error is None:
+                results[port] = transaction.result()
+            else:
+                self.failed[port] = error
+
+        return results
+
+    def _merge(self, ports, results, errors):
+        # joins the (values, errors) of the ports, the probes of a failed
+        # port get the error of their port.
+        values = dict()
+        for port_values, port_errors in results.values():
+            values.update(port_values)
+            errors.update(port_errors)
+
+        for port, error in self.failed.items():
+            for serno in ports[port]:
+                errors[serno] = error
+
+        return values, errors
+
+    def _group(self, sernos):
+        ports, unknown = dict(), dict()
+        for serno in sernos:
+            if serno in self.routes:
+                ports.setdefault(self.routes[serno], list()).append(serno)
+            else:
+                unknown[serno] = BusError("Unknown probe %s!" % serno)
+        return ports, unknown
+
+    def route(self, serno):
+        """Returns the port a probe is connected to.
+
+        :rtype: string
+
+        :raises: **BusError** - If the probe is unknown.
+
+        """
+        try:
+            return self.routes[serno]
+        except KeyError:
+            raise BusError("Unknown probe %s!" % serno)
+
+    def sync(self, baudrate=9600):
+        """Synchronises the probes of all the ports, see :func:`Bus.sync`.
+
+        :rtype: bool
+        :return: Whether all the ports succeeded, see :attr:`failed`.
+
+        """
+        self._each({x: ('sync', (baudrate,)) for x in self.buses})
+        return not self.failed
+
+    def scan(self, minserial=0, maxserial=16777215):
+        """Scans all the ports and rebuilds :attr:`routes`, see
+        :func:`Bus.scan`. Only the probes of the ports which succeeded are
+        routed afterwards, see :attr:`failed`.
+
+        :rtype: tuple
+
+        """
+        results = self._each({x: ('scan', (minserial, maxserial))
+                              for x in self.buses})
+
+        self.routes = dict()
+        for port, sernos in results.items():
+            for serno in sernos:
+                self.routes[serno] = port
+
+        return tuple(sorted(self.routes))
+
+    def get(self, serno, table, param):
+        """See :func:`Bus.get`.
+
+        :raises: **BusError** - If the probe is unknown.
+
+        """
+        return self.workers[self.route(serno)].get(serno, table, param)
+
+    def set(self, serno, table, param, value, ad_param=0):
+        """See :func:`Bus.set`.
+
+        :raises: **BusError** - If the probe is unknown.
+
+        """
+        # pylint: disable=too-many-arguments
+        return self.workers[self.route(serno)].set(serno, table, param,
+                                                   value, ad_param)
+
+    def get_all(self, sernos, table, param, budget=0.0, skip_dead=True):
+        """Gets the same parameter from several probes, the ports in
+        parallel, see :func:`Bus.get_all`. Unknown probes are reported as
+        errors.
+
+        :rtype: tuple of two dicts, the values and the errors.
+
+        """
+        # pylint: disable=too-many-arguments
+        ports, errors = self._group(sernos)
+        calls = {x: ('get_all', (y, table, param, budget, skip_dead))
+                 for x, y in ports.items()}
+        results = self._each(calls)
+
+        return self._merge(ports, results, errors)
+
+    def set_all(self, sernos, table, param, value, ad_param=0, budget=0.0,
+                skip_dead=True):
+        """Sets the same parameter of several probes, the ports in
+        parallel, see :func:`Bus.set_all`. Unknown probes are reported as
+        errors.
+
+        :rtype: tuple of two dicts, the results and the errors.
+
+        """
+        # pylint: disable=too-many-arguments
+        ports, errors = self._group(sernos)
+        calls = {x: ('set_all', (y, table, param, value, ad_param, budget,
+                                 skip_dead))
+                 for x, y in ports.items()}
+        results = self._each(calls)
+
+        return self._merge(ports, results, errors)
+
+    def measure(self, sernos, quantities=('Moist',)):
+        """Measures with several probes, all the ports at the same time,
+        see :func:`Bus.measure_all`. Unknown probes are reported as errors.
+
+        :rtype: tuple of two dicts, the values and the errors.
+
+        """
+        ports, errors = self._group(sernos)
+        results = self._each({x: ('measure_all', (y, quantities))
+                              for x, y in ports.items()})
+
+        return self._merge(ports, results, errors)
+
+    def stop(self):
+        """Stops the workers of all the ports."""
+        for worker in self.workers.values():
+            worker.stop()
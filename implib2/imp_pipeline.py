@@ -0,0 +1,148 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import heapq
+
+from .imp_device import DeviceError
+from .imp_packages import PackageError
+from .imp_responces import ResponceError
+from .imp_modules import ModuleError
+
+
+class Pipeline(object):
+    """Overlaps the measurements of several probes on one :class:`Bus`.
+
+    Instead of waiting for the measurement of one probe to finish before
+    the next one is started, like :func:`Module.get_moisture` does it, the
+    pipeline starts the measurements of all the given :class:`Module`
+    objects one after another. Afterwards it always polls the probe which is
+    due next, reads its quantities as soon as it finished and only sleeps if
+    no probe is due at all. Every probe keeps its own modes and
+    calibration::
+
+        >>> pipeline = Pipeline([module10, module11], ['Moist', 'CompTemp'])
+        >>> values, errors = pipeline.measure()
+        >>> values
+        {10010: {'Moist': 12.3, 'CompTemp': 21.0},
+         10011: {'Moist': 14.1, 'CompTemp': 20.5}}
+
+    Like :func:`Bus.measure_all`, a probe which fails or doesn't finish
+    within `timeout` seconds doesn't stop the others, its error is kept by
+    serial number in :attr:`errors`.
+
+    :param modules: The probes to measure with.
+    :type  modules: iterable of :class:`Module`
+
+    :param quantities: The measure quantities to request.
+    :type  quantities: iterable
+
+    Given an :class:`Estimator`, the first poll of a probe is delayed until
+    shortly before its measurement is expected to finish, and the following
+    polls are done every `estimator.interval` seconds. The durations are fed
+    back into the estimator.
+
+    :param interval: Time in seconds between two polls of the same probe.
+    :type  interval: float
+
+    :param estimator: Predicts the duration of the measurements.
+    :type  estimator: :class:`Estimator`
+
+    :param timeout: Time in seconds to wait for a measurement.
+    :type  timeout: float
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, modules, quantities=('Moist',), interval=0.500,
+                 estimator=None, timeout=10.0):
+        self.modules = list(modules)
+        self.quantities = list(quantities)
+        self.interval = interval
+        self.estimator = estimator
+        self.timeout = timeout
+        self.errors = dict()
+
+    def _first_poll(self, module, started):
+        if self.estimator is None:
+            return started + self.interval
+        return time.time() + self.estimator.delay('measure', module.serno,
+                                                  started)
+
+    def _next_poll(self):
+        if self.estimator is None:
+            return time.time() + self.interval
+        return time.time() + self.estimator.interval
+
+    def _read(self, module):
+        table = 'MEASURE_PARAMETER_TABLE'
+        values = module.bus.get_many(module.serno, table, self.quantities)
+        return {k: v[0] for k, v in values.items()}
+
+    def measure_iter(self):
+        """Generator doing a single measurement with every probe. The serial
+        number and the values of a probe are yielded the moment its
+        measurement finished, the probes which failed are left out and
+        their errors are put into :attr:`errors`::
+
+            >>> for serno, values in pipeline.measure_iter():
+            ...     store(serno, values)
+            >>> pipeline.errors
+            {10011: ModuleError("Wrong measure mode, need 'ModeA'!")}
+
+        :rtype: generator of (int, dict) tuples
+
+        """
+        self.errors = dict()
+
+        # (due time, position, module), the position keeps the order stable
+        pending = list()
+        started = dict()
+        for position, module in enumerate(self.modules):
+            started[position] = time.time()
+            try:
+                module.start_measure()
+            except (ModuleError, DeviceError, PackageError,
+                    ResponceError) as err:
+                self.errors[module.serno] = err
+                continue
+            heapq.heappush(pending, (self._first_poll(module,
+                                                      started[position]),
+                                     position, module))
+
+        while pending:
+            due, position, module = heapq.heappop(pending)
+
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                running = module.measure_running()
+                if running and \
+                        time.time() - started[position] >= self.timeout:
+                    raise ModuleError("Measurement of probe %s timed out!" %
+                                      module.serno)
+                if not running:
+                    values = self._read(module)
+            except (ModuleError, DeviceError, PackageError,
+                    ResponceError) as err:
+                self.errors[module.serno] = err
+                continue
+
+            if running:
+                heapq.heappush(pending, (self._next_poll(), position, module))
+                continue
+
+            if self.estimator is not None:
+                self.estimator.report('measure', module.serno,
+                                      time.time() - started[position])
+
+            yield module.serno, values
+
+    def measure(self):
+        """Does a single measurement with every probe.
+
+        :rtype: tuple of two dicts, the values and the errors.
+
+        """
+        values = dict(self.measure_iter())
+        return values, self.errors
@@ -34,6 +34,12 @@ class Responce:
         # pylint: disable=no-self-use
         return len(packet) == 1
 
+    def get_range_reply(self, packet):
+        # pylint: disable=no-self-use
+        if len(packet) == 1:
+            return True, struct.unpack('<B', packet)[0]
+        return len(packet) > 1, None
+
     def get_negative_ack(self, packet):
         responce = self.pkg.unpack(packet)
         return struct.unpack('<I', responce['data'])[0]
@@ -47,6 +53,26 @@ class Responce:
 
         return struct.unpack(fmt.format(length), data)
 
+    def get_table(self, packets, table):
+        data = b''.join(self.pkg.unpack(x)['data'] or b'' for x in packets)
+        values = dict()
+        start = 0
+
+        for name, cmd in self.tbl.parameters(table):
+            fmt = self.dts.lookup(cmd['Type'] % 0x80)
+            size = struct.calcsize(fmt.format(1))
+            count = cmd['Length'] // size
+
+            chunk = data[start:start + cmd['Length']]
+            if not len(chunk) == cmd['Length']:
+                raise ResponceError("Table data too short!")
+
+            values[name] = struct.unpack(fmt.format(count),
+                                         chunk[:count * size])
+            start += cmd['Length']
+
+        return values
+
     def set_parameter(self, packet, table, serno):
         responce = self.pkg.unpack(packet)
         command = responce['header']['cmd']
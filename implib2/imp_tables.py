@@ -21,3 +21,21 @@ class Tables:
             raise TablesError("Unknown param or table: {}!".format(err))
 
         return cmd
+
+    def parameters(self, table):
+        """Returns the `(name, param)` pairs of a table in the order of the
+        parameter numbers, leaving out the table commands and the special
+        parameters (ConfigID, TableSize, GetParam, DataSize and GetData).
+
+        :type table: string
+        :rtype: list
+        """
+        try:
+            params = self._tables[table]
+        except KeyError as err:
+            raise TablesError("Unknown table: {}!".format(err))
+
+        params = [(name, cmd) for name, cmd in params.items()
+                  if not name == 'Table' and cmd['No'] < 251]
+
+        return sorted(params, key=lambda x: x[1]['No'])
@@ -0,0 +1,109 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import collections
+
+
+class Tuner(object):
+    """Adaptive controller for the guard times of the :class:`Bus`.
+
+    The tuner keeps a separate `trans_wait` and `cycle_wait` value for every
+    command class and probe. As long as the share of failed transactions
+    (timeouts or damaged replies) within a window stays at or below the
+    `threshold`, the waits of that class/probe are shrunk by the factor
+    `shrink`. As soon as the failures exceed the threshold, the waits are
+    multiplied by `backoff` and a new window is started. All the classes,
+    range probes included, start from the same waits as an untuned bus.
+
+    :param trans_wait: Initial transit wait per byte, in seconds.
+    :type  trans_wait: float
+
+    :param cycle_wait: Initial wait between two transactions, in seconds.
+    :type  cycle_wait: float
+
+    """
+    # pylint: disable=too-many-arguments, too-many-instance-attributes
+    def __init__(self, trans_wait, cycle_wait, threshold=0.05,
+                 window=20, shrink=0.8, backoff=2.0, minimum=0.0005,
+                 maximum=0.100, history=1000):
+        self.trans_wait = trans_wait
+        self.cycle_wait = cycle_wait
+
+        self.threshold = threshold
+        self.window = window
+        self.shrink = shrink
+        self.backoff = backoff
+        self.minimum = minimum
+        self.maximum = maximum
+
+        self.history = collections.deque(maxlen=history)
+        self._waits = dict()
+        self._stats = dict()
+
+    def _adjust(self, key, factor, rate):
+        trans_wait, cycle_wait = self._waits[key]
+        trans_wait = min(max(trans_wait * factor, self.minimum), self.maximum)
+        cycle_wait = min(max(cycle_wait * factor, self.minimum), self.maximum)
+
+        self._waits[key] = (trans_wait, cycle_wait)
+        self._stats[key] = [0, 0]
+        self.history.append((time.time(), key[0], key[1],
+                             trans_wait, cycle_wait, rate))
+
+    def waits(self, kind, serno=None):
+        """Returns the current `(trans_wait, cycle_wait)` for a command class
+        and probe.
+
+        :param kind: The command class, e.g. `'get'` or `'set'`.
+        :type  kind: string
+
+        :param serno: Serial number of the addressed probe.
+        :type  serno: int
+
+        :rtype: tuple
+
+        """
+        key = (kind, serno)
+
+        if key not in self._waits:
+            self._waits[key] = (self.trans_wait, self.cycle_wait)
+            self._stats[key] = [0, 0]
+
+        return self._waits[key]
+
+    def report(self, kind, serno, success):
+        """Feeds the outcome of a transaction into the controller.
+
+        :param kind: The command class of the transaction.
+        :type  kind: string
+
+        :param serno: Serial number of the addressed probe.
+        :type  serno: int
+
+        :param success: Whether the transaction succeeded.
+        :type  success: bool
+
+        """
+        key = (kind, serno)
+        self.waits(kind, serno)
+
+        stats = self._stats[key]
+        stats[0] += 1
+        if not success:
+            stats[1] += 1
+
+        rate = stats[1] / float(self.window)
+        if rate > self.threshold:
+            self._adjust(key, self.backoff, stats[1] / float(stats[0]))
+        elif stats[0] >= self.window:
+            self._adjust(key, self.shrink, rate)
+
+    @property
+    def current(self):
+        """The current waits of all known command classes and probes as
+        `{(kind, serno): (trans_wait, cycle_wait)}`.
+
+        :rtype: dict
+
+        """
+        return dict(self._waits)
@@ -0,0 +1,334 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import inspect
+import itertools
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class WorkerError(Exception):
+    pass
+
+
+class Transaction(object):
+    """A call to a :class:`Bus` method submitted to a :class:`Worker`. The
+    result can be waited for from any thread.
+
+    """
+    def __init__(self, method, args=(), kwargs=None, priority='interactive'):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs or dict()
+        self.priority = priority
+
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def run(self, bus, callback=None):
+        """Runs the call on the bus, only to be used by the worker. The
+        `callback` is called with the transaction and the exception raised,
+        if any, before the waiting threads are woken up.
+
+        """
+        self.started = time.time()
+        try:
+            self._result = getattr(bus, self.method)(*self.args,
+                                                     **self.kwargs)
+        except Exception as err:  # pylint: disable=broad-except
+            self._error = err
+        finally:
+            self.finished = time.time()
+            if callback is not None:
+                callback(self, self._error)
+            self._event.set()
+
+    def done(self):
+        """Whether the call has finished.
+
+        :rtype: bool
+
+        """
+        return self._event.is_set()
+
+    def exception(self, timeout=None):
+        """Waits for the call and returns the exception it raised, if any.
+
+        :param timeout: Time in seconds to wait, None to wait forever.
+        :type  timeout: float
+
+        :raises: **WorkerError** - If the call didn't finish in time.
+
+        """
+        if not self._event.wait(timeout):
+            raise WorkerError("Timeout waiting for '%s'!" % self.method)
+        return self._error
+
+    def result(self, timeout=None):
+        """Waits for the call and returns its result, or raises the
+        exception it raised.
+
+        :param timeout: Time in seconds to wait, None to wait forever.
+        :type  timeout: float
+
+        :raises: **WorkerError** - If the call didn't finish in time.
+
+        """
+        error = self.exception(timeout)
+        if error is not None:
+            raise error
+        return self._result
+
+
+class _Proxy(object):
+    # makes the methods of the bus available as blocking calls
+    # pylint: disable=too-few-public-methods
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('bus', 'worker'):
+            raise AttributeError(name)
+
+        if not callable(getattr(self.bus, name)):
+            return getattr(self.bus, name)
+
+        # a generator would run in the calling thread, past the worker
+        if inspect.isgeneratorfunction(getattr(self.bus, name)):
+            raise WorkerError("%s: Generators are not supported!" % name)
+
+        def call(*args, **kwargs):
+            return self.submit(name, *args, **kwargs).result()
+        return call
+
+
+class Worker(_Proxy):
+    """Shares a :class:`Bus` between several threads.
+
+    The :class:`Bus` isn't thread safe, the request and the reply of two
+    transactions must not interleave. So instead of calling the bus
+    directly, all the threads submit their calls to a worker, which runs
+    them one after another in its own thread. :func:`submit` returns a
+    :class:`Transaction` to wait for::
+
+        >>> worker = Worker(bus)
+        >>> transaction = worker.submit('get', 10010, table, 'FWVersion')
+        >>> transaction.result(timeout=2.0)
+        (1.140301,)
+
+    Every other method of the bus is available on the worker as well,
+    submitting the call and waiting for its result. So a worker can be used
+    in place of the bus, e.g. by a :class:`Module`::
+
+        >>> module10 = Module(worker, 10010)
+
+    .. note:: Generators like :func:`Bus.scan_iter` are not supported, they
+        raise a :class:`WorkerError`.
+
+    Every call belongs to one of the priority classes 'realtime',
+    'interactive' and 'background', and waiting calls of a higher class are
+    always run first. A long running call like :func:`Bus.scan` is even
+    interrupted between two of its transactions in order to run the waiting
+    calls of a higher class. The loops of a :class:`Module`, like
+    :func:`Module.write_eeprom`, submit every transaction on its own anyway.
+    :func:`client` returns a handle submitting at a given class::
+
+        >>> maintenance = Module(worker.client('background'), 10010)
+        >>> acquisition = Module(worker.client('realtime'), 10010)
+
+    The number of waiting calls is available by :attr:`depth`, the time they
+    waited in the queue by :attr:`stats`, also for every priority class.
+
+    :param bus: The bus to use.
+    :type  bus: :class:`Bus`
+
+    :param priority: The priority class of the calls of the worker itself.
+    :type  priority: string
+
+    """
+    priorities = {
+        'realtime':     0,
+        'interactive':  1,
+        'background':   2}
+
+    def __init__(self, bus, priority='interactive'):
+        if priority not in self.priorities:
+            raise WorkerError("%s: Invalid priority!" % priority)
+
+        self.bus = bus
+        self.priority = priority
+        self.stats = self._new_stats()
+        self.stats['preempted'] = 0
+        self.class_stats = {x: self._new_stats() for x in self.priorities}
+
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._running = list()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+        # run urgent calls in between the transactions of long ones
+        bus.preempt = self._preempt
+
+    @staticmethod
+    def _new_stats():
+        return {
+            'submitted': 0,
+            'finished':  0,
+            'failed':    0,
+            'wait_sum':  0.0,
+            'wait_max':  0.0}
+
+    def _run(self):
+        while True:
+            _, _, transaction = self._queue.get()
+            if transaction is None:
+                break
+
+            self._execute(transaction)
+
+    def _execute(self, transaction):
+        self._running.append(self.priorities[transaction.priority])
+        try:
+            transaction.run(self.bus, self._count)
+        finally:
+            self._running.pop()
+
+    def _preempt(self):
+        if not threading.current_thread() is self._thread:
+            return
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+            if item[2] is None or item[0] >= self._running[-1]:
+                self._queue.put(item)
+                return
+
+            with self._lock:
+                self.stats['preempted'] += 1
+            self._execute(item[2])
+
+    def _count(self, transaction, error):
+        wait = transaction.started - transaction.submitted
+
+        with self._lock:
+            for stats in (self.stats, self.class_stats[transaction.priority]):
+                stats['finished'] += 1
+                if error is not None:
+                    stats['failed'] += 1
+                stats['wait_sum'] += wait
+                stats['wait_max'] = max(stats['wait_max'], wait)
+
+    @property
+    def depth(self):
+        """The number of calls waiting to be run.
+
+        :rtype: int
+
+        """
+        return self._queue.qsize()
+
+    def client(self, priority):
+        """Returns a handle to submit calls at the given priority class.
+        Like the worker itself, it can be used in place of the bus.
+
+        :param priority: The priority class to use.
+        :type  priority: string
+
+        :rtype: :class:`Client`
+
+        :raises: **WorkerError** - If the priority class is unknown.
+
+        """
+        return Client(self, priority)
+
+    def submit_as(self, priority, method, *args, **kwargs):
+        """Submits a call of a :class:`Bus` method at the given priority
+        class.
+
+        :param priority: The priority class to use.
+        :type  priority: string
+
+        :param method: Name of the method, e.g. `'get'`.
+        :type  method: string
+
+        :rtype: :class:`Transaction`
+
+        :raises: **WorkerError** - If the worker is stopped, the priority
+            class is unknown or the method is a generator.
+
+        """
+        if priority not in self.priorities:
+            raise WorkerError("%s: Invalid priority!" % priority)
+
+        if inspect.isgeneratorfunction(getattr(self.bus, method, None)):
+            raise WorkerError("%s: Generators are not supported!" % method)
+
+        if not self._thread.is_alive():
+            raise WorkerError("Worker is stopped!")
+
+        transaction = Transaction(method, args, kwargs, priority)
+        with self._lock:
+            self.stats['submitted'] += 1
+            self.class_stats[priority]['submitted'] += 1
+        self._queue.put((self.priorities[priority], next(self._order),
+                         transaction))
+
+        return transaction
+
+    def submit(self, method, *args, **kwargs):
+        """Submits a call of a :class:`Bus` method at the priority class of
+        the worker.
+
+        :param method: Name of the method, e.g. `'get'`.
+        :type  method: string
+
+        :rtype: :class:`Transaction`
+
+        :raises: **WorkerError** - If the worker is stopped.
+
+        """
+        return self.submit_as(self.priority, method, *args, **kwargs)
+
+    def stop(self):
+        """Runs the calls already submitted and stops the worker."""
+        self._queue.put((len(self.priorities), next(self._order), None))
+        self._thread.join()
+
+
+class Client(_Proxy):
+    """A handle to submit calls to a :class:`Worker` at a given priority
+    class, see :func:`Worker.client`.
+
+    """
+    def __init__(self, worker, priority):
+        if priority not in worker.priorities:
+            raise WorkerError("%s: Invalid priority!" % priority)
+
+        self.worker = worker
+        self.bus = worker.bus
+        self.priority = priority
+
+    def submit(self, method, *args, **kwargs):
+        """Submits a call of a :class:`Bus` method at the priority class of
+        the client.
+
+        :param method: Name of the method, e.g. `'get'`.
+        :type  method: string
+
+        :rtype: :class:`Transaction`
+
+        """
+        return self.worker.submit_as(self.priority, method, *args, **kwargs)
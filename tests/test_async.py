@@ -0,0 +1,271 @@
+# -*- coding: UTF-8 -*-
+
+import sys
+import socket
+import pytest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+if sys.version_info < (3, 5):
+    pytest.skip("asyncio with async/await needs python 3.5",
+                allow_module_level=True)
+
+import asyncio  # noqa
+
+from implib2.imp_async import AsyncBus, AsyncModule  # noqa
+from implib2.imp_bus import BusError  # noqa
+from implib2.imp_device import DeviceError  # noqa
+from implib2.imp_modules import ModuleError  # noqa
+
+
+class FakeSerial(object):
+    # a serial port backed by a socket pair, the replies are queued up
+    # and sent as soon as a request is written.
+
+    def __init__(self):
+        self.master, self.slave = socket.socketpair()
+        self.master.setblocking(False)
+        self.replies = list()
+        self.written = list()
+        self.timeout = 0.1
+
+    def fileno(self):
+        return self.master.fileno()
+
+    def write(self, packet):
+        self.written.append(packet)
+        if self.replies:
+            reply = self.replies.pop(0)
+            if reply:
+                self.slave.send(reply)
+        return len(packet)
+
+    def read(self, length):
+        try:
+            return self.master.recv(length)
+        except (BlockingIOError, socket.error):
+            return b''
+
+    def reset_input_buffer(self):
+        while self.read(1024):
+            pass
+
+    def close(self):
+        self.master.close()
+        self.slave.close()
+
+
+def run(coro):
+    return asyncio.get_event_loop_policy().get_event_loop() \
+        .run_until_complete(coro)
+
+
+class TestAsyncBus:
+
+    def setup(self):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.ser = FakeSerial()
+
+        self.bus = MagicMock()
+        self.bus.dev.ser = self.ser
+        self.bus.dev.is_open = True
+        self.bus.dev.write_pkg.side_effect = self.ser.write
+        self.bus.dev.transfer_time.side_effect = lambda x: x * 12.0 / 9600
+        self.bus.cycle_wait = 0.0
+        self.bus.process_time = {
+            'short_ack': 0.05, 'range_ack': 0.05, 'get': 0.05, 'set': 0.05,
+            'get_epr_page': 0.05, 'set_epr_page': 0.05}
+        self.bus._sync_delays = ((1200, 0.0), (9600, 0.0))
+        self.bus.shared = False
+
+        self.abus = AsyncBus(self.bus)
+
+    def teardown(self):
+        self.ser.close()
+        asyncio.get_event_loop_policy().get_event_loop().close()
+
+    def test_init_SharedPort(self):
+        self.bus.shared = True
+        with pytest.raises(BusError):
+            AsyncBus(self.bus)
+
+    def test_get(self):
+        self.bus.cmd.get_parameter.return_value = b'request'
+        self.bus.res.get_parameter.return_value = (1.14,)
+        self.ser.replies.append(b'\x00\x0a\x02\x01\x02\x03\x04' + b'\x05\x06')
+
+        assert run(self.abus.get(10010, 'T', 'P')) == (1.14,)
+        self.bus.res.get_parameter.assert_called_once_with(
+            b'\x00\x0a\x02\x01\x02\x03\x04\x05\x06', 'T', 'P')
+        assert self.ser.written == [b'request']
+
+    def test_get_Timeout(self):
+        self.bus.cmd.get_parameter.return_value = b'request'
+        self.ser.replies.append(b'\x00\x0a')
+
+        with pytest.raises(DeviceError):
+            run(self.abus.get(10010, 'T', 'P'))
+
+    def test_get_table_SeveralPackets(self):
+        self.bus.cmd.get_table.return_value = b'request'
+        self.bus.res.get_table.return_value = {'Moist': (12.5,)}
+        first = b'\xff\x0a\x01\x01\x02\x03\x04\x05'
+        last = b'\x00\x0a\x01\x01\x02\x03\x04\x06'
+        self.ser.replies.append(first + last)
+
+        assert run(self.abus.get_table(10010, 'T')) == {'Moist': (12.5,)}
+        self.bus.res.get_table.assert_called_once_with([first, last], 'T')
+
+    def test_set(self):
+        self.bus.cmd.set_parameter.return_value = b'request'
+        self.bus.res.set_parameter.return_value = True
+        self.ser.replies.append(b'\x00\x0b\x00\x01\x02\x03\x04')
+
+        assert run(self.abus.set(10010, 'T', 'P', [1]))
+        self.bus.cmd.set_parameter.assert_called_once_with(10010, 'T', 'P',
+                                                           [1], 0)
+
+    def test_probe_module_short(self):
+        self.bus.res.get_short_ack.return_value = True
+        self.ser.replies.extend([b'\x42', b''])
+
+        assert run(self.abus.probe_module_short(10010))
+        assert not run(self.abus.probe_module_short(10011))
+
+    def test_probe_range_DropsCollisions(self):
+        self.bus.res.get_range_ack.side_effect = lambda x: len(x) == 1
+        self.ser.replies.extend([b'\x42\x13\x37', b'\x11'])
+
+        assert run(self.abus.probe_range(0x800000))
+        assert run(self.abus.probe_range(0x800000))
+        assert self.bus.res.get_range_ack.call_args_list[1][0][0] == b'\x11'
+
+    def test_probe_range_DropsLateReplies(self):
+        self.bus.res.get_range_ack.return_value = True
+        self.ser.replies.append(b'\x42')
+
+        async def probe():
+            # a second probe replies late, within the processing time
+            loop = asyncio.get_event_loop()
+            loop.call_later(0.02, self.ser.slave.send, b'\x13')
+            found = await self.abus.probe_range(0x800000)
+            await asyncio.sleep(0.05)
+            return found
+
+        assert run(probe())
+        assert self.bus.res.get_range_ack.call_args[0][0] == b'\x42'
+        assert self.ser.read(10) == b''
+
+    def test_scan(self):
+        sernos = (2, 5)
+        answer = dict()
+
+        def short_ack(serno):
+            answer['pending'] = serno in sernos
+            return b'short'
+
+        def range_ack(broadcast):
+            mark = broadcast & -broadcast
+            low = broadcast - mark
+            answer['pending'] = any(low <= x < low + 2 * mark
+                                    for x in sernos)
+            return b'range'
+
+        def write(packet):
+            self.ser.replies.append(b'\x01' if answer.pop('pending') else b'')
+            return self.ser.write(packet)
+
+        self.bus.cmd.get_short_ack.side_effect = short_ack
+        self.bus.cmd.get_range_ack.side_effect = range_ack
+        self.bus.dev.write_pkg.side_effect = write
+        self.bus.res.get_short_ack.return_value = True
+        self.bus.res.get_range_ack.return_value = True
+
+        assert run(self.abus.scan(0, 7)) == (2, 5)
+
+    def test_sync(self):
+        self.bus.cmd.set_parameter.return_value = b'sync'
+        self.bus.dev.write_pkg.side_effect = None
+
+        with pytest.raises(BusError):
+            run(self.abus.sync(baudrate=1000))
+        assert run(self.abus.sync())
+        assert [x[0][0] for x in self.bus.dev.set_baudrate.call_args_list] \
+            == [1200, 9600, 9600]
+
+    def test_timeout_Cancels(self):
+        self.bus.cmd.get_parameter.return_value = b'request'
+        self.bus.process_time['get'] = 5.0
+        self.ser.replies.append(b'\x00\x0a')
+
+        with pytest.raises(asyncio.TimeoutError):
+            run(self.abus.get(10010, 'T', 'P', timeout=0.05))
+
+        # the partial reply is dropped
+        assert self.ser.read(10) == b''
+
+
+class TestAsyncModule:
+
+    def setup(self):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.bus = MagicMock()
+        self.mod = AsyncModule(self.bus, 31002)
+
+    def teardown(self):
+        asyncio.get_event_loop_policy().get_event_loop().close()
+
+    def coroutine(self, *values):
+        values = list(values)
+
+        async def call(*args, **kwargs):
+            value = values.pop(0)
+            if isinstance(value, Exception):
+                raise value
+            return value
+        return call
+
+    def test_unlock(self):
+        self.bus.set = self.coroutine(True)
+        calls = list()
+        set_ = self.bus.set
+
+        async def record(*args):
+            calls.append(args)
+            return await set_(*args)
+
+        self.bus.set = record
+
+        assert run(self.mod.unlock())
+        assert calls == [(31002, 'ACTION_PARAMETER_TABLE', 'SupportPW',
+                          [66 + 0x8000])]
+
+    def test_get_moisture(self):
+        # event mode, measure mode, running, two polls, moisture
+        self.bus.get = self.coroutine((0x80,), (0,), (0,), (1,), (0,),
+                                      (12.35,))
+        self.bus.set = self.coroutine(True)
+
+        assert run(self.mod.get_moisture(interval=0.0)) == 12.35
+
+    def test_start_measure_WrongMode(self):
+        self.bus.get = self.coroutine((0x80,), (2,))
+
+        with pytest.raises(ModuleError):
+            run(self.mod.start_measure())
+
+    def test_get_moisture_Timeout(self):
+        self.bus.get = self.coroutine((0x80,), (0,), (0,), *[(1,)] * 1000)
+        self.bus.set = self.coroutine(True)
+
+        with pytest.raises(asyncio.TimeoutError):
+            run(self.mod.get_moisture(interval=0.01, timeout=0.05))
+
+    def test_write_eeprom(self):
+        self.bus.set = self.coroutine(True)
+        self.bus.set_eeprom_page = self.coroutine(True, True)
+
+        assert run(self.mod.write_eeprom([b'page0', b'page1']))
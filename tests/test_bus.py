@@ -1,5 +1,6 @@
 # -*- coding: UTF-8 -*-
 
+import json
 import pytest
 from binascii import a2b_hex as a2b
 
@@ -9,9 +10,10 @@ except ImportError:
     from mock import patch, call, MagicMock
 
 from implib2.imp_bus import Bus, BusError
+from implib2.imp_cache import Cache
 from implib2.imp_device import Device, DeviceError  # noqa
 from implib2.imp_commands import Command            # noqa
-from implib2.imp_responces import Responce          # noqa
+from implib2.imp_responces import Responce, ResponceError  # noqa
 
 
 class TestBus:
@@ -100,6 +102,97 @@ class TestBus:
         assert self.bus.bus_synced
         assert self.manager.mock_calls == expected_calls
 
+    def test_sync_FastPathAlreadySynced(self):
+        package = a2b('fd0b05ffffffaf0400600054')
+        sernos = (10010, 10011, 10012, 10013)
+
+        self.cmd.set_parameter.return_value = package
+        self.bus.probe_module_short = MagicMock(return_value=True)
+
+        assert self.bus.sync(baudrate=9600, sernos=sernos)
+        assert self.bus.bus_synced
+        assert self.bus.probe_module_short.call_args_list == \
+            [call(10010), call(10011), call(10012), call(10013)]
+        self.dev.set_baudrate.assert_called_once_with(9600)
+        self.dev.write_pkg.assert_not_called()
+        self.dev.open_device.assert_not_called()
+        self.dev.close_device.assert_not_called()
+
+    def test_sync_FastPathNotPreempted(self):
+        preempt = MagicMock()
+        self.bus.preempt = preempt
+        self.res.get_short_ack.return_value = True
+
+        assert self.bus.sync(baudrate=9600, sernos=(10010, 10011))
+        preempt.assert_not_called()
+        assert self.bus.preempt is preempt
+
+    def test_sync_SharedHoldsLock(self):
+        self.bus.shared = True
+        self.res.get_short_ack.return_value = True
+
+        assert self.bus.sync(baudrate=9600, sernos=(10010, 10011))
+        assert self.dev.transaction.call_count == 1
+        assert self.dev.write_pkg.call_count == 2
+        assert not self.bus._held
+
+    def test_sync_FastPathProbeAtOtherBaudrate(self):
+        package = a2b('fd0b05ffffffaf0400600054')
+        rates = {10010: 9600, 10011: 2400}
+        dev = self.dev
+
+        def probe(serno):
+            return rates[serno] == dev.set_baudrate.call_args[0][0]
+
+        def write_pkg(pkg):
+            rates[10011] = 9600
+
+        self.cmd.set_parameter.return_value = package
+        self.dev.write_pkg.side_effect = write_pkg
+        self.bus.probe_module_short = MagicMock(side_effect=probe)
+
+        with patch('implib2.imp_bus.time.sleep'):
+            assert self.bus.sync(baudrate=9600, sernos=[10010, 10011])
+
+        assert self.dev.set_baudrate.call_args_list == \
+            [call(9600), call(1200), call(2400), call(9600)]
+        self.dev.write_pkg.assert_called_once_with(package)
+        self.dev.open_device.assert_not_called()
+
+    def test_sync_FastPathChecksAllSernos(self):
+        package = a2b('fd0b05ffffffaf0400600054')
+        rates = {10010: 9600, 10011: 9600, 10012: 9600, 10013: 4800}
+        dev = self.dev
+
+        def probe(serno):
+            return rates[serno] == dev.set_baudrate.call_args[0][0]
+
+        def write_pkg(pkg):
+            rates[10013] = 9600
+
+        self.cmd.set_parameter.return_value = package
+        self.dev.write_pkg.side_effect = write_pkg
+        self.bus.probe_module_short = MagicMock(side_effect=probe)
+
+        with patch('implib2.imp_bus.time.sleep'):
+            assert self.bus.sync(baudrate=9600, sernos=sorted(rates))
+
+        self.dev.write_pkg.assert_called_once_with(package)
+        assert rates[10013] == 9600
+
+    def test_sync_FastPathFallsBackToFullSweep(self):
+        package = a2b('fd0b05ffffffaf0400600054')
+
+        self.cmd.set_parameter.return_value = package
+        self.bus.probe_module_short = MagicMock(return_value=False)
+
+        with patch('implib2.imp_bus.time.sleep'):
+            assert self.bus.sync(baudrate=9600, sernos=[10010])
+
+        assert self.bus.probe_module_short.call_count == 4
+        assert self.dev.write_pkg.call_count == 4
+        self.dev.open_device.assert_called_with(baudrate=9600)
+
     def test_sync_WithWrongBaudrate(self):
         with pytest.raises(BusError, message="Unknown baudrate!"):
             self.bus.sync(baudrate=6666)
@@ -167,6 +260,67 @@ class TestBus:
         assert self.bus.scan(minserial, maxserial) is tuple()
         self.bus.probe_range.assert_called_once_with(0b1000)
 
+    def test_scan_SkipsRangesKnownToBeOccupied(self):
+        minserial = 0b0000  # 00
+        maxserial = 0b1111  # 15
+
+        self.bus.probe_range = MagicMock()
+        self.bus.probe_range.side_effect = lambda x: x in (0b1000, 0b0100,
+                                                           0b0010, 0b0001)
+
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x == 0b0001
+
+        range_list = [
+            call(0b1000),  # 08
+            call(0b1100),  # 12
+            call(0b0110),  # 06
+            call(0b0011)   # 03
+        ]
+
+        modules_list = [
+            call(0b0001),  # 01
+            call(0b0000)   # 00
+        ]
+
+        stats = {
+            'range_probes': 4,
+            'module_probes': 2,
+            'inferred': 3,
+            'transactions': 6,
+            'pending': 0}
+
+        assert self.bus.scan(minserial, maxserial) == (1,)
+        assert self.bus.probe_range.call_args_list == range_list
+        assert self.bus.probe_module_short.call_args_list == modules_list
+        assert self.bus.scan_stats == stats
+
+    def test_scan_iter(self):
+        minserial = 0b0000  # 00
+        maxserial = 0b1111  # 15
+
+        self.bus.probe_range = MagicMock()
+        self.bus.probe_range.side_effect = \
+            lambda x: any(x - (x & -x) <= y < x + (x & -x) for y in (1, 10))
+
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in (1, 10)
+
+        scan = self.bus.scan_iter(minserial, maxserial)
+
+        serno, progress = next(scan)
+        assert serno == 10
+        assert progress['pending'] == 2
+        assert progress['transactions'] == 6
+
+        serno, progress = next(scan)
+        assert serno == 1
+        assert progress['pending'] == 0
+        assert progress['transactions'] == 12
+
+        with pytest.raises(StopIteration):
+            next(scan)
+
     @pytest.mark.parametrize("probe", range(33000, 34001))
     def test_scan_AndFindOne(self, probe):
         minserial = 33000
@@ -190,6 +344,205 @@ class TestBus:
 
         assert self.bus.scan(minserial, maxserial) == (probe,)
 
+    def test_scan_WithCandidates(self):
+        minserial = 0b0000  # 00
+        maxserial = 0b1111  # 15
+        present = (0b0101, 0b1100)  # 05, 12
+        crc = dict((x, y) for y, x in enumerate(range(16)))
+
+        def check_range(bcast):
+            mark = bcast & -bcast
+            found = [x for x in present if bcast - mark <= x < bcast + mark]
+            if len(found) == 1:
+                return True, crc[found[0]]
+            return bool(found), None
+
+        self.bus._probe_range_reply = MagicMock()
+        self.bus._probe_range_reply.side_effect = check_range
+
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in present
+
+        range_list = [
+            call(0b1000),  # 00-15, collision
+            call(0b1100),  # 08-15, 12 answers
+            call(0b1010),  # 08-11, the rest besides 12
+            call(0b1111),  # 14-15
+            call(0b0100),  # 00-07, 05 answers
+            call(0b0010),  # 00-03, the rest besides 05
+            call(0b0111)   # 06-07
+        ]
+
+        with patch('implib2.imp_bus._crcindex') as mock_index:
+            mock_index.return_value = dict((y, [x]) for x, y in crc.items())
+            assert self.bus.scan(minserial, maxserial, [5, 12]) == present
+            mock_index.assert_called_once_with([5, 12])
+
+        assert self.bus._probe_range_reply.call_args_list == range_list
+        assert self.bus.probe_module_short.call_args_list == \
+            [call(0b1100), call(0b1101), call(0b0101), call(0b0100)]
+        assert self.bus._crc_index is None
+
+    def test_scan_WithCandidates_GarbledCollision(self):
+        present = (0b0101, 0b0110)  # 05, 06
+
+        # the colliding replies of 05 and 06 garble into the crc of 05
+        self.bus._probe_range_reply = MagicMock()
+        self.bus._probe_range_reply.side_effect = lambda bcast: (
+            any(bcast - (bcast & -bcast) <= x < bcast + (bcast & -bcast)
+                for x in present), 5)
+
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in present
+
+        with patch('implib2.imp_bus._crcindex') as mock_index:
+            mock_index.return_value = {5: [5]}
+            assert self.bus.scan(0, 15, [5]) == present
+
+    def test_scan_ranges(self):
+        self.bus.probe_range = MagicMock()
+        self.bus.probe_range.return_value = True
+
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in (2, 5, 12)
+
+        range_list = [
+            call(0b0110),  # 06
+            call(0b0111),  # 07
+            call(0b1101)   # 13
+        ]
+
+        modules_list = [
+            call(0b0010),  # 02
+            call(0b0111),  # 07
+            call(0b0110),  # 06
+            call(0b0101),  # 05
+            call(0b0100),  # 04
+            call(0b1101),  # 13
+            call(0b1100)   # 12
+        ]
+
+        ranges = [(12, 13), (4, 6), (2, 2), (5, 7)]
+        assert self.bus.scan_ranges(ranges) == (2, 5, 12)
+        assert self.bus.probe_range.call_args_list == range_list
+        assert self.bus.probe_module_short.call_args_list == modules_list
+
+    def test_rescan(self, tmpdir):
+        minserial = 0b0000  # 00
+        maxserial = 0b1111  # 15
+        present = (0b0011, 0b1001, 0b1100)  # 03, 09, 12
+        topology = tmpdir.join('topology.json')
+        topology.write('[3, 5, 9]')
+
+        def check_range(bcast):
+            mark = bcast & -bcast
+            return any(bcast - mark <= x < bcast + mark for x in present)
+
+        self.bus.probe_range = MagicMock()
+        self.bus.probe_range.side_effect = check_range
+
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in present
+
+        assert self.bus.rescan(str(topology), minserial, maxserial) == present
+        assert json.loads(topology.read()) == list(present)
+
+        # the known probes are called up first, afterwards only the gaps
+        # between the confirmed ones are searched.
+        assert self.bus.probe_module_short.call_args_list[:3] == \
+            [call(3), call(5), call(9)]
+        assert self.bus.probe_range.call_args_list == [
+            call(0b0001),  # 00-01
+            call(0b0110),  # 04-07
+            call(0b1011),  # 10-11
+            call(0b1110),  # 12-15
+            call(0b1111)]  # 14-15
+
+    def test_rescan_KeepsSernosOutsideRange(self, tmpdir):
+        topology = tmpdir.join('topology.json')
+        topology.write('[3, 5, 5000000]')
+
+        self.bus.probe_range = MagicMock(return_value=False)
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in (3, 5)
+
+        assert self.bus.rescan(str(topology), 0, 15) == (3, 5)
+        assert json.loads(topology.read()) == [3, 5, 5000000]
+
+    def test_rescan_WithoutTopology(self, tmpdir):
+        topology = tmpdir.join('topology.json')
+
+        self.bus.probe_range = MagicMock()
+        self.bus.probe_range.return_value = False
+
+        assert self.bus.rescan(str(topology), 0, 15) == tuple()
+        self.bus.probe_range.assert_called_once_with(0b1000)
+        assert json.loads(topology.read()) == []
+
+    def test_verify_present(self):
+        expected = [9, 3, 4, 5, 6, 7, 10, 11, 16, 17, 18, 19]
+        present = (3, 4, 5, 10, 11)
+
+        def check_range(bcast):
+            mark = bcast & -bcast
+            return any(bcast - mark <= x < bcast + mark for x in present)
+
+        self.bus.probe_range = MagicMock()
+        self.bus.probe_range.side_effect = check_range
+
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in present
+
+        range_list = [
+            call(0b01011),  # 10-11, after 09 is missing
+            call(0b10011)   # 18-19, after 17 is missing
+        ]
+
+        modules_list = [
+            call(0b00011),  # 03
+            call(0b00100),  # 04
+            call(0b00101),  # 05
+            call(0b00110),  # 06
+            call(0b00111),  # 07
+            call(0b01001),  # 09
+            call(0b01010),  # 10
+            call(0b01011),  # 11
+            call(0b10000),  # 16
+            call(0b10001)   # 17
+        ]
+
+        assert self.bus.verify_present(expected) == (6, 7, 9, 16, 17, 18, 19)
+        assert self.bus.probe_range.call_args_list == range_list
+        assert self.bus.probe_module_short.call_args_list == modules_list
+
+    def test_verify_present_AllPresent(self):
+        expected = list(range(100, 164))
+
+        self.bus.probe_range = MagicMock(return_value=True)
+        self.bus.probe_module_short = MagicMock(return_value=True)
+
+        assert self.bus.verify_present(expected) == tuple()
+        # one transaction per probe, no range probes at all
+        assert self.bus.probe_module_short.call_count == 64
+        assert not self.bus.probe_range.called
+
+    def test_verify_present_MissingGroup(self):
+        expected = list(range(0, 64))
+        present = range(0, 32)
+
+        def check_range(bcast):
+            mark = bcast & -bcast
+            return any(bcast - mark <= x < bcast + mark for x in present)
+
+        self.bus.probe_range = MagicMock(side_effect=check_range)
+        self.bus.probe_module_short = MagicMock()
+        self.bus.probe_module_short.side_effect = lambda x: x in present
+
+        assert self.bus.verify_present(expected) == tuple(range(32, 64))
+        # 00-32 one by one, then 34-35, 36-39, 40-47 and 48-63 by range
+        assert self.bus.probe_module_short.call_count == 34
+        assert self.bus.probe_range.call_count == 4
+
     def test_find_single_module(self):
         serno = 31002
         package = a2b('fd0800ffffff60')
@@ -364,6 +717,358 @@ class TestBus:
         assert self.bus.get(serno, table, param) == (serno,)
         assert self.manager.mock_calls == expected_calls
 
+    def test_get_Shared(self):
+        serno = 31002
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'SerialNum'
+        package = a2b('fd0a031a7900290100c4')
+        bytes_recv = a2b('000a051a7900181a79000042')
+
+        expected_calls = [
+            call.cmd.get_parameter(serno, table, param),
+            call.dev.transaction(),
+            call.dev.transaction().__enter__(),
+            call.dev.write_pkg(package),
+            call.dev.read_pkg(),
+            call.dev.transaction().__exit__(None, None, None),
+            call.res.get_parameter(bytes_recv, table, param)
+        ]
+
+        self.bus.shared = True
+        self.cmd.get_parameter.return_value = package
+        self.dev.write_pkg.return_value = True
+        self.dev.read_pkg.return_value = bytes_recv
+        self.res.get_parameter.return_value = (31002,)
+
+        assert self.bus.get(serno, table, param) == (serno,)
+        assert self.manager.mock_calls == expected_calls
+
+    def test_get_Cached(self):
+        serno = 31002
+        table = 'SYSTEM_PARAMETER_TABLE'
+        self.bus.cache = Cache()
+        self.bus._get = MagicMock(return_value=(1.14,))
+
+        assert self.bus.get(serno, table, 'HWVersion') == (1.14,)
+        assert self.bus.get(serno, table, 'HWVersion') == (1.14,)
+        assert self.bus.get(serno, table, 'ConfigID') == (1.14,)
+
+        assert self.bus._get.call_args_list == [
+            call(serno, table, 'ConfigID'),
+            call(serno, table, 'HWVersion'),
+            call(serno, table, 'ConfigID')]
+        assert self.bus.cache.stats == {'hits': 1, 'misses': 1,
+                                        'validations': 0}
+
+    @patch('implib2.imp_cache.time')
+    def test_get_CachedValidatesConfigID(self, mock_time):
+        serno = 31002
+        table = 'APPLICATION_PARAMETER_TABLE'
+        self.bus.cache = Cache(ttl=60.0)
+        self.bus._get = MagicMock(side_effect=[(7,), (1,), (7,), (8,), (2,)])
+
+        # the ConfigID is recorded along with the first value
+        mock_time.time.return_value = 100.0
+        assert self.bus.get(serno, table, 'AverageMode') == (1,)
+
+        # so the first expiry validates right away
+        mock_time.time.return_value = 200.0
+        assert self.bus.get(serno, table, 'AverageMode') == (1,)
+
+        mock_time.time.return_value = 300.0
+        assert self.bus.get(serno, table, 'AverageMode') == (2,)
+
+        assert self.bus._get.call_args_list == [
+            call(serno, table, 'ConfigID'),
+            call(serno, table, 'AverageMode'),
+            call(serno, table, 'ConfigID'),
+            call(serno, table, 'ConfigID'),
+            call(serno, table, 'AverageMode')]
+        assert self.bus.cache.stats == {'hits': 1, 'misses': 2,
+                                        'validations': 2}
+
+    def test_get_CachedWithoutConfigID(self):
+        serno = 31002
+        table = 'DEVICE_CALIBRATION_PARAMETER_TABLE'
+        self.bus.cache = Cache()
+        self.bus._get = MagicMock(return_value=(7,))
+
+        # the table has no ConfigID, its read-only values are kept anyway
+        assert self.bus.get(serno, table, 'ECDivisor') == (7,)
+        assert self.bus.get(serno, table, 'ECDivisor') == (7,)
+
+        self.bus._get.assert_called_once_with(serno, table, 'ECDivisor')
+        assert self.bus.cache.stats == {'hits': 1, 'misses': 1,
+                                        'validations': 0}
+
+    def test_set_InvalidatesCache(self):
+        table = 'APPLICATION_PARAMETER_TABLE'
+        self.bus.cache = Cache()
+        self.bus.cache.store(10010, table, 'AverageMode', (1,))
+        self.bus.cache.store(10011, table, 'AverageMode', (1,))
+
+        self.bus.set(10010, table, 'AverageMode', [2])
+        assert self.bus.cache.lookup(10010, table, 'AverageMode') is None
+        assert self.bus.cache.lookup(10011, table, 'AverageMode') == (1,)
+
+        self.bus.set(16777215, table, 'AverageMode', [2])
+        assert self.bus.cache.lookup(10011, table, 'AverageMode') is None
+
+    def test_preempt(self):
+        self.bus.preempt = MagicMock()
+        self.dev.read.return_value = b'\x00'
+
+        self.bus.probe_range(0x800000)
+
+        self.bus.preempt.assert_called_once_with()
+
+    def test_measure_all(self):
+        table = 'ACTION_PARAMETER_TABLE'
+        param = 'StartMeasure'
+        package = a2b('fd1504fffffffe05000035')
+        self.cmd.set_parameter.return_value = package
+
+        running = {31002: [(5,), (1,), (0,)], 31003: [(7,), (1,), (1,), (0,)]}
+        self.bus.get = MagicMock(side_effect=lambda s, t, p: running[s].pop(0))
+        self.bus.get_many = MagicMock(
+            side_effect=lambda s, t, q: {'Moist': (s,), 'MeasureCount': (8,)})
+
+        with patch('implib2.imp_bus.time.sleep') as mock_sleep:
+            values, errors = self.bus.measure_all([31002, 31003])
+
+        assert values == {31002: {'Moist': (31002,)},
+                          31003: {'Moist': (31003,)}}
+        assert errors == {}
+        self.cmd.set_parameter.assert_called_once_with(16777215, table, param,
+                                                       [1], 0)
+        self.dev.write_pkg.assert_called_once_with(package)
+        assert self.bus.get.call_count == 7
+        self.bus.get.assert_any_call(31002, 'MEASURE_PARAMETER_TABLE',
+                                     'MeasureCount')
+        # one wait for the broadcast and one per poll round
+        assert mock_sleep.call_count == 3
+        self.bus.get_many.assert_called_with(31003, 'MEASURE_PARAMETER_TABLE',
+                                             ['Moist', 'MeasureCount'])
+
+    def test_measure_all_ReportsStaleValues(self):
+        # 31003 ignores the broadcast, its count doesn't change
+        counts = {31002: 5, 31003: 7}
+        self.bus.get = MagicMock(
+            side_effect=lambda s, t, p: (counts[s],) if p == 'MeasureCount'
+            else (0,))
+        self.bus.get_many = MagicMock(
+            side_effect=lambda s, t, q: {'Moist': (s,),
+                                         'MeasureCount': (7,)})
+
+        with patch('implib2.imp_bus.time.sleep'):
+            values, errors = self.bus.measure_all([31002, 31003])
+
+        assert values == {31002: {'Moist': (31002,)}}
+        assert list(errors) == [31003]
+        assert isinstance(errors[31003], BusError)
+
+    def test_measure_all_ReportsFailures(self):
+        error = DeviceError('Timeout reading header!')
+
+        def get(serno, table, param):
+            if serno == 31003:
+                raise error
+            return (serno == 31004,)
+
+        self.bus.get = MagicMock(side_effect=get)
+        self.bus.get_many = MagicMock(
+            side_effect=lambda s, t, q: {'Moist': (s,), 'MeasureCount': (1,)})
+
+        with patch('implib2.imp_bus.time') as mock_time:
+            # the time is up after the first poll round
+            clock = [100.0]
+            mock_time.time.side_effect = lambda: clock[0]
+            mock_time.sleep.side_effect = \
+                lambda x: clock.__setitem__(0, clock[0] + 11.0)
+            values, errors = self.bus.measure_all([31002, 31003, 31004],
+                                                  timeout=10.0)
+
+        # 31003 fails and 31004 never finishes, 31002 is read anyway
+        assert values == {31002: {'Moist': (31002,)}}
+        assert errors[31003] is error
+        assert isinstance(errors[31004], BusError)
+        self.bus.get_many.assert_called_once_with(
+            31002, 'MEASURE_PARAMETER_TABLE', ['Moist', 'MeasureCount'])
+
+    def test_get_all(self):
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'FWVersion'
+        error = DeviceError('Timeout reading header!')
+
+        def get(serno, tbl, prm):
+            if serno == 10011:
+                raise error
+            return (serno,)
+
+        self.bus.get = MagicMock(side_effect=get)
+
+        values, errors = self.bus.get_all([10012, 10011, 10010], table, param)
+
+        assert values == {10010: (10010,), 10012: (10012,)}
+        assert errors == {10011: error}
+        assert self.bus.dead == {10011}
+        assert self.bus.get.call_args_list == [call(10010, table, param),
+                                               call(10011, table, param),
+                                               call(10012, table, param)]
+
+    def test_get_all_SkipsDead(self):
+        self.bus.dead = {10011}
+        self.bus.get = MagicMock(return_value=(1,))
+
+        values, errors = self.bus.get_all([10010, 10011], 'T', 'P')
+
+        assert values == {10010: (1,)}
+        assert isinstance(errors[10011], BusError)
+        self.bus.get.assert_called_once_with(10010, 'T', 'P')
+
+    def test_get_all_RevivesDead(self):
+        self.bus.dead = {10011}
+        self.bus.get = MagicMock(return_value=(1,))
+
+        values, errors = self.bus.get_all([10011, 10010], 'T', 'P',
+                                          skip_dead=False)
+
+        assert values == {10010: (1,), 10011: (1,)}
+        assert not errors
+        assert not self.bus.dead
+        # the dead probe comes last
+        assert self.bus.get.call_args_list == [call(10010, 'T', 'P'),
+                                               call(10011, 'T', 'P')]
+
+    def test_get_all_RetriesWithinBudget(self):
+        error = ResponceError('Packet CRC error!')
+        self.bus.get = MagicMock(side_effect=[error, (1,)])
+
+        with patch('implib2.imp_bus.time') as mock_time:
+            mock_time.time.side_effect = [0.0, 0.1]
+            values, errors = self.bus.get_all([10010], 'T', 'P', budget=0.5)
+
+        assert values == {10010: (1,)}
+        assert not errors
+        assert not self.bus.dead
+        # pauses before the retry
+        mock_time.sleep.assert_called_once_with(self.bus.retry_wait)
+
+    def test_get_all_RetriesDeadAfterAWhile(self):
+        error = DeviceError('Timeout reading header!')
+        self.bus.get = MagicMock(side_effect=[error, (1,)])
+
+        with patch('implib2.imp_bus.time') as mock_time:
+            mock_time.time.return_value = 100.0
+            self.bus.get_all([10011], 'T', 'P')
+            assert self.bus.dead == {10011}
+
+            # skipped while recently dead, asked again afterwards
+            mock_time.time.return_value = 130.0
+            values, errors = self.bus.get_all([10011], 'T', 'P')
+            assert isinstance(errors[10011], BusError)
+
+            mock_time.time.return_value = 161.0
+            values, errors = self.bus.get_all([10011], 'T', 'P')
+
+        assert values == {10011: (1,)}
+        assert not self.bus.dead
+        assert self.bus.get.call_count == 2
+
+    def test_set_all(self):
+        self.bus.set = MagicMock(return_value=True)
+
+        values, errors = self.bus.set_all([10010, 10011], 'T', 'P', [1])
+
+        assert values == {10010: True, 10011: True}
+        assert not errors
+        assert self.bus.set.call_args_list == [call(10010, 'T', 'P', [1], 0),
+                                               call(10011, 'T', 'P', [1], 0)]
+
+    def test_get_many_FewParameters(self):
+        serno = 31002
+        table = 'MEASURE_PARAMETER_TABLE'
+        self.bus.get = MagicMock(side_effect=lambda s, t, p: (len(p),))
+        self.bus.get_table = MagicMock()
+
+        values = self.bus.get_many(serno, table, ['Moist', 'CompTemp'])
+
+        assert values == {'Moist': (5,), 'CompTemp': (8,)}
+        assert self.bus.get.call_args_list == [call(serno, table, 'Moist'),
+                                               call(serno, table, 'CompTemp')]
+        self.bus.get_table.assert_not_called()
+
+    def test_get_many_ReadsTable(self):
+        serno = 31002
+        table = 'MEASURE_PARAMETER_TABLE'
+        params = ['Moist', 'CompTemp', 'TransitTime', 'TDRValue', 'ConfigID']
+        self.bus.get = MagicMock(return_value=(1,))
+        self.bus.get_table = MagicMock()
+        self.bus.get_table.return_value = {
+            'Moist': (12.5,),
+            'CompTemp': (21.0,),
+            'TransitTime': (300.0,),
+            'TDRValue': (512.0,),
+            'MeasureCount': (7,)}
+
+        assert self.bus.get_many(serno, table, params) == {
+            'Moist': (12.5,),
+            'CompTemp': (21.0,),
+            'TransitTime': (300.0,),
+            'TDRValue': (512.0,),
+            'ConfigID': (1,)}
+        self.bus.get_table.assert_called_once_with(serno, table)
+        self.bus.get.assert_called_once_with(serno, table, 'ConfigID')
+
+    def test_get_many_TableWithoutGetData(self):
+        serno = 31002
+        table = 'DEVICE_CALIBRATION_PARAMETER_TABLE'
+        params = ['ASICTCStartTemp', 'ASICTCHeatTemp', 'ASICTCEndTemp',
+                  'ASICTCSpanTemp']
+        self.bus.get = MagicMock(return_value=(1,))
+        self.bus.get_table = MagicMock()
+
+        assert self.bus.get_many(serno, table, params) == {
+            x: (1,) for x in params}
+        assert not self.bus.get_table.called
+        assert self.bus.get.call_count == 4
+
+    def test_get_many_SkipsHugeTable(self):
+        serno = 31002
+        table = 'PROBE_CALIBRATION_PARAMETER_TABLE'
+        params = ['BasicCoeff', 'StdCoeff', 'DefaultCalItem']
+        self.bus.get = MagicMock(return_value=(1,))
+        self.bus.get_table = MagicMock()
+
+        assert self.bus.get_many(serno, table, params) == {
+            'BasicCoeff': (1,),
+            'StdCoeff': (1,),
+            'DefaultCalItem': (1,)}
+        assert self.bus.get.call_count == 3
+        self.bus.get_table.assert_not_called()
+
+    def test_get_table(self):
+        serno = 31002
+        table = 'SYSTEM_PARAMETER_TABLE'
+        package = a2b('fd0a031a790029ff0081')
+        packets = [a2b('ff0a151a7900761a79000001020304010203040102010203040506e5'),
+                   a2b('000a0f1a7900030708090a0b0c0d0e0f10010201015c')]
+
+        expected_calls = [
+            call.cmd.get_table(serno, table),
+            call.dev.write_pkg(package),
+            call.dev.read_pkgs(),
+            call.res.get_table(packets, table)
+        ]
+
+        self.cmd.get_table.return_value = package
+        self.dev.write_pkg.return_value = True
+        self.dev.read_pkgs.return_value = packets
+        self.res.get_table.return_value = {'SerialNum': (serno,)}
+
+        assert self.bus.get_table(serno, table) == {'SerialNum': (serno,)}
+        assert self.manager.mock_calls == expected_calls
+
     def test_set(self):
         serno = 31002
         table = 'PROBE_CONFIGURATION_PARAMETER_TABLE'
@@ -410,6 +1115,81 @@ class TestBus:
         assert self.bus.get_eeprom_page(serno, page_nr) == page
         assert self.manager.mock_calls == expected_calls
 
+    def test_get_WithDeadline(self):
+        serno = 31002
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'SerialNum'
+        package = a2b('fd0a031a7900290100c4')
+        bytes_recv = a2b('000a051a7900181a79000042')
+
+        self.bus.deadline = True
+        self.cmd.get_parameter.return_value = package
+        self.dev.transfer_time.return_value = 0.025
+        self.dev.read_pkg.return_value = bytes_recv
+        self.res.get_parameter.return_value = (31002,)
+
+        with patch('implib2.imp_bus.time') as mock_time:
+            mock_time.time.return_value = 100.0
+            assert self.bus.get(serno, table, param) == (serno,)
+
+        self.dev.transfer_time.assert_called_once_with(len(package) + 7)
+        self.dev.read_pkg.assert_called_once_with(deadline=100.125)
+
+    def test_probe_module_short_WithDeadline(self):
+        serno = 31002
+        package = a2b('fd04001a790003')
+        bytes_recv = a2b('24')
+
+        self.bus.deadline = True
+        self.cmd.get_short_ack.return_value = package
+        self.dev.transfer_time.return_value = 0.0625
+        self.dev.read_bytes.return_value = bytes_recv
+        self.res.get_short_ack.return_value = True
+
+        with patch('implib2.imp_bus.time') as mock_time:
+            mock_time.time.return_value = 100.0
+            assert self.bus.probe_module_short(serno)
+
+        self.dev.transfer_time.assert_called_once_with(len(package) + 1)
+        self.dev.read_bytes.assert_called_once_with(1, deadline=100.1125)
+
+    def test_get_WithAutotune(self):
+        serno = 31002
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'SerialNum'
+
+        self.bus.tuner = MagicMock()
+        self.bus.tuner.waits.return_value = (0.0, 0.0)
+        self.dev.read_pkg.return_value = a2b('000a051a7900181a79000042')
+        self.res.get_parameter.return_value = (31002,)
+
+        assert self.bus.get(serno, table, param) == (serno,)
+        self.bus.tuner.waits.assert_called_once_with('get', serno)
+        self.bus.tuner.report.assert_called_once_with('get', serno, True)
+
+    def test_get_WithAutotune_ButGetDeviceError(self):
+        serno = 31002
+        table = 'SYSTEM_PARAMETER_TABLE'
+        param = 'SerialNum'
+
+        self.bus.tuner = MagicMock()
+        self.bus.tuner.waits.return_value = (0.0, 0.0)
+        self.dev.read_pkg.side_effect = DeviceError('Timeout reading header!')
+
+        with pytest.raises(DeviceError):
+            self.bus.get(serno, table, param)
+        self.bus.tuner.report.assert_called_once_with('get', serno, False)
+
+    def test_probe_module_short_WithAutotune_ButGetDeviceError(self):
+        serno = 31002
+
+        self.bus.tuner = MagicMock()
+        self.bus.tuner.waits.return_value = (0.0, 0.0)
+        self.dev.read_bytes.side_effect = DeviceError('Timeout reading bytes!')
+
+        assert not self.bus.probe_module_short(serno)
+        self.bus.tuner.report.assert_not_called()
+
     def test_set_eeprom_page(self):
         serno = 30001
         page_nr = 7
@@ -0,0 +1,106 @@
+# -*- coding: UTF-8 -*-
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from implib2.imp_cache import Cache
+
+
+class TestCache:
+
+    def setup(self):
+        self.patcher = patch('implib2.imp_cache.time')
+        self.time = self.patcher.start()
+        self.time.time.return_value = 100.0
+        self.cache = Cache(ttl=10.0)
+
+    def teardown(self):
+        self.patcher.stop()
+
+    def test_caches(self):
+        assert self.cache.caches('SYSTEM_PARAMETER_TABLE', 'HWVersion')
+        assert self.cache.caches('APPLICATION_PARAMETER_TABLE', 'AverageMode')
+        assert not self.cache.caches('SYSTEM_PARAMETER_TABLE', 'ConfigID')
+        assert not self.cache.caches('MEASURE_PARAMETER_TABLE', 'Moist')
+        assert not self.cache.caches('ACTION_PARAMETER_TABLE', 'Event')
+
+    def test_lookup_Unknown(self):
+        table = 'SYSTEM_PARAMETER_TABLE'
+        assert self.cache.lookup(10010, table, 'HWVersion') is None
+        assert not self.cache.expired(10010, table, 'HWVersion')
+
+    def test_lookup_ReadOnlyNeverExpires(self):
+        table = 'SYSTEM_PARAMETER_TABLE'
+        self.cache.store(10010, table, 'HWVersion', (1.14,))
+
+        self.time.time.return_value = 1e9
+        assert self.cache.lookup(10010, table, 'HWVersion') == (1.14,)
+        assert self.cache.lookup(10011, table, 'HWVersion') is None
+
+    def test_lookup_WritableExpires(self):
+        table = 'APPLICATION_PARAMETER_TABLE'
+        self.cache.store(10010, table, 'AverageMode', (1,))
+
+        self.time.time.return_value = 110.0
+        assert self.cache.lookup(10010, table, 'AverageMode') == (1,)
+
+        self.time.time.return_value = 110.5
+        assert self.cache.lookup(10010, table, 'AverageMode') is None
+        assert self.cache.expired(10010, table, 'AverageMode')
+
+    def test_validate(self):
+        table = 'APPLICATION_PARAMETER_TABLE'
+        self.cache.store(10010, table, 'AverageMode', (1,))
+
+        assert not self.cache.validate(10010, table, (7,))
+        assert self.cache.lookup(10010, table, 'AverageMode') is None
+
+        self.cache.store(10010, table, 'AverageMode', (1,))
+        self.cache.store(10010, table, 'AverageTime', (12,))
+
+        self.time.time.return_value = 120.0
+        assert self.cache.validate(10010, table, (7,))
+        assert self.cache.lookup(10010, table, 'AverageMode') == (1,)
+        assert self.cache.lookup(10010, table, 'AverageTime') == (12,)
+
+        assert not self.cache.validate(10010, table, (8,))
+        assert self.cache.lookup(10010, table, 'AverageMode') is None
+        assert self.cache.stats['validations'] == 3
+
+    def test_store_config(self):
+        table = 'APPLICATION_PARAMETER_TABLE'
+        assert self.cache.config(10010, table) is None
+
+        self.cache.store_config(10010, table, (7,))
+        self.cache.store(10010, table, 'AverageMode', (1,))
+        assert self.cache.config(10010, table) == (7,)
+
+        self.time.time.return_value = 200.0
+        assert self.cache.validate(10010, table, (7,))
+        assert self.cache.lookup(10010, table, 'AverageMode') == (1,)
+
+    def test_validatable(self):
+        assert self.cache.validatable('APPLICATION_PARAMETER_TABLE')
+        assert not self.cache.validatable('DEVICE_CALIBRATION_PARAMETER_TABLE')
+
+    def test_invalidate(self):
+        table1 = 'SYSTEM_PARAMETER_TABLE'
+        table2 = 'APPLICATION_PARAMETER_TABLE'
+        for serno in (10010, 10011):
+            self.cache.store(serno, table1, 'HWVersion', (1.14,))
+            self.cache.store(serno, table2, 'AverageMode', (1,))
+
+        self.cache.invalidate(10010, table2)
+        assert self.cache.lookup(10010, table1, 'HWVersion') == (1.14,)
+        assert self.cache.lookup(10010, table2, 'AverageMode') is None
+        assert self.cache.lookup(10011, table2, 'AverageMode') == (1,)
+
+        self.cache.invalidate(table=table1)
+        assert self.cache.lookup(10010, table1, 'HWVersion') is None
+        assert self.cache.lookup(10011, table1, 'HWVersion') is None
+        assert self.cache.lookup(10011, table2, 'AverageMode') == (1,)
+
+        self.cache.invalidate()
+        assert self.cache.lookup(10011, table2, 'AverageMode') is None
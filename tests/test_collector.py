@@ -0,0 +1,146 @@
+# -*- coding: UTF-8 -*-
+
+try:
+    from unittest.mock import MagicMock, patch, call
+except ImportError:
+    from mock import MagicMock, patch, call
+
+from implib2.imp_collector import Collector
+from implib2.imp_device import DeviceError
+
+
+class TestCollector:
+
+    def setup(self):
+        self.patcher = patch('implib2.imp_collector.time')
+        self.time = self.patcher.start()
+        self.now = [100.0]
+        self.time.time.side_effect = lambda: self.now[0]
+
+        self.bus = MagicMock()
+        self.bus.get.return_value = (2000,)
+        self.counts = {10010: [1, 1, 2, 4]}
+        self.bus.get_table.side_effect = lambda s, t: {
+            'MeasureCount': (self.counts[s].pop(0),),
+            'Moist': (12.5,),
+            'CompTemp': (21.0,)}
+
+        self.module = MagicMock()
+        self.module.serno = 10010
+        self.module.bus = self.bus
+        self.collector = Collector([self.module], ['Moist'], retry=0.25)
+
+    def teardown(self):
+        self.patcher.stop()
+
+    def test_poll_FirstRead(self):
+        assert self.collector.poll() == (
+            [(10010, {'Moist': 12.5, 'MeasureCount': 1})], {})
+        self.bus.get.assert_called_once_with(
+            10010, 'DEVICE_CONFIGURATION_PARAMETER_TABLE', 'SleepTimeInModeC')
+        self.bus.get_table.assert_called_once_with(
+            10010, 'MEASURE_PARAMETER_TABLE')
+        assert not self.module.start_measure.called
+        assert not self.bus.set.called
+
+    def test_poll_NothingDue(self):
+        self.collector.poll()
+        self.now[0] += 1.0
+
+        assert self.collector.poll() == ([], {})
+        assert self.bus.get_table.call_count == 1
+
+    def test_poll_SkipsDuplicates(self):
+        self.collector.poll()
+        self.now[0] += 2.0
+        assert self.collector.poll() == ([], {})
+        assert self.collector.stats['duplicates'] == 1
+
+        # the duplicate is retried shortly after
+        self.now[0] += 0.25
+        assert self.collector.poll()[0] == [
+            (10010, {'Moist': 12.5, 'MeasureCount': 2})]
+
+    def test_poll_CountsMissedSamples(self):
+        self.collector.poll()
+        self.now[0] += 2.0
+        self.collector.poll()
+        self.now[0] += 0.25
+        self.collector.poll()
+        self.now[0] += 4.0
+        self.collector.poll()
+
+        assert self.collector.stats == {
+            'reads': 4, 'samples': 3, 'duplicates': 1, 'missed': 1,
+            'errors': 0}
+
+    def test_poll_KeepsProbeAfterError(self):
+        self.collector.poll()
+        self.now[0] += 2.0
+        error = DeviceError('Timeout reading header!')
+        self.bus.get_table.side_effect = error
+        assert self.collector.poll() == ([], {10010: error})
+        assert self.collector.stats['errors'] == 1
+
+        # the failed probe is retried shortly after
+        self.bus.get_table.side_effect = lambda s, t: {
+            'MeasureCount': (2,), 'Moist': (12.5,)}
+        self.now[0] += 0.25
+        assert self.collector.poll()[0] == [
+            (10010, {'Moist': 12.5, 'MeasureCount': 2})]
+
+    def test_poll_KeepsSamplesOfOthers(self):
+        error = DeviceError('Timeout reading header!')
+        other = MagicMock()
+        other.serno = 10011
+        other.bus = MagicMock()
+        other.bus.get.return_value = (2000,)
+        other.bus.get_table.side_effect = error
+        collector = Collector([self.module, other], ['Moist'])
+
+        samples, errors = collector.poll()
+        assert samples == [(10010, {'Moist': 12.5, 'MeasureCount': 1})]
+        assert errors == {10011: error}
+
+    def test_poll_CycleReadFails(self):
+        self.bus.get.side_effect = DeviceError('Timeout reading header!')
+
+        assert self.collector.poll()[0] == [
+            (10010, {'Moist': 12.5, 'MeasureCount': 1})]
+
+        # read again after retry until the cycle is learned
+        self.now[0] += 0.25
+        assert self.collector.poll()[0] == []
+        self.now[0] += 1.75
+        assert self.collector.poll()[0] == [
+            (10010, {'Moist': 12.5, 'MeasureCount': 2})]
+        assert self.collector._probes[10010][0] == 2.0
+
+    def test_poll_SchedulesEveryModule(self):
+        others = list()
+        for serno in (10011, 10012):
+            other = MagicMock()
+            other.serno = serno
+            other.bus = MagicMock()
+            other.bus.get_table.return_value = {
+                'MeasureCount': (1,), 'Moist': (1.0,)}
+            others.append(other)
+        others[0].bus.get.side_effect = DeviceError('Timeout!')
+        others[1].bus.get.return_value = (2000,)
+        collector = Collector([self.module] + others, ['Moist'])
+
+        samples, errors = collector.poll()
+        assert [x[0] for x in samples] == [10010, 10011, 10012]
+        assert len(collector._pending) == 3
+        assert [collector._probes[x][0] for x in (10010, 10011, 10012)] == [
+            2.0, None, 2.0]
+
+    def test_collect_iter(self):
+        self.time.sleep.side_effect = \
+            lambda x: self.now.__setitem__(0, self.now[0] + x)
+
+        samples = self.collector.collect_iter()
+
+        assert next(samples)[1]['MeasureCount'] == 1
+        assert next(samples)[1]['MeasureCount'] == 2
+        assert self.time.sleep.call_args_list == [call(2.0), call(0.25)]
@@ -36,6 +36,10 @@ class TestCommand:
                                      'SerialNum')
         assert pkg == a2b('fd0a031a7900290100c4')
 
+    def test_get_table(self):
+        pkg = self.cmd.get_table(31002, 'SYSTEM_PARAMETER_TABLE')
+        assert pkg == a2b('fd0a031a790029ff0081')
+
     def test_set_parameter(self):
         pkg = self.cmd.set_parameter(31002,
                                      'PROBE_CONFIGURATION_PARAMETER_TABLE',
@@ -1,5 +1,12 @@
 # -*- coding: UTF-8 -*-
 
+import os
+import json
+import shutil
+import tempfile
+import threading
+import subprocess
+
 import pytest
 import serial  # noqa
 
@@ -10,7 +17,7 @@ except ImportError:
 
 from binascii import a2b_hex as a2b
 
-from implib2.imp_device import Device, DeviceError
+from implib2.imp_device import Device, DeviceError, PortLock
 
 
 class TestPackage:
@@ -104,6 +111,26 @@ class TestPackage:
 
         assert self.ser.read.call_args_list == [call(7), call(5)]
 
+    def test_read_pkgs(self):
+        head1 = a2b('ff0a15bb8100a0')
+        head2 = a2b('000a05bb8100aa')
+        data1 = a2b('00' * 21)
+        data2 = a2b('bb810000cc')
+        self.ser.read.side_effect = [head1, data1, head2, data2]
+        self.dev.is_open = True
+
+        assert self.dev.read_pkgs() == [head1 + data1, head2 + data2]
+        assert self.ser.read.call_args_list == [call(7), call(21), call(7),
+                                                call(5)]
+
+    def test_read_pkgs_SinglePackage(self):
+        header = a2b('000a05bb8100aa')
+        data = a2b('bb810000cc')
+        self.ser.read.side_effect = [header, data]
+        self.dev.is_open = True
+
+        assert self.dev.read_pkgs() == [header + data]
+
     def test_read_bytes_FailsIfDeviceIsNotOpen(self):
         with pytest.raises(DeviceError, message="Couldn't read bytes, device is closed!"):
             self.dev.is_open = False
@@ -144,3 +171,264 @@ class TestPackage:
         assert self.dev.read() == empty_string
         self.ser.read.assert_called_once_with(1)
         self.ser.flushInput.assert_called_once_with()
+
+    def test_transfer_time(self):
+        self.ser.baudrate = 9600
+        assert self.dev.transfer_time(8) == 0.01
+
+    def test_read_pkg_WithDeadline(self):
+        header = a2b('000a05bb8100aa')
+        data = a2b('bb810000cc')
+        self.ser.read.side_effect = [header, data]
+        self.ser.baudrate = 9600
+        self.dev.is_open = True
+
+        with patch('implib2.imp_device.time.time') as mock_time:
+            mock_time.return_value = 100.0
+            assert self.dev.read_pkg(deadline=100.05) == header + data
+
+        assert self.ser.read.call_args_list == [call(7), call(5)]
+        assert self.ser.timeout == self.dev.timeout
+
+    def test_read_pkg_WithDeadlineInThePast(self):
+        self.ser.read.side_effect = [b'']
+        self.dev.is_open = True
+
+        with patch('implib2.imp_device.time.time') as mock_time:
+            mock_time.return_value = 100.0
+            with pytest.raises(DeviceError, message='Timeout reading header!'):
+                self.dev.read_pkg(deadline=99.0)
+
+        assert self.ser.timeout == self.dev.timeout
+
+    def test_read_bytes_WithDeadline(self):
+        pkg = a2b('ff')
+        self.ser.read.side_effect = [pkg]
+        self.dev.is_open = True
+
+        assert self.dev.read_bytes(1, deadline=0.0) == pkg
+        self.ser.read.assert_called_once_with(1)
+        assert self.ser.timeout == self.dev.timeout
+
+    def test_set_baudrate_OpensClosedDevice(self):
+        self.dev.set_baudrate(4800)
+        self.ser.open.assert_called_once_with()
+        assert self.ser.baudrate == 4800
+        assert self.dev.is_open is True
+
+    def test_set_baudrate_OnOpenDevice(self):
+        self.dev.is_open = True
+        self.dev.set_baudrate(4800)
+        self.ser.open.assert_not_called()
+        self.ser.close.assert_not_called()
+        assert self.ser.baudrate == 4800
+
+    def test_read_ack(self):
+        self.ser.read.return_value = a2b('ff')
+        self.ser.in_waiting = 0
+        self.ser.baudrate = 9600
+        self.dev.is_open = True
+
+        with patch('implib2.imp_device.time.sleep'):
+            assert self.dev.read_ack() == a2b('ff')
+        self.ser.read.assert_called_once_with(1)
+        self.ser.flushInput.assert_called_once_with()
+
+    def test_read_ack_WithCollision(self):
+        self.ser.read.side_effect = [a2b('ff'), a2b('0f')]
+        self.ser.in_waiting = 1
+        self.ser.baudrate = 9600
+        self.dev.is_open = True
+
+        with patch('implib2.imp_device.time.sleep'):
+            assert self.dev.read_ack() == a2b('ff0f')
+        assert self.ser.read.call_args_list == [call(1), call(1)]
+        self.ser.flushInput.assert_called_once_with()
+
+    def test_read_WithDeadline_DrainsLateReplies(self):
+        self.ser.read.return_value = a2b('ff')
+        self.ser.baudrate = 9600
+        self.dev.is_open = True
+
+        with patch('implib2.imp_device.time') as mock_time:
+            mock_time.time.return_value = 100.0
+            assert self.dev.read(deadline=100.05) == a2b('ff')
+
+        # waits for the slower probes of the range before flushing
+        delay = mock_time.sleep.call_args[0][0]
+        assert abs(delay - 0.05 - 12.0 / 9600) < 1e-9
+        self.ser.flushInput.assert_called_once_with()
+
+    def test_read_ack_WithDeadline_CollectsLateReplies(self):
+        self.ser.read.side_effect = [a2b('ff'), a2b('0f')]
+        self.ser.in_waiting = 1
+        self.ser.baudrate = 9600
+        self.dev.is_open = True
+
+        with patch('implib2.imp_device.time') as mock_time:
+            mock_time.time.return_value = 100.0
+            assert self.dev.read_ack(deadline=100.05) == a2b('ff0f')
+
+        assert mock_time.sleep.call_count == 2
+        self.ser.flushInput.assert_called_once_with()
+
+    def test_read_ack_ButGetNothing(self):
+        self.ser.read.return_value = b''
+        self.dev.is_open = True
+
+        assert self.dev.read_ack() == b''
+        self.ser.read.assert_called_once_with(1)
+        self.ser.flushInput.assert_called_once_with()
+
+
+class TestPortLock:
+
+    def setup(self):
+        self.tmp = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp, 'port.lock')
+        self.lock = PortLock(self.filename)
+
+    def teardown(self):
+        self.lock.close()
+        shutil.rmtree(self.tmp)
+
+    def state(self):
+        with open(self.filename) as lock_file:
+            return json.load(lock_file)
+
+    def test_acquire_release(self):
+        self.lock.acquire()
+        assert self.state()['queue'] == [[0, os.getpid()]]
+        self.lock.release()
+        assert self.state() == {'next': 1, 'queue': []}
+        assert self.lock.stats['acquired'] == 1
+
+    def test_acquire_PollsWithoutWriting(self):
+        self.lock.acquire()
+
+        with patch('implib2.imp_device.os.write', wraps=os.write) as write:
+            assert self.lock._update(lambda x: self.lock._serving(x, 0))
+            assert not write.called
+            self.lock.release()
+            assert write.call_count == 1
+
+    def test_acquire_SkipsDeadProcesses(self):
+        proc = subprocess.Popen(['true'])
+        proc.wait()
+        with open(self.filename, 'w') as lock_file:
+            json.dump({'next': 5, 'queue': [[4, proc.pid]]}, lock_file)
+
+        self.lock.acquire()
+        assert self.state()['queue'] == [[5, os.getpid()]]
+        self.lock.release()
+
+    def test_acquire_WaitsForItsTurn(self):
+        other = PortLock(self.filename)
+        other.acquire()
+
+        thread = threading.Thread(target=self.lock.acquire)
+        thread.start()
+        thread.join(0.05)
+        assert thread.is_alive()
+
+        other.release()
+        other.close()
+        thread.join(1.0)
+        assert not thread.is_alive()
+        assert self.lock.stats['wait_max'] >= 0.05
+        self.lock.release()
+
+    def test_acquire_Interrupted(self):
+        other = PortLock(self.filename)
+        other.acquire()
+
+        with patch('implib2.imp_device.time.sleep') as sleep:
+            sleep.side_effect = KeyboardInterrupt()
+            with pytest.raises(KeyboardInterrupt):
+                self.lock.acquire()
+
+        other.release()
+        other.close()
+        assert self.state()['queue'] == []
+
+    def test_acquire_InTurn(self):
+        locks = [PortLock(self.filename) for _ in range(3)]
+        order = list()
+
+        def worker(lock, number):
+            for _ in range(5):
+                lock.acquire()
+                order.append(number)
+                lock.release()
+
+        threads = [threading.Thread(target=worker, args=(x, i))
+                   for i, x in enumerate(locks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for lock in locks:
+            lock.close()
+
+        assert sorted(order) == sorted(list(range(3)) * 5)
+        assert self.state()['queue'] == []
+
+
+class TestTransaction:
+
+    def setup(self):
+        self.tmp = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp, 'port.lock')
+
+    def teardown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_transaction_NotShared(self):
+        with patch('serial.Serial'):
+            dev = Device('/dev/ttyS0')
+        assert dev.lock is None
+        with dev.transaction():
+            pass
+
+    def test_transaction_Shared(self):
+        with patch('serial.Serial'):
+            dev = Device('/dev/ttyS0', shared=True, lockfile=self.filename)
+        with dev.transaction():
+            assert dev.lock.stats['acquired'] == 1
+            with open(self.filename) as lock_file:
+                assert len(json.load(lock_file)['queue']) == 1
+        with open(self.filename) as lock_file:
+            assert json.load(lock_file)['queue'] == []
+        dev.lock.close()
+
+    def test_transaction_ReleasesOnError(self):
+        with patch('serial.Serial'):
+            dev = Device('/dev/ttyS0', shared=True, lockfile=self.filename)
+        with pytest.raises(DeviceError):
+            with dev.transaction():
+                raise DeviceError('Timeout reading header!')
+        with open(self.filename) as lock_file:
+            assert json.load(lock_file)['queue'] == []
+        dev.lock.close()
+
+    def test_close(self):
+        with patch('serial.Serial'):
+            dev = Device('/dev/ttyS0', shared=True, lockfile=self.filename)
+        dev.is_open = True
+
+        with patch.object(dev, 'ser') as ser, \
+                patch('implib2.imp_device.time.sleep'):
+            dev.close()
+        assert ser.close.called
+        assert not dev.is_open
+        assert dev.lock._fd is None
+
+        # closing twice does no harm
+        dev.close()
+
+    def test_default_lockfile(self):
+        with patch('serial.Serial'):
+            dev = Device('/dev/ttyS0', shared=True)
+        assert dev.lock.filename == os.path.join(
+            tempfile.gettempdir(), 'implib2-dev_ttyS0.lock')
+        dev.lock.close()
@@ -0,0 +1,84 @@
+# -*- coding: UTF-8 -*-
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from implib2.imp_estimator import Estimator
+
+
+class TestEstimator:
+
+    def setup(self):
+        self.patcher = patch('implib2.imp_estimator.time')
+        self.time = self.patcher.start()
+        self.now = [100.0]
+        self.time.time.side_effect = lambda: self.now[0]
+        self.time.sleep.side_effect = self.sleep
+
+        self.estimator = Estimator(lead=0.05, interval=0.025, weight=0.5)
+
+    def teardown(self):
+        self.patcher.stop()
+
+    def sleep(self, delay):
+        self.now[0] += delay
+
+    def test_delay_Unknown(self):
+        assert not self.estimator.known('measure', 10010)
+        assert self.estimator.expected('measure', 10010) is None
+        assert self.estimator.delay('measure', 10010, 100.0) == 0.0
+
+    def test_delay_Known(self):
+        self.estimator.seed('measure', 10010, 0.3)
+
+        assert self.estimator.known('measure', 10010)
+        assert abs(self.estimator.delay('measure', 10010, 100.0) - 0.25) < 1e-9
+        assert self.estimator.delay('measure', 10010, 99.0) == 0.0
+
+    def test_seed_KeepsLearnedDuration(self):
+        self.estimator.report('measure', 10010, 0.2)
+        self.estimator.seed('measure', 10010, 1.0)
+
+        assert self.estimator.expected('measure', 10010) == 0.2
+
+    def test_report_RunningAverage(self):
+        self.estimator.report('measure', 10010, 0.2)
+        self.estimator.report('measure', 10010, 0.4)
+
+        assert abs(self.estimator.expected('measure', 10010) - 0.3) < 1e-9
+        assert self.estimator.expected('measure', 10011) is None
+        assert len(self.estimator.history) == 2
+
+    def test_wait(self):
+        polls = [True, True, False]
+        self.estimator.seed('measure', 10010, 0.2)
+
+        duration = self.estimator.wait('measure', 10010, 100.0,
+                                       lambda: polls.pop(0))
+
+        # sleeps until the lead time, then polls twice more
+        assert abs(duration - 0.2) < 1e-9
+        assert self.time.sleep.call_count == 3
+        assert abs(self.estimator.expected('measure', 10010) - 0.2) < 1e-9
+
+    def test_wait_DoneAtFirstPoll(self):
+        self.estimator.seed('measure', 10010, 2.0)
+
+        self.estimator.wait('measure', 10010, 100.0, lambda: False)
+
+        # the measurement took at most 1.95s, so the estimate is halved
+        assert abs(self.estimator.expected('measure', 10010) - 0.975) < 1e-9
+
+    def test_wait_ConvergesFromHighSeed(self):
+        self.estimator.seed('measure', 10010, 2.0)
+
+        durations = list()
+        for _ in range(8):
+            started = self.now[0]
+            done = started + 0.18
+            durations.append(self.estimator.wait(
+                'measure', 10010, started, lambda: self.now[0] < done))
+
+        assert max(durations[-3:]) < 0.25
@@ -3,7 +3,7 @@
 import os
 import json
 import pytest
-from implib2.imp_helper import _normalize, _load_json, _flp2
+from implib2.imp_helper import _normalize, _load_json, _flp2, _impcover, _crcindex
 
 TESTS = {
     1: 0b0000000000000000000000001,         # 2**0
@@ -72,3 +72,28 @@ def test_load_json():
 def test_flp2(test):
     number, floor = test
     assert _flp2(number) == floor
+
+
+@pytest.mark.parametrize("test", [
+    ((0, 16777215), [(0, 0x800000)]),
+    ((0, 15), [(0, 8)]),
+    ((1, 10), [(1, 0), (2, 1), (4, 2), (8, 1), (10, 0)]),
+    ((3, 3), [(3, 0)]),
+    ((4, 3), [])])
+def test_impcover(test):
+    (low, high), blocks = test
+    assert _impcover(low, high) == blocks
+
+
+@pytest.mark.parametrize("low, high", [(0, 1), (1, 10), (33000, 34000)])
+def test_impcover_CoversExactlyTheRange(low, high):
+    covered = list()
+    for address, mark in _impcover(low, high):
+        covered.extend(range(address, address + max(2 * mark, 1)))
+    assert covered == list(range(low, high + 1))
+
+
+def test_crcindex():
+    index = _crcindex([31002, 31003, 31002])
+    assert index[0x24] == [31002]
+    assert sorted(sum(index.values(), [])) == [31002, 31003]
@@ -1,6 +1,7 @@
 # -*- coding: UTF-8 -*-
 
 import os
+import struct
 import pytest
 
 try:
@@ -53,6 +54,10 @@ class TestModule:
     def test___init___average_modes(self):
         assert self.mod.average_modes == self.average_modes
 
+    def test_serno(self):
+        assert self.mod.serno == self.serno
+        assert not self.bus.get.called
+
     def test_unlock(self):
         table = 'ACTION_PARAMETER_TABLE'
         param = 'SupportPW'
@@ -320,12 +325,53 @@ class TestModule:
         self.bus.set.assert_called_once_with(self.serno, table, param, [value])
 
     def test_get_table(self):
-        with pytest.raises(NotImplementedError):
-            self.mod.get_table('TABLE')
+        table = 'SYSTEM_PARAMETER_TABLE'
+        self.bus.get_table.return_value = {'SerialNum': (self.serno,)}
+
+        assert self.mod.get_table(table) == {'SerialNum': (self.serno,)}
+        self.bus.get_table.assert_called_once_with(self.serno, table)
 
     def test_set_table(self):
-        with pytest.raises(NotImplementedError):
-            self.mod.set_table('TABLE', None)
+        table = 'APPLICATION_PARAMETER_TABLE'
+        self.bus.get_table.return_value = {
+            'AverageMode': (0,),
+            'AverageTime': (12,),
+            'Boost': (struct.unpack('<f', struct.pack('<f', 1.1))[0],),
+            'Offset': (0.0,)}
+
+        data = {'AverageMode': 1, 'AverageTime': [12], 'Boost': 1.1,
+                'Offset': (0.5,)}
+
+        expected_calls = [
+            call.get_table(self.serno, table),
+            call.set(self.serno, 'ACTION_PARAMETER_TABLE', 'SupportPW',
+                     [66 + 0x8000]),
+            call.set(self.serno, table, 'AverageMode', [1]),
+            call.set(self.serno, table, 'Offset', [0.5])
+        ]
+
+        assert self.mod.set_table(table, data)
+        assert self.bus.mock_calls == expected_calls
+
+    def test_set_table_NothingChanged(self):
+        table = 'APPLICATION_PARAMETER_TABLE'
+        self.bus.get_table.return_value = {'AverageMode': (1,)}
+
+        assert self.mod.set_table(table, {'AverageMode': 1})
+        self.bus.set.assert_not_called()
+
+    def test_set_table_SkipsReadOnly(self):
+        table = 'SYSTEM_PARAMETER_TABLE'
+        self.bus.get_table.return_value = {'SerialNum': (self.serno,)}
+
+        assert self.mod.set_table(table, {'SerialNum': 31003})
+        self.bus.set.assert_not_called()
+
+    def test_set_table_UnknownParameter(self):
+        table = 'APPLICATION_PARAMETER_TABLE'
+        with pytest.raises(ModuleError, message="Unknown parameters: ['Foo']"):
+            self.mod.set_table(table, {'Foo': 1})
+        self.bus.get_table.assert_not_called()
 
     def test_get_serno(self):
         table = 'SYSTEM_PARAMETER_TABLE'
@@ -505,6 +551,71 @@ class TestModule:
         assert self.mod.measure_running.call_args_list == expected
         self.mod.get_measurement.assert_called_once_with(quantity='Moist')
 
+    def test_trusted_start_measure(self):
+        mod = Module(self.bus, self.serno, trusted=True)
+        self.bus.get.side_effect = ((0x80,), (0,), (0,), (1,), (0,))
+        self.bus.set.return_value = True
+
+        assert mod.start_measure()
+        while mod.measure_running():
+            pass
+        assert mod.start_measure()
+
+        # event mode, measure mode, running and the two polls
+        assert self.bus.get.call_count == 5
+        assert self.bus.set.call_count == 2
+
+    def test_trusted_unlock_once(self):
+        mod = Module(self.bus, self.serno, trusted=True)
+        self.bus.set.return_value = True
+
+        assert mod.unlock()
+        assert mod.unlock()
+        self.bus.set.assert_called_once_with(
+            self.serno, 'ACTION_PARAMETER_TABLE', 'SupportPW', [66 + 0x8000])
+
+    def test_trusted_set_event_mode_skips_same_mode(self):
+        mod = Module(self.bus, self.serno, trusted=True)
+        self.bus.get.return_value = (0x80,)
+
+        assert mod.get_event_mode() == 'NormalMeasure'
+        assert mod.set_event_mode('NormalMeasure')
+        self.bus.get.assert_called_once_with(
+            self.serno, 'ACTION_PARAMETER_TABLE', 'Event')
+        assert not self.bus.set.called
+
+    def test_trusted_resync_on_error(self):
+        mod = Module(self.bus, self.serno, trusted=True)
+        self.bus.get.side_effect = ((0x80,), IOError, (0x82,))
+
+        assert mod.get_event_mode() == 'NormalMeasure'
+        with pytest.raises(IOError):
+            mod.measure_running()
+        assert mod.get_event_mode() == 'AnalogOut'
+
+    def test_untrusted_reads_every_time(self):
+        self.bus.get.return_value = (0x80,)
+
+        self.mod.get_event_mode()
+        self.mod.get_event_mode()
+        assert self.bus.get.call_count == 2
+
+    def test_get_moisture_Estimator(self):
+        estimator = MagicMock()
+        estimator.known.return_value = False
+        estimator.unit = 0.2
+        mod = Module(self.bus, self.serno, estimator=estimator)
+        mod.start_measure = MagicMock(return_value=True)
+        mod.get_measurement = MagicMock(return_value=12.35)
+        self.bus.get.return_value = (4,)
+
+        assert mod.get_moisture() == 12.35
+        self.bus.get.assert_called_once_with(
+            self.serno, 'DEVICE_CONFIGURATION_PARAMETER_TABLE', 'MeasTimes')
+        estimator.seed.assert_called_once_with('measure', self.serno, 0.8)
+        assert estimator.wait.call_args[0][:2] == ('measure', self.serno)
+        assert estimator.wait.call_args[0][3] == mod.measure_running
+
     def test__get_analog_output_mode(self):
         table = 'DEVICE_CONFIGURATION_PARAMETER_TABLE'
         param = 'AnalogOutputMode'
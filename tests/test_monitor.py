@@ -0,0 +1,119 @@
+# -*- coding: UTF-8 -*-
+
+try:
+    from unittest.mock import MagicMock, patch, call
+except ImportError:
+    from mock import MagicMock, patch, call
+
+from implib2.imp_monitor import Monitor
+
+
+class TestMonitor:
+
+    def setup(self):
+        self.patcher = patch('implib2.imp_monitor.time')
+        self.time = self.patcher.start()
+        self.time.time.return_value = 100.0
+
+        self.bus = MagicMock()
+        self.bus.scan_stats = {'range_probes': 3}
+        self.added = list()
+        self.removed = list()
+        self.monitor = Monitor(self.bus, (2, 5), on_added=self.added.append,
+                               on_removed=self.removed.append, share=1.0,
+                               minserial=0, maxserial=7)
+
+    def teardown(self):
+        self.patcher.stop()
+
+    def test_step_RoundRobin(self):
+        self.bus.probe_module_short.side_effect = lambda x: x in (2, 5)
+        self.bus.probe_range.return_value = False
+
+        for _ in range(8):
+            assert self.monitor.step()
+
+        assert self.bus.probe_module_short.call_args_list == [
+            call(2), call(5), call(3), call(4), call(2), call(5)]
+        assert self.bus.probe_range.call_args_list == [
+            call(1), call(7)]
+        assert not self.added
+        assert not self.removed
+
+    def test_step_ReportsRemovedAfterRetries(self):
+        self.bus.probe_module_short.side_effect = lambda x: x != 5
+
+        self.monitor.step()
+        self.monitor.step()
+        assert not self.removed
+
+        self.monitor._cursor = 1
+        self.monitor.step()
+        assert self.removed == [5]
+        assert self.monitor.sernos == (2,)
+
+    def test_step_ReportsAdded(self):
+        self.bus.probe_module_short.return_value = True
+        self.bus.probe_range.return_value = True
+        self.bus.scan_ranges.return_value = (0,)
+
+        self.monitor.step()
+        self.monitor.step()
+        self.monitor.step()
+
+        self.bus.scan_ranges.assert_called_once_with([(0, 1)])
+        assert self.added == [0]
+        assert self.monitor.sernos == (0, 2, 5)
+
+    def test_step_KeepsScanStats(self):
+        self.bus.probe_module_short.return_value = True
+        self.bus.probe_range.return_value = True
+
+        def scan_ranges(ranges):
+            self.bus.scan_stats['range_probes'] = 0
+            return (0,)
+
+        self.bus.scan_ranges.side_effect = scan_ranges
+
+        self.monitor.step()
+        self.monitor.step()
+        self.monitor.step()
+
+        assert self.bus.scan_stats == {'range_probes': 3}
+
+    def test_step_KeepsToShare(self):
+        self.monitor.share = 0.05
+
+        def probe(serno):
+            self.time.time.return_value += 1.0
+            return True
+
+        self.bus.probe_module_short.side_effect = probe
+
+        self.time.time.return_value = 110.0
+        assert self.monitor.step()
+        assert self.monitor.busy == 1.0
+
+        assert not self.monitor.step()
+
+        self.time.time.return_value = 120.0
+        assert self.monitor.step()
+        assert self.bus.probe_module_short.call_args_list == [call(2), call(5)]
+
+    def test_step_KeepsToShareAfterIdling(self):
+        self.monitor.share = 0.05
+
+        def probe(serno):
+            self.time.time.return_value += 1.0
+            return True
+
+        self.bus.probe_module_short.side_effect = probe
+
+        # a long time without steps doesn't save up bus time
+        self.time.time.return_value = 10000.0
+        while self.monitor.step():
+            pass
+
+        # no more than the share of the window
+        assert self.monitor.busy == 4.0
+        assert self.monitor.usage > 0.05
@@ -0,0 +1,137 @@
+# -*- coding: UTF-8 -*-
+
+import time
+import pytest
+
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+from implib2.imp_bus import BusError
+from implib2.imp_multibus import MultiBus
+
+
+class TestMultiBus:
+
+    def setup(self):
+        self.patcher = patch('implib2.imp_multibus.Bus')
+        self.bus_class = self.patcher.start()
+        self.bus_class.side_effect = lambda port, **kwargs: MagicMock()
+
+        self.fleet = MultiBus(['usb0', 'usb1'], rs485=True)
+        self.usb0 = self.fleet.buses['usb0']
+        self.usb1 = self.fleet.buses['usb1']
+        self.usb0.scan.return_value = (10010, 10011)
+        self.usb1.scan.return_value = (20010,)
+
+    def teardown(self):
+        self.fleet.stop()
+        self.patcher.stop()
+
+    def test___init__(self):
+        assert self.bus_class.call_count == 2
+        self.bus_class.assert_called_with('usb1', rs485=True)
+
+    def test_scan(self):
+        assert self.fleet.scan() == (10010, 10011, 20010)
+        assert self.fleet.routes == {10010: 'usb0', 10011: 'usb0',
+                                     20010: 'usb1'}
+        self.usb0.scan.assert_called_once_with(0, 16777215)
+
+    def test_scan_PortFails(self):
+        self.fleet.scan()
+        error = IOError('Unplugged!')
+        self.usb0.scan.side_effect = error
+
+        assert self.fleet.scan() == (20010,)
+        assert self.fleet.routes == {20010: 'usb1'}
+        assert self.fleet.failed == {'usb0': error}
+
+    def test_scan_Parallel(self):
+        def slow(*args):
+            time.sleep(0.2)
+            return ()
+
+        self.usb0.scan.side_effect = slow
+        self.usb1.scan.side_effect = slow
+
+        started = time.time()
+        self.fleet.scan()
+        assert time.time() - started < 0.35
+
+    def test_sync(self):
+        assert self.fleet.sync()
+        self.usb0.sync.assert_called_once_with(9600)
+        self.usb1.sync.assert_called_once_with(9600)
+
+    def test_sync_PortFails(self):
+        self.usb1.sync.side_effect = IOError('Unplugged!')
+        assert not self.fleet.sync()
+        assert list(self.fleet.failed) == ['usb1']
+
+    def test_get(self):
+        self.fleet.scan()
+        self.usb1.get.return_value = (1.14,)
+
+        assert self.fleet.get(20010, 'T', 'P') == (1.14,)
+        self.usb1.get.assert_called_once_with(20010, 'T', 'P')
+        assert not self.usb0.get.called
+
+    def test_get_Unknown(self):
+        with pytest.raises(BusError):
+            self.fleet.get(30010, 'T', 'P')
+
+    def test_set(self):
+        self.fleet.scan()
+        self.usb0.set.return_value = True
+
+        assert self.fleet.set(10011, 'T', 'P', [1])
+        self.usb0.set.assert_called_once_with(10011, 'T', 'P', [1], 0)
+
+    def test_get_all(self):
+        self.fleet.scan()
+        error = IOError()
+        self.usb0.get_all.return_value = ({10010: (1,)}, {10011: error})
+        self.usb1.get_all.return_value = ({20010: (2,)}, {})
+
+        values, errors = self.fleet.get_all([10010, 10011, 20010, 30010],
+                                            'T', 'P')
+
+        assert values == {10010: (1,), 20010: (2,)}
+        assert errors[10011] is error
+        assert isinstance(errors[30010], BusError)
+        self.usb0.get_all.assert_called_once_with([10010, 10011], 'T', 'P',
+                                                  0.0, True)
+
+    def test_set_all(self):
+        self.fleet.scan()
+        self.usb0.set_all.return_value = ({10010: True}, {})
+
+        assert self.fleet.set_all([10010], 'T', 'P', [1]) == \
+            ({10010: True}, {})
+        assert not self.usb1.set_all.called
+
+    def test_measure(self):
+        self.fleet.scan()
+        self.usb0.measure_all.return_value = ({10010: {'Moist': (1,)}}, {})
+        self.usb1.measure_all.return_value = ({20010: {'Moist': (2,)}}, {})
+
+        assert self.fleet.measure([10010, 20010]) == ({
+            10010: {'Moist': (1,)}, 20010: {'Moist': (2,)}}, {})
+        self.usb1.measure_all.assert_called_once_with([20010], ('Moist',))
+
+    def test_measure_PortFails(self):
+        self.fleet.scan()
+        error = IOError('Unplugged!')
+        self.usb0.measure_all.side_effect = error
+        self.usb1.measure_all.return_value = ({20010: {'Moist': (2,)}}, {})
+
+        values, errors = self.fleet.measure([10010, 10011, 20010])
+        assert values == {20010: {'Moist': (2,)}}
+        assert errors == {10010: error, 10011: error}
+
+    def test_measure_Unknown(self):
+        values, errors = self.fleet.measure([30010])
+        assert values == {}
+        assert isinstance(errors[30010], BusError)
@@ -0,0 +1,108 @@
+# -*- coding: UTF-8 -*-
+
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+from implib2.imp_pipeline import Pipeline
+from implib2.imp_estimator import Estimator
+from implib2.imp_device import DeviceError
+from implib2.imp_modules import ModuleError
+
+
+class TestPipeline:
+
+    def setup(self):
+        self.patcher = patch('implib2.imp_pipeline.time')
+        self.time = self.patcher.start()
+        self.now = [100.0]
+        self.time.time.side_effect = lambda: self.now[0]
+        self.time.sleep.side_effect = self.sleep
+
+        self.bus = MagicMock()
+        self.bus.get_many.side_effect = lambda s, t, q: {x: (s,) for x in q}
+
+    def teardown(self):
+        self.patcher.stop()
+
+    def sleep(self, delay):
+        self.now[0] += delay
+
+    def module(self, serno, polls):
+        module = MagicMock()
+        module.serno = serno
+        module.bus = self.bus
+        module.measure_running.side_effect = polls
+        return module
+
+    def test_measure_iter_YieldsInOrderOfCompletion(self):
+        slow = self.module(10010, [True, True, False])
+        fast = self.module(10011, [False])
+        pipeline = Pipeline([slow, fast], ['Moist', 'CompTemp'])
+
+        results = list(pipeline.measure_iter())
+
+        assert results == [
+            (10011, {'Moist': 10011, 'CompTemp': 10011}),
+            (10010, {'Moist': 10010, 'CompTemp': 10010})]
+        slow.start_measure.assert_called_once_with()
+        fast.start_measure.assert_called_once_with()
+        assert slow.measure_running.call_count == 3
+
+    def test_measure_StartsAllBeforePolling(self):
+        order = list()
+        modules = [self.module(x, [False]) for x in (1, 2, 3)]
+        for module in modules:
+            module.start_measure.side_effect = \
+                lambda s=module.serno: order.append(('start', s))
+            module.measure_running.side_effect = \
+                lambda s=module.serno: order.append(('poll', s))
+
+        assert Pipeline(modules).measure() == (
+            {1: {'Moist': 1}, 2: {'Moist': 2}, 3: {'Moist': 3}}, {})
+        assert order == [('start', 1), ('start', 2), ('start', 3),
+                         ('poll', 1), ('poll', 2), ('poll', 3)]
+
+    def test_measure_ReportsFailures(self):
+        wrong = ModuleError("Wrong measure mode, need 'ModeA'!")
+        lost = DeviceError('Timeout reading header!')
+        modules = [self.module(x, [False]) for x in (1, 2, 3)]
+        modules[0].start_measure.side_effect = wrong
+        modules[1].measure_running.side_effect = lost
+
+        assert Pipeline(modules).measure() == (
+            {3: {'Moist': 3}}, {1: wrong, 2: lost})
+        assert not modules[0].measure_running.called
+
+    def test_measure_Timeout(self):
+        stuck = self.module(1, lambda: True)
+        modules = [stuck, self.module(2, [True, False])]
+
+        values, errors = Pipeline(modules, timeout=2.0).measure()
+
+        assert values == {2: {'Moist': 2}}
+        assert list(errors) == [1]
+        assert isinstance(errors[1], ModuleError)
+        assert stuck.measure_running.call_count == 4
+
+    def test_measure_SleepsOnlyIfNothingIsDue(self):
+        modules = [self.module(x, [True, False]) for x in (1, 2)]
+
+        Pipeline(modules, interval=0.5).measure()
+
+        # the second probe is polled right after the first one
+        assert self.time.sleep.call_count == 2
+
+    def test_measure_Estimator(self):
+        estimator = Estimator(lead=0.05, interval=0.025)
+        estimator.seed('measure', 1, 0.3)
+        modules = [self.module(1, [True, False])]
+
+        with patch('implib2.imp_estimator.time', self.time):
+            Pipeline(modules, estimator=estimator).measure()
+
+        # sleeps until the lead time, then a single short poll interval
+        assert [round(x[0][0], 3) for x in self.time.sleep.call_args_list] \
+            == [0.25, 0.025]
+        assert estimator.expected('measure', 1) < 0.3
@@ -1,5 +1,6 @@
 # -*- coding: UTF-8 -*-
 
+import struct
 from binascii import a2b_hex as a2b
 
 import pytest
@@ -41,6 +42,18 @@ class TestResponce:
         pkg = a2b('')
         assert not self.res.get_range_ack(pkg)
 
+    def test_get_range_reply(self):
+        pkg = a2b('24')
+        assert self.res.get_range_reply(pkg) == (True, 0x24)
+
+    def test_get_range_reply_Garbled(self):
+        pkg = a2b('24ff')
+        assert self.res.get_range_reply(pkg) == (True, None)
+
+    def test_get_range_reply_NoResponce(self):
+        pkg = a2b('')
+        assert self.res.get_range_reply(pkg) == (False, None)
+
     def test_get_negative_ack(self):
         pkg = a2b('000805ffffffd91a79000042')
         assert self.res.get_negative_ack(pkg) == 31002
@@ -51,6 +64,29 @@ class TestResponce:
         table = 'SYSTEM_PARAMETER_TABLE'
         assert self.res.get_parameter(pkg, table, param) == (31002,)
 
+    def test_get_table(self):
+        pkgs = [a2b('ff0a151a7900761a79000001020304010203040102010203040506e5'),
+                a2b('000a0f1a7900030708090a0b0c0d0e0f10010201015c')]
+        table = 'SYSTEM_PARAMETER_TABLE'
+        version = struct.unpack('<f', a2b('01020304'))
+
+        values = self.res.get_table(pkgs, table)
+        assert values['SerialNum'] == (31002,)
+        assert values['HWVersion'] == version
+        assert values['FWVersion'] == version
+        assert values['Baudrate'] == (513,)
+        assert values['ModuleName'] == tuple(range(1, 17))
+        assert values['ModuleCode'] == (513,)
+        assert values['SDI12Address'] == (1,)
+        assert values['ModuleInfo2'] == (1,)
+        assert len(values) == 8
+
+    def test_get_table_DataTooShort(self):
+        pkgs = [a2b('ff0a151a7900761a79000001020304010203040102010203040506e5')]
+        table = 'SYSTEM_PARAMETER_TABLE'
+        with pytest.raises(ResponceError, message="Table data too short!"):
+            self.res.get_table(pkgs, table)
+
     def test_set_parameter(self):
         pkg = a2b('0011001a790095')
         serno = 31002
@@ -45,6 +45,16 @@ class TestTables:
         with pytest.raises(TablesError, message="Unknown param or table: UNKNOWN_PARAM!"):
             self.t.lookup('DEVICE_CALIBRATION_PARAMETER_TABLE', 'UNKNOWN_PARAM')
 
+    def test_parameters(self):
+        params = self.t.parameters('SYSTEM_PARAMETER_TABLE')
+        assert [x for x, _ in params] == [
+            'SerialNum', 'HWVersion', 'FWVersion', 'Baudrate', 'ModuleName',
+            'ModuleCode', 'SDI12Address', 'ModuleInfo2']
+
+    def test_parameters_unknown_table(self):
+        with pytest.raises(TablesError, message="Unknown table: UNKNOWN_TABLE!"):
+            self.t.parameters('UNKNOWN_TABLE')
+
     def test_lookup_value(self, table, param):
         row = self.j[table][param]
         value = self.t.lookup(table, param)
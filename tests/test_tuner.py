@@ -0,0 +1,55 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+
+from implib2.imp_tuner import Tuner
+
+
+class TestTuner:
+
+    def setup(self):
+        self.tuner = Tuner(0.002, 0.001, threshold=0.05, window=20,
+                           shrink=0.5, backoff=2.0, minimum=0.0005,
+                           maximum=0.070)
+
+    def test_waits_DefaultProfile(self):
+        assert self.tuner.waits('get', 10010) == (0.002, 0.001)
+        assert self.tuner.waits('range_ack') == (0.002, 0.001)
+
+    def test_report_ShrinksAfterCleanWindow(self):
+        for _ in range(20):
+            self.tuner.report('get', 10010, True)
+
+        assert self.tuner.waits('get', 10010) == (0.001, 0.0005)
+        assert self.tuner.waits('get', 10011) == (0.002, 0.001)
+        assert self.tuner.waits('set', 10010) == (0.002, 0.001)
+        assert len(self.tuner.history) == 1
+
+    def test_report_DoesNotShrinkBelowMinimum(self):
+        for _ in range(200):
+            self.tuner.report('get', 10010, True)
+
+        assert self.tuner.waits('get', 10010) == (0.0005, 0.0005)
+
+    def test_report_BacksOffOnErrors(self):
+        self.tuner.report('get', 10010, False)
+        assert self.tuner.waits('get', 10010) == (0.002, 0.001)
+
+        self.tuner.report('get', 10010, False)
+        assert self.tuner.waits('get', 10010) == (0.004, 0.002)
+
+        _, kind, serno, trans_wait, cycle_wait, rate = self.tuner.history[-1]
+        assert (kind, serno, trans_wait, cycle_wait) == \
+            ('get', 10010, 0.004, 0.002)
+        assert rate == 1.0
+
+    def test_report_DoesNotBackOffAboveMaximum(self):
+        for _ in range(100):
+            self.tuner.report('get', 10010, False)
+
+        assert self.tuner.waits('get', 10010) == (0.070, 0.070)
+
+    @pytest.mark.parametrize("kind", ['get', 'range_ack'])
+    def test_current(self, kind):
+        self.tuner.waits(kind, None)
+        assert list(self.tuner.current) == [(kind, None)]
@@ -0,0 +1,200 @@
+# -*- coding: UTF-8 -*-
+
+import threading
+import pytest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from implib2.imp_worker import Worker, WorkerError, Transaction, Client
+
+
+class TestWorker:
+
+    def setup(self):
+        self.bus = MagicMock()
+        self.worker = Worker(self.bus)
+
+    def teardown(self):
+        self.worker.stop()
+
+    def test_submit(self):
+        self.bus.get.return_value = (1.140301,)
+
+        transaction = self.worker.submit('get', 10010, 'T', 'FWVersion')
+
+        assert transaction.result(timeout=1.0) == (1.140301,)
+        assert transaction.done()
+        self.bus.get.assert_called_once_with(10010, 'T', 'FWVersion')
+
+    def test_submit_RaisesError(self):
+        self.bus.get.side_effect = IOError('Timeout!')
+
+        transaction = self.worker.submit('get', 10010, 'T', 'FWVersion')
+
+        with pytest.raises(IOError):
+            transaction.result(timeout=1.0)
+        assert isinstance(transaction.exception(), IOError)
+
+    def test_submit_Stopped(self):
+        self.worker.stop()
+
+        with pytest.raises(WorkerError):
+            self.worker.submit('get', 10010, 'T', 'FWVersion')
+
+    def test_proxy(self):
+        self.bus.set.return_value = True
+        self.bus.dead = {10011}
+
+        assert self.worker.set(10010, 'T', 'P', [1])
+        assert self.worker.dead == {10011}
+        self.bus.set.assert_called_once_with(10010, 'T', 'P', [1])
+
+    def test_proxy_RejectsGenerators(self):
+        def scan_iter(minserial=0, maxserial=0b111111111111111111111111):
+            yield minserial
+
+        self.bus.scan_iter = scan_iter
+
+        with pytest.raises(WorkerError):
+            self.worker.scan_iter(0, 10)
+        with pytest.raises(WorkerError):
+            self.worker.submit('scan_iter', 0, 10)
+        with pytest.raises(WorkerError):
+            self.worker.client('background').scan_iter
+
+    def test_runs_one_call_at_a_time(self):
+        active = list()
+        overlaps = list()
+
+        def get(serno, table, param):
+            active.append(serno)
+            overlaps.append(len(active))
+            active.remove(serno)
+            return (serno,)
+
+        self.bus.get.side_effect = get
+
+        results = dict()
+
+        def client(serno):
+            results[serno] = self.worker.get(serno, 'T', 'P')
+
+        threads = [threading.Thread(target=client, args=(x,))
+                   for x in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == {x: (x,) for x in range(20)}
+        assert max(overlaps) == 1
+        assert self.worker.stats['submitted'] == 20
+        assert self.worker.stats['finished'] == 20
+        assert self.worker.depth == 0
+
+    def test_stats(self):
+        self.bus.get.side_effect = [(1,), IOError()]
+
+        self.worker.submit('get', 1, 'T', 'P').exception(1.0)
+        self.worker.submit('get', 2, 'T', 'P').exception(1.0)
+        self.worker.stop()
+
+        assert self.worker.stats['finished'] == 2
+        assert self.worker.stats['failed'] == 1
+        assert self.worker.stats['wait_max'] >= 0.0
+
+    def block(self):
+        # keeps the worker busy until the returned event is set
+        started, release = threading.Event(), threading.Event()
+
+        def wait(*args):
+            started.set()
+            release.wait(1.0)
+
+        self.bus.wakeup.side_effect = wait
+        self.worker.submit('wakeup')
+        started.wait(1.0)
+        return release
+
+    def test_submit_as_PriorityOrder(self):
+        order = list()
+        self.bus.get.side_effect = lambda x: order.append(x)
+
+        release = self.block()
+        last = self.worker.submit_as('background', 'get', 'background')
+        self.worker.submit_as('interactive', 'get', 'interactive')
+        self.worker.submit_as('realtime', 'get', 'realtime')
+        self.worker.submit_as('realtime', 'get', 'realtime2')
+        release.set()
+        last.result(1.0)
+
+        assert order == ['realtime', 'realtime2', 'interactive', 'background']
+        assert self.worker.class_stats['realtime']['finished'] == 2
+
+    def test_submit_as_InvalidPriority(self):
+        with pytest.raises(WorkerError):
+            self.worker.submit_as('urgent', 'get', 10010, 'T', 'P')
+
+    def test_preempt(self):
+        order = list()
+        started, release = threading.Event(), threading.Event()
+
+        def scan():
+            order.append('scan')
+            started.set()
+            release.wait(1.0)
+            # the bus calls this before every transaction
+            self.bus.preempt()
+            order.append('scan done')
+
+        self.bus.scan.side_effect = scan
+        self.bus.get.side_effect = lambda x: order.append(x)
+
+        scanning = self.worker.submit_as('background', 'scan')
+        started.wait(1.0)
+        self.worker.submit_as('background', 'get', 'background')
+        urgent = self.worker.submit_as('realtime', 'get', 'realtime')
+        release.set()
+        scanning.result(1.0)
+        urgent.result(1.0)
+        self.worker.stop()
+
+        assert order == ['scan', 'realtime', 'scan done', 'background']
+        assert self.worker.stats['preempted'] == 1
+        assert urgent.finished <= scanning.finished
+
+    def test_preempt_OtherThread(self):
+        self.bus.get.return_value = (1,)
+        release = self.block()
+        self.worker.submit_as('realtime', 'get', 1, 'T', 'P')
+
+        # only the worker itself may run the waiting calls
+        self.bus.preempt()
+        assert not self.bus.get.called
+        release.set()
+
+    def test_client(self):
+        self.bus.get.return_value = (1,)
+        client = self.worker.client('realtime')
+
+        assert isinstance(client, Client)
+        assert client.get(10010, 'T', 'P') == (1,)
+        assert client.submit('get', 10010, 'T', 'P').priority == 'realtime'
+        assert self.worker.class_stats['realtime']['submitted'] == 2
+
+    def test_client_InvalidPriority(self):
+        with pytest.raises(WorkerError):
+            self.worker.client('urgent')
+
+
+class TestTransaction:
+
+    def test_result_Timeout(self):
+        transaction = Transaction('get', (10010, 'T', 'P'))
+
+        assert not transaction.done()
+        with pytest.raises(WorkerError):
+            transaction.result(timeout=0.01)